@@ -0,0 +1,168 @@
+"""
+Writer Benchmark
+Times the export with each part writer engine ("openpyxl" write-only and the
+native xlsx_writer.XlsxStreamWriter) on the same generated workbook, through
+ExcelHandler.process_and_save_generator, and checks that both engines write the
+same cells.
+
+    python bench_writer.py [--rows 50000] [--repeat 3] [--max-rows 5000]
+
+Reported per engine: best and median wall time of the whole export, the
+writing stage's busy time (from the export log), rows/s and output size.
+"""
+
+import argparse
+import copy
+import datetime
+import glob
+import json
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+import openpyxl
+
+from excel_io import ExcelHandler
+from pricing_engine import PricingEngine
+from settings import DEFAULT_SETTINGS, SettingsManager
+
+
+ENGINES = ("openpyxl", "native")
+
+HEADERS = ["KOD", "URUN ADI", "KATEGORI", "ALIS", "SATIS", "INDIRIMLI", "PIYASA", "ADET", "MARKA", "TARIH", "ACIKLAMA"]
+
+
+def make_workbook(path, rows, seed=1):
+    """Writes a supplier-like workbook with rows data rows (same content for the same seed)."""
+    rnd = random.Random(seed)
+    categories = ["Alt Giyim", "Üst Giyim > Gömlek", "Aksesuar | Çanta", "Fantezi", None]
+    brands = [f"Marka {i}" for i in range(40)]
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(HEADERS)
+    start = datetime.datetime(2024, 1, 1)
+    for i in range(rows):
+        buy = round(rnd.uniform(5, 2500), 2)
+        ws.append([
+            f"SKU{i:07d}",
+            f"Ürün {rnd.randrange(5000)} {rnd.choice(['mavi', 'kırmızı', 'siyah'])}",
+            rnd.choice(categories),
+            buy,
+            round(buy * 1.8, 2),
+            round(buy * 1.5, 2),
+            round(buy * 2.1, 2),
+            rnd.randrange(-2, 60),
+            rnd.choice(brands),
+            start + datetime.timedelta(minutes=rnd.randrange(500000)),
+            "" if rnd.random() < 0.3 else "Açıklama " * rnd.randrange(1, 6),
+        ])
+    wb.save(path)
+
+
+def make_settings(out_dir, engine, max_rows):
+    sm = SettingsManager(os.path.join(out_dir, "settings.json")) # not saved; starts from the defaults
+    sm.settings = copy.deepcopy(DEFAULT_SETTINGS)
+    sm.set("mappings", {"stock_code_col": "KOD", "product_name_col": "URUN ADI", "category_col": "KATEGORI",
+                        "buy_price_col": "ALIS", "sell_price_col": "SATIS", "discounted_price_col": "INDIRIMLI",
+                        "market_price_col": "PIYASA", "stock_col": "ADET", "include_zero_stock": True})
+    sm.set("targets", {"update_discounted": True, "update_sell": True, "update_market": True})
+    sm.set("output", dict(DEFAULT_SETTINGS["output"], output_dir=out_dir, writer_engine=engine,
+                          streaming_write=True, max_rows_per_file=max_rows, parallel_parts=0))
+    return sm
+
+
+def run_export(source, work_dir, engine, max_rows):
+    """
+    Runs one export into work_dir/out.
+
+    Returns:
+        (wall seconds, writing stage seconds, DONE message, output dir)
+    """
+    out_dir = os.path.join(work_dir, "out")
+    os.makedirs(out_dir)
+    sm = make_settings(out_dir, engine, max_rows)
+    cwd = os.getcwd()
+    os.chdir(work_dir) # the export writes its log to ./logs
+    try:
+        t = time.perf_counter()
+        done = None
+        for status, data in ExcelHandler().process_and_save_generator(source, sm, PricingEngine(sm)):
+            if status == "ERROR":
+                raise RuntimeError(data)
+            if status == "DONE":
+                done = data
+        wall = time.perf_counter() - t
+    finally:
+        os.chdir(cwd)
+    writing = None
+    for log_path in glob.glob(os.path.join(work_dir, "logs", "*.jsonl")):
+        with open(log_path, encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if "seconds" in record:
+                    writing = record["seconds"].get("yazma")
+    return wall, writing, done, out_dir
+
+
+def read_cells(out_dir):
+    rows = []
+    for path in sorted(glob.glob(os.path.join(out_dir, "*.xlsx"))):
+        wb = openpyxl.load_workbook(path, read_only=True)
+        rows.append((os.path.basename(path), list(wb.active.iter_rows(values_only=True))))
+        wb.close()
+    return rows
+
+
+def output_bytes(out_dir):
+    return sum(os.path.getsize(p) for p in glob.glob(os.path.join(out_dir, "*.xlsx")))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export writer engine benchmark")
+    parser.add_argument("--rows", type=int, default=50000, help="data rows of the generated workbook")
+    parser.add_argument("--repeat", type=int, default=3, help="exports per engine")
+    parser.add_argument("--max-rows", type=int, default=5000, help="rows per output part (0 = one file)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="bench_writer_")
+    try:
+        source = os.path.join(root, "source.xlsx")
+        t = time.perf_counter()
+        make_workbook(source, args.rows, args.seed)
+        print(f"Kaynak: {args.rows} satır, {os.path.getsize(source) / 1e6:.1f} MB ({time.perf_counter() - t:.1f} sn)")
+
+        results = {}
+        outputs = {}
+        for engine in ENGINES:
+            walls, writes = [], []
+            for n in range(args.repeat):
+                wall, writing, done, out_dir = run_export(source, os.path.join(root, f"{engine}_{n}"), engine, args.max_rows)
+                walls.append(wall)
+                if writing is not None:
+                    writes.append(writing)
+                outputs[engine] = out_dir
+            results[engine] = (walls, writes, done, output_bytes(out_dir))
+
+        same = read_cells(outputs["openpyxl"]) == read_cells(outputs["native"])
+        print(f"{'motor':<10}{'en iyi sn':>10}{'medyan sn':>11}{'yazma sn':>10}{'satır/sn':>11}{'çıktı MB':>10}")
+        for engine, (walls, writes, done, size) in results.items():
+            best = min(walls)
+            write = f"{statistics.median(writes):.2f}" if writes else "-"
+            print(f"{engine:<10}{best:>10.2f}{statistics.median(walls):>11.2f}{write:>10}"
+                  f"{args.rows / best:>11.0f}{size / 1e6:>10.2f}")
+        base, native = min(results["openpyxl"][0]), min(results["native"][0])
+        print(f"Hızlanma (toplam): {base / native:.2f}x")
+        if results["openpyxl"][1] and results["native"][1]:
+            print(f"Hızlanma (yazma aşaması): {statistics.median(results['openpyxl'][1]) / statistics.median(results['native'][1]):.2f}x")
+        print(f"Aynı hücreler: {'evet' if same else 'HAYIR'}")
+        print(results["native"][2])
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
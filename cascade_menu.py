@@ -2,6 +2,8 @@ from PySide6.QtWidgets import QPushButton, QMenu, QWidgetAction, QLabel
 from PySide6.QtCore import Signal, Qt
 from PySide6.QtGui import QAction
 
+from category_paths import CategoryTrie
+
 class CascadeCategoryButton(QPushButton):
     """
     A button that mimics a ComboBox but opens a cascading QMenu
@@ -15,6 +17,12 @@ class CascadeCategoryButton(QPushButton):
         self.setMenu(QMenu(self))
         self.current_category = "Tüm Kategoriler"
         
+        # Lazy menu state: only the top level is built up front, submenus on aboutToShow
+        self._trie = None              # CategoryTrie currently shown
+        self._structure = None         # Set of category paths the menus were built for
+        self._generation = 0           # Bumped on every refresh (submenu labels go stale)
+        self._submenus = {}            # path -> [QMenu, generation it was built/refreshed for or None]
+        
         # Style to look like a ComboBox
         self.setStyleSheet("""
             QPushButton {
@@ -44,37 +52,45 @@ class CascadeCategoryButton(QPushButton):
         """
         Populate the cascading menu.
         
+        Only the top level is created here; submenus are filled the first time they
+        are opened. When the hierarchy is the same as last time the existing menus
+        are kept and only their labels (counts) are refreshed.
+        
         Args:
-            category_counts: dict { "Alt Giyim > Şort": 45, ... }
+            category_counts: dict { "Alt Giyim > Şort": 45, ... } or a CategoryTrie of it
             selected_categories: list of allowed categories (from tree selection)
         """
-        menu = QMenu(self)
-        self.setMenu(menu)
-        
-        # Add "Tüm Kategoriler"
-        action_all = QAction("Tüm Kategoriler", menu)
-        action_all.triggered.connect(lambda: self._on_category_triggered("Tüm Kategoriler"))
-        menu.addAction(action_all)
-        menu.addSeparator()
+        # Hierarchy with precomputed subtree totals
+        trie = category_counts if isinstance(category_counts, CategoryTrie) else CategoryTrie(category_counts)
 
-        # Filter categories if selection provided
-        filtered_counts = {}
+        # Filter categories if selection provided (exact match or subcategory)
         if selected_categories:
-            for cat, count in category_counts.items():
-                for sel in selected_categories:
-                    # Include if exact match or subcategory
-                    if cat == sel or cat.startswith(sel + " >"):
-                        filtered_counts[cat] = count
-                        break
-        else:
-            filtered_counts = category_counts
+            trie = trie.subset(selected_categories)
+        filtered_counts = trie.counts
 
-        # Build Hierarchy
-        from category_tree import CategoryParser
-        hierarchy = CategoryParser.build_hierarchy(list(filtered_counts.keys()))
-
-        # Build Menu Recursively
-        self._build_menu_recursive(menu, hierarchy, filtered_counts, "")
+        self._trie = trie
+        self._generation += 1
+        structure = frozenset(trie.nodes)
+        
+        if structure == self._structure:
+            # Same hierarchy: keep the menus, refresh top level labels now, the rest on show
+            self._refresh_labels(self.menu())
+        else:
+            old_menu = self.menu()
+            menu = QMenu(self)
+            self.setMenu(menu)
+            if old_menu is not None:
+                old_menu.deleteLater()
+            self._structure = structure
+            self._submenus = {}
+            
+            # Add "Tüm Kategoriler"
+            action_all = QAction("Tüm Kategoriler", menu)
+            action_all.triggered.connect(lambda: self._on_category_triggered("Tüm Kategoriler"))
+            menu.addAction(action_all)
+            menu.addSeparator()
+            
+            self._add_menu_level(menu, trie.root)
         
         # ===== FIX: Restore/Validate Selection =====
         # If current selection is not valid in new data (and not "Tüm Kategoriler"), reset?
@@ -99,42 +115,58 @@ class CascadeCategoryButton(QPushButton):
             self.setText("Tüm Kategoriler")
         # ===== END FIX =====
         
-    def _build_menu_recursive(self, parent_menu, hierarchy, counts, parent_path):
-        for key in sorted(hierarchy.keys()):
-            full_path = f"{parent_path} > {key}" if parent_path else key
-            
-            # Calculate total count including children
-            total_count = self._calculate_total_count(full_path, counts)
-            display_text = f"{key} ({total_count})" if total_count > 0 else key
+    def _display_text(self, node):
+        # Total count including children
+        return f"{node.name} ({node.total})" if node.total > 0 else node.name
 
-            if hierarchy[key]:
-                # It has children -> Create Submenu
+    def _add_menu_level(self, parent_menu, parent_node):
+        """Adds one level of categories; submenus stay empty until first shown."""
+        for node in parent_node.sorted_children():
+            full_path = node.path
+            display_text = self._display_text(node)
+
+            if node.children:
+                # It has children -> Create Submenu (filled on aboutToShow)
                 submenu = parent_menu.addMenu(display_text)
-                
-                # Add action for the parent category itself (optional, allows selecting parent)
-                parent_action = QAction(f"{key} (Tümü)", submenu)
-                parent_action.triggered.connect(lambda checked=False, p=full_path: self._on_category_triggered(p))
-                submenu.addAction(parent_action)
-                submenu.addSeparator()
-                
-                # Recurse
-                self._build_menu_recursive(submenu, hierarchy[key], counts, full_path)
+                submenu.menuAction().setData(full_path)
+                submenu.aboutToShow.connect(lambda p=full_path: self._on_submenu_about_to_show(p))
+                self._submenus[full_path] = [submenu, None]
             else:
                 # No children -> Create Action
                 action = QAction(display_text, parent_menu)
+                action.setData(full_path)
                 action.triggered.connect(lambda checked=False, p=full_path: self._on_category_triggered(p))
                 parent_menu.addAction(action)
 
+    def _on_submenu_about_to_show(self, category_path):
+        entry = self._submenus.get(category_path)
+        node = self._trie.nodes.get(category_path) if self._trie else None
+        if entry is None or node is None:
+            return
+        submenu, built_for = entry
+        
+        if built_for is None:
+            # Add action for the parent category itself (optional, allows selecting parent)
+            parent_action = QAction(f"{node.name} (Tümü)", submenu)
+            parent_action.triggered.connect(lambda checked=False, p=category_path: self._on_category_triggered(p))
+            submenu.addAction(parent_action)
+            submenu.addSeparator()
+            
+            self._add_menu_level(submenu, node)
+        elif built_for != self._generation:
+            self._refresh_labels(submenu)
+        entry[1] = self._generation
+
+    def _refresh_labels(self, menu):
+        """Updates the counts shown by the category entries of one menu level."""
+        for action in menu.actions():
+            node = self._trie.nodes.get(action.data())
+            if node is not None:
+                action.setText(self._display_text(node))
+
     def _on_category_triggered(self, category_path):
         self.current_category = category_path
         # Show leaf name on button
         leaf_name = category_path.split(" > ")[-1] if " > " in category_path else category_path
         self.setText(leaf_name)
         self.categorySelected.emit(category_path)
-
-    def _calculate_total_count(self, category_path, counts):
-        total = 0
-        for cat, count in counts.items():
-            if cat == category_path or cat.startswith(category_path + " >"):
-                total += count
-        return total
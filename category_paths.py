@@ -0,0 +1,228 @@
+"""
+Category Paths Module
+Shared, cached handling of raw category strings.
+The same raw category text repeats on thousands of rows, so it is split and
+normalized once and the result is reused by pricing, preview, export and the tree.
+"""
+
+import threading
+from collections import OrderedDict, namedtuple
+
+
+# Resolved form of one raw category string
+CategoryInfo = namedtuple("CategoryInfo", ["main_category", "full_path", "path_id"])
+
+
+def normalize_category_path(raw_path):
+    """
+    Normalizes hierarchy spacing of a category path.
+
+    Args:
+        raw_path: String like "Alt Giyim>Sütyen >  Dantelli"
+
+    Returns:
+        str: "Alt Giyim > Sütyen > Dantelli" ("" if nothing is left)
+    """
+    return " > ".join([p.strip() for p in str(raw_path).split(">") if p.strip()])
+
+
+class CategoryPathCache:
+    """
+    Bounded LRU cache of raw category text -> CategoryInfo.
+
+    main_category is extracted with the category delimiters, full_path is the
+    normalized " > " path and path_id is a small integer interned per full_path.
+    Entries are dropped whenever a different delimiter pattern is used; path ids
+    stay stable until then (see `generation`).
+    Thread-safe: preview, category scan and export workers share one instance.
+    """
+
+    def __init__(self, maxsize=65536):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._pattern = None
+        self._entries = OrderedDict()
+        self._paths = {}
+        self.generation = 0
+
+    def get(self, raw_text, delimiter_regex):
+        """
+        Resolves a raw category string.
+
+        Args:
+            raw_text: Raw category cell text (str)
+            delimiter_regex: Compiled pattern of the category delimiters
+
+        Returns:
+            CategoryInfo: The same (interned) tuple for equal inputs
+        """
+        with self._lock:
+            if delimiter_regex.pattern != self._pattern:
+                self._reset(delimiter_regex.pattern)
+
+            info = self._entries.get(raw_text)
+            if info is not None:
+                self._entries.move_to_end(raw_text)
+                return info
+
+            if raw_text:
+                main_cat = delimiter_regex.split(raw_text)[0].strip()
+            else:
+                main_cat = "Uncategorized"
+            full_path = normalize_category_path(raw_text)
+
+            # Intern the normalized path so equal paths share one string and id
+            interned = self._paths.get(full_path)
+            if interned is None:
+                if len(self._paths) >= self.maxsize * 4:
+                    self._reset(self._pattern)
+                interned = (full_path, len(self._paths))
+                self._paths[full_path] = interned
+            full_path, path_id = interned
+
+            info = CategoryInfo(main_cat, full_path, path_id)
+            self._entries[raw_text] = info
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            return info
+
+    def clear(self):
+        """Drops all cached entries and path ids."""
+        with self._lock:
+            self._reset(self._pattern)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _reset(self, pattern):
+        self._pattern = pattern
+        self._entries.clear()
+        self._paths = {}
+        self.generation += 1
+
+
+class CategorySelection:
+    """
+    Compiled set of selected category paths.
+
+    A category matches a selection entry when it is equal to it or lies below it
+    (starts with entry + " >"). Instead of testing every entry per row, the row's
+    own path and each of its " >" prefixes are looked up in a set, so a check costs
+    O(depth) no matter how many categories are ticked. Results are memoized per path.
+    """
+
+    def __init__(self, selected_paths):
+        """
+        Args:
+            selected_paths: Iterable of selected category strings (tree paths)
+        """
+        self.paths = frozenset(str(p) for p in selected_paths or [])
+        self._memo = {}
+
+    def __bool__(self):
+        return bool(self.paths)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def matches(self, full_path, main_category=""):
+        """
+        Checks a row's category against the selection.
+
+        Args:
+            full_path: Normalized full category path of the row
+            main_category: Main category of the row (also accepted as a match)
+
+        Returns:
+            bool: True if the row is in (or below) a selected category
+        """
+        return self.covers(full_path) or self.covers(main_category)
+
+    def covers(self, path):
+        """Returns True if path is selected itself or lies below a selected path."""
+        hit = self._memo.get(path)
+        if hit is None:
+            hit = path in self.paths
+            k = path.find(" >")
+            while not hit and k != -1:
+                hit = path[:k] in self.paths
+                k = path.find(" >", k + 1)
+            self._memo[path] = hit
+        return hit
+
+
+class CategoryNode:
+    """One level of a CategoryTrie."""
+    __slots__ = ("name", "path", "children", "count", "total")
+
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path        # Normalized full path ("" for the root)
+        self.children = {}      # name -> CategoryNode
+        self.count = 0          # Items counted on exactly this path
+        self.total = 0          # Items on this path and all subcategories
+
+    def sorted_children(self):
+        return [self.children[k] for k in sorted(self.children)]
+
+
+class CategoryTrie:
+    """
+    Category hierarchy with per-node subtree totals.
+
+    Built in one pass over the counts and totalled in one bottom-up pass, so every
+    node's "items including subcategories" value is available in O(1). The tree
+    widget and the cascade menu read the same instance.
+    """
+
+    def __init__(self, category_counts=None):
+        """
+        Args:
+            category_counts: dict like {"Alt Giyim > Sütyen": 45, ...} (normalized paths)
+        """
+        self.counts = dict(category_counts or {})
+        self.root = CategoryNode("", "")
+        self.nodes = {}  # path -> CategoryNode
+
+        for path, count in self.counts.items():
+            parts = [p.strip() for p in str(path).split(">") if p.strip()]
+            node = self.root
+            for part in parts:
+                child = node.children.get(part)
+                if child is None:
+                    child_path = f"{node.path} > {part}" if node.path else part
+                    child = CategoryNode(part, child_path)
+                    node.children[part] = child
+                    self.nodes[child_path] = child
+                node = child
+            if node is not self.root:
+                node.count += count
+
+        self._sum_totals()
+
+    def _sum_totals(self):
+        # Iterative post-order so deep hierarchies cannot hit the recursion limit
+        stack = [(self.root, False)]
+        while stack:
+            node, children_done = stack.pop()
+            if children_done:
+                node.total = node.count + sum(c.total for c in node.children.values())
+            else:
+                stack.append((node, True))
+                stack.extend((c, False) for c in node.children.values())
+
+    def total(self, path):
+        """Returns the item count of path including subcategories (0 if unknown)."""
+        node = self.nodes.get(path)
+        return node.total if node is not None else 0
+
+    def subset(self, selection):
+        """
+        Returns a new trie restricted to the selected categories.
+
+        Args:
+            selection: CategorySelection (or list of selected paths)
+        """
+        if not isinstance(selection, CategorySelection):
+            selection = CategorySelection(selection)
+        return CategoryTrie({p: c for p, c in self.counts.items() if selection.covers(p)})
@@ -4,8 +4,18 @@ Provides hierarchical category tree widget with checkbox selection.
 This is a new module that adds optional tree-based category viewing.
 """
 
-from PySide6.QtWidgets import QTreeWidget, QTreeWidgetItem, QDialog, QVBoxLayout, QLabel, QPushButton
-from PySide6.QtCore import Qt, Signal
+import numpy as np
+from PySide6.QtWidgets import QTreeView, QDialog, QVBoxLayout, QLabel, QPushButton
+from PySide6.QtCore import Qt, Signal, QAbstractItemModel, QModelIndex
+
+from category_paths import CategoryTrie
+
+# Qt enum attribute lookups are slow in PySide6; the model's hot paths use these
+DISPLAY_ROLE = Qt.DisplayRole
+CHECK_STATE_ROLE = Qt.CheckStateRole
+USER_ROLE = Qt.UserRole
+CHECK_STATES = (Qt.Unchecked, Qt.PartiallyChecked, Qt.Checked)
+NODE_FLAGS = Qt.ItemIsEnabled | Qt.ItemIsUserCheckable
 
 
 class CategoryParser:
@@ -60,9 +70,272 @@ class CategoryParser:
         return hierarchy
 
 
-class CategoryTreeWidget(QTreeWidget):
+class CategoryTreeModel(QAbstractItemModel):
     """
-    Custom tree widget for hierarchical category selection with checkboxes.
+    Item model for the category hierarchy.
+    
+    Nodes are numbered in pre-order (children sorted by name), so every subtree is
+    a contiguous id range and parents always come before their children. Check
+    states live in one numpy array; checking a node sets its whole range at once and
+    parents are recomputed level by level in a single batched pass. Children are
+    handed to the view only when a node is expanded (canFetchMore / fetchMore).
+    """
+    
+    # Emitted after the user toggled a checkbox
+    checksChanged = Signal()
+    
+    UNCHECKED = 0
+    PARTIAL = 1
+    CHECKED = 2
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._clear_nodes()
+    
+    def _clear_nodes(self):
+        self.names = []
+        self.paths = []
+        self.labels = []
+        self.path_ids = {}                              # path -> node id
+        self.parent_ids = np.zeros(0, dtype=np.int64)   # -1 for top level
+        self.depth = np.zeros(0, dtype=np.int64)
+        self.subtree_size = np.zeros(0, dtype=np.int64) # node + descendants
+        self.row_in_parent = np.zeros(0, dtype=np.int64)
+        self.child_start = np.zeros(0, dtype=np.int64)  # into child_ids
+        self.child_count = np.zeros(0, dtype=np.int64)
+        self.child_ids = np.zeros(0, dtype=np.int64)
+        self.top_ids = np.zeros(0, dtype=np.int64)
+        self.state = np.zeros(0, dtype=np.int8)
+        self.fetched = set()                            # nodes whose children the view has
+    
+    def set_hierarchy(self, hierarchy):
+        """
+        Replaces the tree (all nodes unchecked).
+        
+        Args:
+            hierarchy: Nested dict like {"Parent": {"Child": {}, ...}, ...}
+        """
+        self.beginResetModel()
+        self._clear_nodes()
+        
+        names, paths, parents, depths = [], [], [], []
+        children = []  # per node: list of child ids
+        top = []
+        
+        # Iterative pre-order walk (sorted names)
+        stack = [(name, hierarchy[name], -1, "", 0) for name in sorted(hierarchy, reverse=True)]
+        while stack:
+            name, sub, parent_id, parent_path, level = stack.pop()
+            node_id = len(names)
+            path = f"{parent_path} > {name}" if parent_path else name
+            names.append(name)
+            paths.append(path)
+            parents.append(parent_id)
+            depths.append(level)
+            children.append([])
+            (children[parent_id] if parent_id >= 0 else top).append(node_id)
+            for child in sorted(sub, reverse=True):
+                stack.append((child, sub[child], node_id, path, level + 1))
+        
+        n = len(names)
+        self.names = names
+        self.paths = paths
+        self.labels = list(names)
+        self.path_ids = {p: i for i, p in enumerate(paths)}
+        self.parent_ids = np.array(parents, dtype=np.int64)
+        self.depth = np.array(depths, dtype=np.int64)
+        self.child_count = np.array([len(c) for c in children], dtype=np.int64)
+        self.child_start = np.concatenate(([0], np.cumsum(self.child_count)[:-1])).astype(np.int64) if n else np.zeros(0, dtype=np.int64)
+        self.child_ids = np.array([c for ch in children for c in ch], dtype=np.int64)
+        self.top_ids = np.array(top, dtype=np.int64)
+        
+        self.row_in_parent = np.zeros(n, dtype=np.int64)
+        for ch in children + [top]:
+            self.row_in_parent[ch] = np.arange(len(ch))
+        
+        # Subtree sizes, children before parents (reverse pre-order)
+        self.subtree_size = np.ones(n, dtype=np.int64)
+        for node_id in range(n - 1, -1, -1):
+            p = parents[node_id]
+            if p >= 0:
+                self.subtree_size[p] += self.subtree_size[node_id]
+        
+        self.state = np.zeros(n, dtype=np.int8)
+        self.endResetModel()
+    
+    # ----- Check state -----
+    
+    def set_checked_paths(self, selected_paths):
+        """Checks exactly the given paths (and their subcategories), then fixes parents."""
+        self.state[:] = self.UNCHECKED
+        for path in selected_paths:
+            node_id = self.path_ids.get(path)
+            if node_id is not None:
+                self.state[node_id:node_id + self.subtree_size[node_id]] = self.CHECKED
+        self._recompute_parents()
+        self._emit_all_changed([Qt.CheckStateRole])
+    
+    def set_all_checked(self, checked=True):
+        self.state[:] = self.CHECKED if checked else self.UNCHECKED
+        self._emit_all_changed([Qt.CheckStateRole])
+    
+    def checked_paths(self):
+        """Full paths of checked nodes, in tree order."""
+        return [self.paths[i] for i in np.flatnonzero(self.state == self.CHECKED)]
+    
+    def _recompute_parents(self):
+        """Derives every parent's state from its children, deepest level first."""
+        n = len(self.names)
+        if n == 0:
+            return
+        has_children = self.child_count > 0
+        for level in range(int(self.depth.max()), 0, -1):
+            nodes = np.flatnonzero(self.depth == level)
+            parents = self.parent_ids[nodes]
+            checked = np.bincount(parents, weights=self.state[nodes] == self.CHECKED, minlength=n)
+            touched = np.bincount(parents, weights=self.state[nodes] != self.UNCHECKED, minlength=n)
+            targets = np.unique(parents)
+            targets = targets[has_children[targets]]
+            new_state = np.where(checked[targets] == self.child_count[targets], self.CHECKED,
+                                 np.where(touched[targets] == 0, self.UNCHECKED, self.PARTIAL))
+            self.state[targets] = new_state
+    
+    def _recompute_ancestors(self, node_id):
+        """Updates the chain of parents above one node."""
+        p = self.parent_ids[node_id]
+        while p >= 0:
+            start = self.child_start[p]
+            kids = self.state[self.child_ids[start:start + self.child_count[p]]]
+            if (kids == self.CHECKED).all():
+                self.state[p] = self.CHECKED
+            elif (kids == self.UNCHECKED).all():
+                self.state[p] = self.UNCHECKED
+            else:
+                self.state[p] = self.PARTIAL
+            p = self.parent_ids[p]
+    
+    def set_labels(self, labels):
+        self.labels = labels
+        self._emit_all_changed([Qt.DisplayRole])
+    
+    def _emit_all_changed(self, roles):
+        """Notifies the view about every row it has been given so far."""
+        if len(self.top_ids):
+            self.dataChanged.emit(self.index(0, 0), self.index(len(self.top_ids) - 1, 0), roles)
+        for node_id in self.fetched:
+            if self.child_count[node_id]:
+                parent = self._index_of(node_id)
+                self.dataChanged.emit(self.index(0, 0, parent),
+                                      self.index(int(self.child_count[node_id]) - 1, 0, parent), roles)
+    
+    # ----- QAbstractItemModel -----
+    
+    def _node(self, index):
+        return index.internalId() if index.isValid() else -1
+    
+    def _index_of(self, node_id):
+        return self.createIndex(int(self.row_in_parent[node_id]), 0, int(node_id))
+    
+    def index(self, row, column, parent=QModelIndex()):
+        p = self._node(parent)
+        if p < 0:
+            if 0 <= row < len(self.top_ids) and column == 0:
+                return self.createIndex(row, 0, int(self.top_ids[row]))
+            return QModelIndex()
+        if 0 <= row < self.child_count[p] and column == 0:
+            return self.createIndex(row, 0, int(self.child_ids[self.child_start[p] + row]))
+        return QModelIndex()
+    
+    def parent(self, index):
+        node_id = self._node(index)
+        if node_id < 0:
+            return QModelIndex()
+        p = self.parent_ids[node_id]
+        if p < 0:
+            return QModelIndex()
+        return self._index_of(p)
+    
+    def rowCount(self, parent=QModelIndex()):
+        p = self._node(parent)
+        if p < 0:
+            return len(self.top_ids)
+        return int(self.child_count[p]) if p in self.fetched else 0
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 1
+    
+    def hasChildren(self, parent=QModelIndex()):
+        p = self._node(parent)
+        if p < 0:
+            return len(self.top_ids) > 0
+        return bool(self.child_count[p])
+    
+    def canFetchMore(self, parent):
+        p = self._node(parent)
+        return p >= 0 and p not in self.fetched and bool(self.child_count[p])
+    
+    def fetchMore(self, parent):
+        p = self._node(parent)
+        if p < 0 or p in self.fetched:
+            return
+        self.beginInsertRows(parent, 0, int(self.child_count[p]) - 1)
+        self.fetched.add(p)
+        self.endInsertRows()
+    
+    def data(self, index, role=Qt.DisplayRole):
+        node_id = self._node(index)
+        if node_id < 0:
+            return None
+        if role == DISPLAY_ROLE:
+            return self.labels[node_id]
+        if role == CHECK_STATE_ROLE:
+            return CHECK_STATES[self.state[node_id]]
+        if role == USER_ROLE:
+            return self.paths[node_id]  # Full path
+        return None
+    
+    def setData(self, index, value, role=Qt.EditRole):
+        node_id = self._node(index)
+        if node_id < 0 or role != CHECK_STATE_ROLE:
+            return False
+        new_state = self.CHECKED if int(getattr(value, "value", value)) == self.CHECKED else self.UNCHECKED
+        
+        # Whole subtree follows the clicked node, then its ancestors are re-derived
+        end = node_id + int(self.subtree_size[node_id])
+        self.state[node_id:end] = new_state
+        self._recompute_ancestors(node_id)
+        
+        # Refresh the clicked row, its ancestors and any expanded rows below it
+        roles = [Qt.CheckStateRole]
+        p = node_id
+        while p >= 0:
+            idx = self._index_of(p)
+            self.dataChanged.emit(idx, idx, roles)
+            p = self.parent_ids[p]
+        for fetched_id in self.fetched:
+            if node_id <= fetched_id < end and self.child_count[fetched_id]:
+                parent = self._index_of(fetched_id)
+                self.dataChanged.emit(self.index(0, 0, parent),
+                                      self.index(int(self.child_count[fetched_id]) - 1, 0, parent), roles)
+        
+        self.checksChanged.emit()
+        return True
+    
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole and section == 0:
+            return "Kategoriler"
+        return None
+    
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return NODE_FLAGS
+
+
+class CategoryTreeWidget(QTreeView):
+    """
+    Tree view for hierarchical category selection with checkboxes.
+    Backed by CategoryTreeModel; only expanded levels are materialized.
     """
     
     # Signal emitting the full list of selected paths
@@ -70,14 +343,13 @@ class CategoryTreeWidget(QTreeWidget):
 
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.setHeaderLabel("Kategoriler")
-        self.setSelectionMode(QTreeWidget.NoSelection)  # Use checkboxes instead
-        
-        # Track items by full path for easy lookup
-        self.item_map = {}  # "Parent > Child" -> QTreeWidgetItem
+        self.category_model = CategoryTreeModel(self)
+        self.setModel(self.category_model)
+        self.setSelectionMode(QTreeView.NoSelection)  # Use checkboxes instead
+        self.setUniformRowHeights(True)
         
         # Connect signals
-        self.itemChanged.connect(self._on_item_changed)
+        self.category_model.checksChanged.connect(self._on_checks_changed)
     
     def build_tree(self, categories):
         """
@@ -86,150 +358,39 @@ class CategoryTreeWidget(QTreeWidget):
         Args:
             categories: List of category strings (can include ">" for hierarchy)
         """
-        # CRITICAL: Block signals during rebuild to prevent spurious empty selections
-        self.blockSignals(True)
-        
-        self.clear()
-        self.item_map.clear()
-        
         # Parse and build hierarchy
         hierarchy = CategoryParser.build_hierarchy(categories)
+        self.category_model.set_hierarchy(hierarchy)
         
-        # Recursively add items
-        self._add_tree_items(hierarchy, None, "")
-        
-        # Expand all by default
-        self.expandAll()
-        
-        # Re-enable signals
-        self.blockSignals(False)
+        # Open the first level; deeper levels load when expanded
+        for row in range(self.category_model.rowCount()):
+            self.expand(self.category_model.index(row, 0))
+    
+    def all_paths(self):
+        """Returns the full paths of every node in the tree."""
+        return list(self.category_model.paths)
     
     def update_counts(self, category_counts):
         """
         Updates tree items to show product counts.
         
         Args:
-            category_counts: dict like {"Alt Giyim > Sütyen": 45, ...}
-        """
-        # Block signals to prevent setText from triggering itemChanged
-        self.blockSignals(True)
-        
-        # ===== NEW FEATURE: Show product counts in tree =====
-        for full_path, item in self.item_map.items():
-            # Calculate total count (including subcategories)
-            total_count = self._calculate_total_count(full_path, category_counts)
-            
-            # Get category name (last part of path)
-            cat_name = full_path.split(" > ")[-1] if " > " in full_path else full_path
-            
-            # Update display text
-            if total_count > 0:
-                item.setText(0, f"{cat_name} ({total_count})")
-            else:
-                item.setText(0, cat_name)
-        # ===== END NEW FEATURE =====
-        
-        # Re-enable signals
-        self.blockSignals(False)
-    
-    def _calculate_total_count(self, category_path, counts):
-        """Calculate total count for category including all subcategories"""
-        total = 0
-        for cat, count in counts.items():
-            # Match exact or if it's a subcategory
-            if cat == category_path or cat.startswith(category_path + " >"):
-                total += count
-        return total
-    
-    def _add_tree_items(self, hierarchy_dict, parent_item, parent_path):
-        """
-        Recursively adds items to the tree.
-        
-        Args:
-            hierarchy_dict: Nested dict of categories
-            parent_item: Parent QTreeWidgetItem (None for root)
-            parent_path: Full path of parent (e.g., "Parent > ")
+            category_counts: dict like {"Alt Giyim > Sütyen": 45, ...} or a CategoryTrie of it
         """
-        for cat_name, children in sorted(hierarchy_dict.items()):
-            # Create item
-            item = QTreeWidgetItem()
-            item.setText(0, cat_name)
-            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
-            item.setCheckState(0, Qt.Unchecked)
-            
-            # Calculate full path
-            full_path = parent_path + cat_name if parent_path else cat_name
-            item.setData(0, Qt.UserRole, full_path)  # Store full path
-            
-            # Add to tree
-            if parent_item:
-                parent_item.addChild(item)
-            else:
-                self.addTopLevelItem(item)
-            
-            # Store in map
-            self.item_map[full_path] = item
-            
-            # Add children recursively
-            if children:
-                self._add_tree_items(children, item, full_path + " > ")
+        # Subtree totals are computed once, bottom-up
+        trie = category_counts if isinstance(category_counts, CategoryTrie) else CategoryTrie(category_counts)
+        
+        labels = []
+        for cat_name, full_path in zip(self.category_model.names, self.category_model.paths):
+            # Total count (including subcategories)
+            total_count = trie.total(full_path)
+            labels.append(f"{cat_name} ({total_count})" if total_count > 0 else cat_name)
+        self.category_model.set_labels(labels)
     
-    def _on_item_changed(self, item, column):
-        """
-        Handles checkbox state changes with parent-child logic.
-        """
-        if column != 0:
-            return
-        
-        # Block signals to prevent recursion
-        self.blockSignals(True)
-        
-        # Get new state
-        new_state = item.checkState(0)
-        
-        # Update all children
-        self._update_children(item, new_state)
-        
-        # Update parent state
-        self._update_parent(item)
-        
-        self.blockSignals(False)
-        
+    def _on_checks_changed(self):
         # Emit new state
         self.selectionChanged.emit(self.get_selected_categories())
     
-    def _update_children(self, item, state):
-        """
-        Recursively updates all children to match parent state.
-        """
-        for i in range(item.childCount()):
-            child = item.child(i)
-            child.setCheckState(0, state)
-            self._update_children(child, state)
-    
-    def _update_parent(self, item):
-        """
-        Updates parent state based on children (checked/unchecked/partial).
-        """
-        parent = item.parent()
-        if not parent:
-            return
-        
-        # Count children states
-        total = parent.childCount()
-        checked = sum(1 for i in range(total) if parent.child(i).checkState(0) == Qt.Checked)
-        partial = sum(1 for i in range(total) if parent.child(i).checkState(0) == Qt.PartiallyChecked)
-        
-        if checked == total:
-            parent.setCheckState(0, Qt.Checked)
-        elif checked == 0 and partial == 0:
-            parent.setCheckState(0, Qt.Unchecked)
-        else:
-            parent.setCheckState(0, Qt.PartiallyChecked)
-        
-        # Recursively update grandparent
-        self._update_parent(parent)
-    
     def get_selected_categories(self):
         """
         Returns list of all selected category paths.
@@ -237,22 +398,7 @@ class CategoryTreeWidget(QTreeWidget):
         Returns:
             list: Full paths of checked categories (e.g., ["Alt Giyim", "Alt Giyim > Sütyen"])
         """
-        selected = []
-        
-        def collect_checked(item):
-            if item.checkState(0) == Qt.Checked:
-                path = item.data(0, Qt.UserRole)
-                if path:
-                    selected.append(path)
-            
-            for i in range(item.childCount()):
-                collect_checked(item.child(i))
-        
-        # Iterate all top-level items
-        for i in range(self.topLevelItemCount()):
-            collect_checked(self.topLevelItem(i))
-        
-        return selected
+        return self.category_model.checked_paths()
     
     def set_selected_categories(self, selected_paths):
         """
@@ -261,38 +407,13 @@ class CategoryTreeWidget(QTreeWidget):
         Args:
             selected_paths: List of full category paths to select
         """
-        self.blockSignals(True)
-        
-        # First uncheck all
-        for i in range(self.topLevelItemCount()):
-            self._uncheck_all(self.topLevelItem(i))
-        
-        # Then check specified paths
-        for path in selected_paths:
-            item = self.item_map.get(path)
-            if item:
-                item.setCheckState(0, Qt.Checked)
-                # Update children
-                self._update_children(item, Qt.Checked)
-        
-        # Update all parent states
-        for i in range(self.topLevelItemCount()):
-            self._update_parent_recursive(self.topLevelItem(i))
-        
-        self.blockSignals(False)
+        self.category_model.set_checked_paths(selected_paths)
         self.selectionChanged.emit(self.get_selected_categories())
     
-    def _uncheck_all(self, item):
-        """Recursively unchecks all items."""
-        item.setCheckState(0, Qt.Unchecked)
-        for i in range(item.childCount()):
-            self._uncheck_all(item.child(i))
-    
-    def _update_parent_recursive(self, item):
-        """Recursively updates parent states from bottom up."""
-        for i in range(item.childCount()):
-            self._update_parent_recursive(item.child(i))
-        self._update_parent(item)
+    def select_all(self):
+        """Checks every category."""
+        self.category_model.set_all_checked(True)
+        self.selectionChanged.emit(self.get_selected_categories())
 
 
 class CategoryDetailDialog(QDialog):
@@ -0,0 +1,247 @@
+"""
+Column Blocks Module
+Encodes blocks of worksheet rows column by column into typed NumPy arrays.
+Every cell gets a kind code; its value goes to the array of that kind: int64
+for ints, booleans and datetimes (microseconds since 1970), float64 for floats
+and small integer codes into the block's table of distinct strings for text.
+The rare cells fitting none of these (dates, times, durations, huge ints) are
+kept as they are. Decoding gives back the same values, types and row shapes.
+The in-memory dataset store (dataset_cache.ColumnStore) holds its rows as
+RowBlocks, and the on-disk cache (columnar_cache) writes and reads the same arrays.
+"""
+
+import datetime
+import sys
+
+import numpy as np
+import pandas as pd
+
+
+# Per-cell kinds
+KIND_NONE, KIND_STR, KIND_INT, KIND_FLOAT, KIND_BOOL, KIND_DATETIME, KIND_OTHER = range(7)
+_KIND_BY_TYPE = {type(None): KIND_NONE, str: KIND_STR, int: KIND_INT, float: KIND_FLOAT,
+                 bool: KIND_BOOL, datetime.datetime: KIND_DATETIME}
+
+# Row length marker for the empty list openpyxl yields for missing rows of unsized sheets
+EMPTY_LIST_ROW = -1
+
+
+def _code_dtype(n):
+    return np.int8 if n <= 127 else np.int16 if n <= 32767 else np.int32
+
+
+class EncodedColumn:
+    """
+    Cells of one column of a RowBlock.
+
+    kinds is one kind for the whole column or a uint8 array with one kind per
+    cell; ints, floats and codes (into strings) are full-length arrays used at
+    the cells of their kinds, other maps row offsets to the values kept as they are.
+    """
+
+    __slots__ = ("n", "kinds", "ints", "floats", "codes", "strings", "other", "nbytes")
+
+    def __init__(self, n, kinds, ints=None, floats=None, codes=None, strings=None, other=None):
+        self.n = n
+        self.kinds = kinds
+        self.ints = ints
+        self.floats = floats
+        self.codes = codes
+        self.strings = strings
+        self.other = other
+        nbytes = sum(a.nbytes for a in (kinds, ints, floats, codes, strings) if isinstance(a, np.ndarray))
+        if strings is not None:
+            nbytes += sum(map(sys.getsizeof, strings))
+        if other:
+            nbytes += sum(sys.getsizeof(v) + 64 for v in other.values())
+        self.nbytes = nbytes
+
+    @classmethod
+    def encode(cls, values):
+        """Encodes a sequence of cell values."""
+        n = len(values)
+        types = set(map(type, values))
+        if len(types) == 1:
+            kind = _KIND_BY_TYPE.get(next(iter(types)), KIND_OTHER)
+            if kind == KIND_NONE:
+                return cls(n, KIND_NONE)
+            if kind == KIND_STR:
+                codes, strings = pd.factorize(np.array(values, dtype=object))
+                return cls(n, KIND_STR, codes=codes.astype(_code_dtype(len(strings))), strings=strings)
+            if kind == KIND_FLOAT:
+                return cls(n, KIND_FLOAT, floats=np.array(values, dtype=np.float64))
+            if kind == KIND_BOOL:
+                return cls(n, KIND_BOOL, ints=np.array(values, dtype=np.int64))
+            if kind == KIND_DATETIME and all(v.tzinfo is None for v in values):
+                return cls(n, KIND_DATETIME, ints=np.array(values, dtype="datetime64[us]").view(np.int64))
+            if kind == KIND_INT:
+                try:
+                    return cls(n, KIND_INT, ints=np.array(values, dtype=np.int64))
+                except OverflowError:
+                    pass # ints beyond int64 are kept as they are
+            if kind == KIND_OTHER:
+                return cls(n, KIND_OTHER, other=dict(enumerate(values)))
+
+        values = np.array(values, dtype=object)
+        kinds = np.fromiter((_KIND_BY_TYPE.get(type(v), KIND_OTHER) for v in values), dtype=np.uint8, count=n)
+        ints = floats = codes = strings = None
+
+        mask = kinds == KIND_DATETIME
+        if mask.any():
+            for i in np.flatnonzero(mask).tolist():
+                if values[i].tzinfo is not None:
+                    kinds[i] = KIND_OTHER
+        int_mask = (kinds == KIND_INT) | (kinds == KIND_BOOL)
+        mask = kinds == KIND_DATETIME
+        if int_mask.any() or mask.any():
+            ints = np.zeros(n, dtype=np.int64)
+            if mask.any():
+                ints[mask] = values[mask].astype("datetime64[us]").view(np.int64)
+            if int_mask.any():
+                try:
+                    ints[int_mask] = values[int_mask].astype(np.int64)
+                except OverflowError:
+                    for i in np.flatnonzero(int_mask).tolist():
+                        try:
+                            ints[i] = values[i]
+                        except OverflowError:
+                            kinds[i] = KIND_OTHER
+
+        mask = kinds == KIND_FLOAT
+        if mask.any():
+            floats = np.zeros(n, dtype=np.float64)
+            floats[mask] = values[mask].astype(np.float64)
+
+        mask = kinds == KIND_STR
+        if mask.any():
+            found, strings = pd.factorize(values[mask])
+            codes = np.zeros(n, dtype=_code_dtype(len(strings)))
+            codes[mask] = found
+
+        other = {i: values[i] for i in np.flatnonzero(kinds == KIND_OTHER).tolist()} or None
+        present = np.flatnonzero(np.bincount(kinds, minlength=KIND_OTHER + 1))
+        if len(present) == 1:
+            kinds = int(present[0])
+        return cls(n, kinds, ints, floats, codes, strings, other)
+
+    def values(self, lo=0, hi=None):
+        """Decoded cells lo ... hi - 1 as a list."""
+        hi = self.n if hi is None else hi
+        kinds = self.kinds
+        if not isinstance(kinds, np.ndarray):
+            if kinds == KIND_OTHER:
+                return [self.other[i] for i in range(lo, hi)]
+            return self._decode(kinds, slice(lo, hi)).tolist()
+
+        part = kinds[lo:hi]
+        out = np.empty(hi - lo, dtype=object) # None-filled
+        for kind in np.unique(part).tolist():
+            if kind == KIND_NONE:
+                continue
+            mask = part == kind
+            if kind == KIND_OTHER:
+                for j in np.flatnonzero(mask).tolist():
+                    out[j] = self.other[lo + j]
+            else:
+                out[mask] = self._decode(kind, slice(lo, hi))[mask]
+        return out.tolist()
+
+    def value(self, i):
+        """Decoded cell i."""
+        kind = self.kinds if not isinstance(self.kinds, np.ndarray) else int(self.kinds[i])
+        if kind == KIND_NONE:
+            return None
+        if kind == KIND_OTHER:
+            return self.other[i]
+        return self._decode(kind, slice(i, i + 1)).tolist()[0]
+
+    def _decode(self, kind, rows):
+        # Array of the values of one kind over rows (meaningful at that kind's cells only)
+        if kind == KIND_STR:
+            return self.strings[self.codes[rows]]
+        if kind == KIND_FLOAT:
+            return self.floats[rows]
+        if kind == KIND_INT:
+            return self.ints[rows]
+        if kind == KIND_BOOL:
+            return self.ints[rows].astype(bool)
+        if kind == KIND_DATETIME:
+            return self.ints[rows].astype("datetime64[us]")
+        return np.full(rows.stop - rows.start, None, dtype=object) # KIND_NONE
+
+
+class RowBlock:
+    """
+    A run of worksheet rows encoded column by column.
+
+    Rows keep their own length: lengths (int32, EMPTY_LIST_ROW for an empty
+    list row) is only stored when some row does not have exactly ncols cells.
+    """
+
+    __slots__ = ("n", "ncols", "lengths", "columns", "nbytes")
+
+    def __init__(self, n, ncols, lengths, columns):
+        self.n = n
+        self.ncols = ncols
+        self.lengths = lengths
+        self.columns = columns
+        self.nbytes = sum(c.nbytes for c in columns) + (0 if lengths is None else lengths.nbytes)
+
+    @classmethod
+    def encode(cls, rows, width=0):
+        """
+        Args:
+            rows: Row tuples (empty lists stand for missing rows)
+            width: Least number of columns (the header row's length)
+        """
+        n = len(rows)
+        lengths = [EMPTY_LIST_ROW if type(r) is list and not r else len(r) for r in rows]
+        ncols = max(max(lengths, default=0), width)
+        if lengths.count(ncols) == n:
+            lengths = None
+        else:
+            rows = [r if len(r) == ncols else tuple(r) + (None,) * (ncols - len(r)) for r in rows]
+            lengths = np.array(lengths, dtype=np.int32)
+        columns = list(zip(*rows)) if n else [()] * ncols
+        return cls(n, ncols, lengths, [EncodedColumn.encode(values) for values in columns])
+
+    def row_length(self, j):
+        return self.ncols if self.lengths is None else int(self.lengths[j])
+
+    def rows(self, lo=0, hi=None):
+        """Rows lo ... hi - 1 as they were encoded (tuples, empty lists kept)."""
+        hi = self.n if hi is None else hi
+        columns = [c.values(lo, hi) for c in self.columns]
+        rows = list(zip(*columns)) if columns else [()] * (hi - lo)
+        if self.lengths is not None:
+            lengths = self.lengths[lo:hi]
+            for j in np.flatnonzero(lengths != self.ncols).tolist():
+                length = int(lengths[j])
+                rows[j] = [] if length == EMPTY_LIST_ROW else rows[j][:length]
+        return rows
+
+    def project(self, positions):
+        """
+        Block of the given columns only, cut like dataset_cache.project_rows:
+        a row keeps the listed columns that lie within its own length.
+
+        Args:
+            positions: Sorted 0-based column indices
+        """
+        positions = list(positions)
+        empty = None
+        columns = []
+        for p in positions:
+            if p < self.ncols:
+                columns.append(self.columns[p])
+            else:
+                # Beyond every row of this block
+                empty = empty or EncodedColumn(self.n, KIND_NONE)
+                columns.append(empty)
+        ncols = len(positions)
+        old = np.full(self.n, self.ncols, dtype=np.int32) if self.lengths is None else self.lengths
+        lengths = np.searchsorted(np.array(positions, dtype=np.int64), old, side="left").astype(np.int32)
+        lengths[old == EMPTY_LIST_ROW] = EMPTY_LIST_ROW
+        if (lengths == ncols).all():
+            lengths = None
+        return RowBlock(self.n, ncols, lengths, columns)
@@ -0,0 +1,431 @@
+"""
+Columnar Cache Module
+On-disk cache of parsed workbooks as typed NumPy column arrays.
+Reopening a large supplier file then costs a few block reads instead of a full
+XLSX parse. Rows are stored in the blocks the in-memory store uses
+(column_blocks.RowBlock): per-cell kind codes, int64 / float64 arrays and
+string codes with a UTF-8 string table per block, all in one data file. The few
+cells kept as they are (dates, times, durations, huge ints) go to the JSON
+block index in a tagged form; nothing is pickled. Blocks are read lazily, one
+at a time, and their arrays are used as they are read.
+Rows come back exactly as they went in: same values, types and row shapes.
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import threading
+import weakref
+
+import numpy as np
+
+from column_blocks import KIND_NONE, EncodedColumn, RowBlock
+from dataset_cache import project_rows
+
+
+# Bumped whenever the stored layout or the reader semantics change
+CACHE_FORMAT_VERSION = 2
+
+
+def _entry_key(fingerprint, columns=None):
+    raw = json.dumps([CACHE_FORMAT_VERSION, list(fingerprint), columns and list(columns)], ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _to_json(value):
+    """JSON form of a cell value; types JSON has no notation for are tagged lists."""
+    t = type(value)
+    if value is None or t in (str, int, float, bool):
+        return value
+    if t is datetime.datetime and value.tzinfo is None:
+        return ["datetime", value.isoformat()]
+    if t is datetime.date:
+        return ["date", value.isoformat()]
+    if t is datetime.time and value.tzinfo is None:
+        return ["time", value.isoformat()]
+    if t is datetime.timedelta:
+        return ["timedelta", value.days, value.seconds, value.microseconds]
+    raise TypeError(f"{t.__name__} hücresi önbelleğe yazılamıyor")
+
+
+def _from_json(value):
+    if type(value) is not list:
+        return value
+    tag = value[0]
+    if tag == "datetime":
+        return datetime.datetime.fromisoformat(value[1])
+    if tag == "date":
+        return datetime.date.fromisoformat(value[1])
+    if tag == "time":
+        return datetime.time.fromisoformat(value[1])
+    if tag == "timedelta":
+        return datetime.timedelta(days=value[1], seconds=value[2], microseconds=value[3])
+    raise ValueError(f"unknown cached value tag {tag!r}")
+
+
+class CachedWorkbook:
+    """
+    Rows of one cached workbook, read from disk a block at a time.
+
+    block(b) reads only that block's part of the data file (only the selected
+    columns for a projection) and returns a RowBlock whose arrays are the bytes
+    just read; nothing else is loaded. While a CachedWorkbook is alive, its
+    entry is kept by eviction and purge.
+    """
+
+    def __init__(self, directory, meta, index, positions=None):
+        """
+        Args:
+            directory: Entry directory
+            meta: Entry meta (meta.json)
+            index: Block index (index.json)
+            positions: Sorted 0-based columns of the entry to read (None = all), cut
+                       like dataset_cache.project_rows
+        """
+        self.directory = directory
+        self.meta = meta
+        self.index = index
+        self.positions = positions
+        self.block_rows = meta["block_rows"]
+        header = meta["header"]
+        if header is None:
+            self.header_row = None
+        else:
+            header = [_from_json(v) for v in header]
+            self.header_row = header if meta.get("header_list") else tuple(header)
+            if positions is not None:
+                self.header_row = project_rows([self.header_row], positions)[0]
+        # Columns of the source sheet held (None = all)
+        held = meta["columns"]
+        self.columns = None if positions is None and held is None else tuple(
+            positions if held is None else held if positions is None else [held[p] for p in positions])
+
+    @property
+    def n_rows(self):
+        """Data rows stored (grows while the entry is still being written)."""
+        return self.meta["rows"]
+
+    @property
+    def n_blocks(self):
+        """Blocks stored, readable with block()."""
+        return len(self.index)
+
+    def project(self, positions):
+        """Reader of the given columns of this one (positions index its own columns)."""
+        if self.positions is not None:
+            positions = [self.positions[p] for p in positions]
+        return CachedWorkbook(self.directory, self.meta, self.index, positions)
+
+    def block(self, b):
+        """Reads block b (data rows b * block_rows ... up to block_rows more)."""
+        entry = self.index[b]
+        path = os.path.join(self.directory, "data.bin")
+        with open(path, "rb") as f:
+            if self.positions is None:
+                whole = self._read(f, entry["span"])
+                spans = dict.fromkeys(range(len(entry["columns"])), whole)
+            else:
+                spans = {p: self._read(f, entry["columns"][p]["span"]) for p in self.positions
+                         if p < len(entry["columns"])}
+            lengths = entry["lengths"]
+            if lengths is not None:
+                part = whole if self.positions is None else self._read(f, [lengths[0], lengths[2] * np.dtype(lengths[1]).itemsize])
+                lengths = self._array(*part, lengths)
+        # Columns not read are never looked at by the projection
+        columns = [EncodedColumn(entry["n"], KIND_NONE)] * len(entry["columns"])
+        for c, (buf, base) in spans.items():
+            columns[c] = self._column(entry["n"], entry["columns"][c], buf, base)
+        block = RowBlock(entry["n"], entry["ncols"], lengths, columns)
+        return block if self.positions is None else block.project(self.positions)
+
+    @staticmethod
+    def _read(f, span):
+        offset, size = span[0], span[1]
+        f.seek(offset)
+        buf = f.read(size)
+        if len(buf) != size:
+            raise ValueError("cached block is truncated")
+        return buf, offset
+
+    @staticmethod
+    def _array(buf, base, seg):
+        offset, dtype, count = seg
+        return np.frombuffer(buf, dtype=dtype, count=count, offset=offset - base)
+
+    def _column(self, n, spec, buf, base):
+        arrays = {name: self._array(buf, base, spec[name]) for name in ("ints", "floats", "codes", "str_offsets", "str_blob")
+                  if name in spec}
+        kinds = spec["kinds"]
+        if type(kinds) is list:
+            kinds = self._array(buf, base, kinds)
+        strings = None
+        if "str_offsets" in arrays:
+            blob = arrays["str_blob"].tobytes()
+            offsets = arrays["str_offsets"].tolist()
+            strings = np.empty(len(offsets) - 1, dtype=object)
+            strings[:] = [blob[a:b].decode("utf-8", "surrogatepass") for a, b in zip(offsets, offsets[1:])]
+        other = {row: _from_json(value) for row, value in spec["other"]} if "other" in spec else None
+        return EncodedColumn(n, kinds, arrays.get("ints"), arrays.get("floats"), arrays.get("codes"), strings, other)
+
+
+class EntryWriter:
+    """
+    Writes one workbook into the cache block by block, while it is parsed.
+
+    append() adds a RowBlock to the data file; commit() writes the index and
+    the meta file, which publishes the entry (load() ignores an entry without
+    meta). Blocks appended can be read back at once through workbook. A write
+    error or a cell that cannot be stored stops the writer (failed); blocks
+    already written stay readable until workbook is no longer used.
+    """
+
+    def __init__(self, cache, fingerprint, columns, header_row, block_rows):
+        self.cache = cache
+        self.failed = False
+        self.index = []
+        self.meta = {"version": CACHE_FORMAT_VERSION, "fingerprint": list(fingerprint),
+                     "columns": columns and list(columns),
+                     "header": None if header_row is None else [_to_json(v) for v in header_row],
+                     "header_list": type(header_row) is list, "block_rows": block_rows, "rows": 0}
+        self.directory = cache._new_entry_dir(fingerprint, columns)
+        os.makedirs(self.directory, exist_ok=True)
+        self._file = open(os.path.join(self.directory, "data.bin"), "wb")
+        self.workbook = cache._open(self.directory, self.meta, self.index)
+
+    def append(self, block):
+        """Writes the next block (blocks must come in row order)."""
+        if self.failed:
+            return
+        try:
+            f = self._file
+            start = f.tell()
+            lengths = None if block.lengths is None else self._write(block.lengths)
+            columns = [self._write_column(column) for column in block.columns]
+            f.flush()
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Columnar cache write failed: {e}")
+            self.abort()
+            return
+        self.index.append({"n": block.n, "ncols": block.ncols, "lengths": lengths, "columns": columns,
+                           "span": [start, f.tell() - start]})
+        self.meta["rows"] += block.n
+
+    def _write(self, array):
+        f = self._file
+        array = np.ascontiguousarray(array)
+        offset = f.tell()
+        f.write(array.data)
+        return [offset, array.dtype.str, len(array)]
+
+    def _write_column(self, column):
+        start = self._file.tell()
+        spec = {"kinds": self._write(column.kinds) if isinstance(column.kinds, np.ndarray) else column.kinds}
+        for name in ("ints", "floats", "codes"):
+            array = getattr(column, name)
+            if array is not None:
+                spec[name] = self._write(array)
+        if column.strings is not None:
+            encoded = [s.encode("utf-8", "surrogatepass") for s in column.strings]
+            offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+            np.cumsum([len(s) for s in encoded], out=offsets[1:])
+            spec["str_offsets"] = self._write(offsets)
+            spec["str_blob"] = self._write(np.frombuffer(b"".join(encoded), dtype=np.uint8))
+        if column.other:
+            spec["other"] = [[row, _to_json(value)] for row, value in column.other.items()]
+        spec["span"] = [start, self._file.tell() - start]
+        return spec
+
+    def commit(self):
+        """
+        Publishes the entry and evicts old entries over the size cap.
+
+        Returns:
+            bool: False if nothing could be stored
+        """
+        if self.failed:
+            return False
+        try:
+            self._file.close()
+            with open(os.path.join(self.directory, "index.json"), "w", encoding="utf-8") as f:
+                json.dump(self.index, f)
+            meta = dict(self.meta, bytes=sum(os.path.getsize(os.path.join(self.directory, n))
+                                             for n in ("data.bin", "index.json")))
+            # Written last and renamed into place: an entry with meta is complete
+            meta_path = os.path.join(self.directory, "meta.json")
+            with open(meta_path + ".part", "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+            os.replace(meta_path + ".part", meta_path)
+        except OSError as e:
+            print(f"Columnar cache write failed: {e}")
+            self.abort()
+            return False
+        self.cache.evict()
+        return True
+
+    def abort(self):
+        """Stops writing; the entry is deleted once workbook is no longer used."""
+        self.failed = True
+        try:
+            self._file.close()
+        except OSError:
+            pass
+        weakref.finalize(self.workbook, shutil.rmtree, self.directory, True)
+
+
+class ColumnarDiskCache:
+    """
+    Directory of cached workbooks, one sub-directory per file version and column set.
+
+    Entries are looked up by the (path, size, mtime) fingerprint of the source
+    file. After each store the least recently used entries are removed until the
+    total size fits max_bytes. Entries still read by an open CachedWorkbook are
+    never removed.
+    """
+
+    def __init__(self, directory, max_bytes=2 * 1024 ** 3):
+        """
+        Args:
+            directory: Cache root (created on first store)
+            max_bytes: Size cap for all entries together
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._in_use = weakref.WeakSet() # open CachedWorkbooks
+        self._written = 0 # side directories made (see _new_entry_dir)
+        self._lock = threading.Lock()
+
+    def _entry_dir(self, fingerprint, columns=None):
+        return os.path.join(self.directory, _entry_key(fingerprint, columns))
+
+    def _new_entry_dir(self, fingerprint, columns):
+        # The entry's own directory, emptied; a side directory if that one is still read
+        entry = self._entry_dir(fingerprint, columns)
+        pinned = self._pinned()
+        if os.path.abspath(entry) in pinned:
+            with self._lock:
+                self._written += 1
+                entry = f"{entry}.{os.getpid()}_{self._written}"
+        shutil.rmtree(entry, ignore_errors=True)
+        return entry
+
+    def _open(self, entry, meta, index, positions=None):
+        workbook = CachedWorkbook(entry, meta, index, positions)
+        with self._lock:
+            self._in_use.add(workbook)
+        return workbook
+
+    def _pinned(self):
+        with self._lock:
+            return {os.path.abspath(workbook.directory) for workbook in self._in_use}
+
+    def load(self, fingerprint, columns=None):
+        """
+        Opens the cached rows of a file version, or returns None if not cached.
+
+        Only the entry's meta and block index are read here; rows are read when
+        their block is asked for (CachedWorkbook.block).
+
+        Args:
+            fingerprint: (absolute path, size, mtime_ns) of the source file
+            columns: Optional sorted 0-based column indices; rows are then cut down
+                     like dataset_cache.project_rows does (from the entry of exactly
+                     these columns, or from the entry of the whole sheet)
+        """
+        candidates = [(columns, None)]
+        if columns is not None:
+            candidates.append((None, list(columns)))
+        for held, positions in candidates:
+            entry = self._entry_dir(fingerprint, held)
+            meta_path = os.path.join(entry, "meta.json")
+            if not os.path.exists(meta_path):
+                continue
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                if meta.get("version") != CACHE_FORMAT_VERSION or meta.get("fingerprint") != list(fingerprint):
+                    continue
+                with open(os.path.join(entry, "index.json"), "r", encoding="utf-8") as f:
+                    index = json.load(f)
+                workbook = self._open(entry, meta, index, positions)
+            except (OSError, ValueError, KeyError, TypeError, IndexError) as e:
+                print(f"Columnar cache entry unreadable ({e}), ignoring")
+                continue
+            # Touch for LRU eviction
+            try:
+                os.utime(meta_path)
+            except OSError:
+                pass
+            return workbook
+        return None
+
+    def contains(self, fingerprint, columns=None):
+        """True if an entry of exactly this file version and column set is stored."""
+        return os.path.exists(os.path.join(self._entry_dir(fingerprint, columns), "meta.json"))
+
+    def writer(self, fingerprint, columns, header_row, block_rows):
+        """
+        Starts writing a file version (see EntryWriter).
+
+        Args:
+            fingerprint: (absolute path, size, mtime_ns) of the source file
+            columns: Source column indices the rows hold (None = all)
+            header_row: Header row as read (None for an empty sheet)
+            block_rows: Data rows per block
+
+        Returns:
+            EntryWriter, or None if the cache cannot be written
+        """
+        try:
+            return EntryWriter(self, fingerprint, columns, header_row, block_rows)
+        except (OSError, TypeError) as e:
+            print(f"Columnar cache write failed: {e}")
+            return None
+
+    def entries(self):
+        """Returns [(last use time, bytes, entry dir), ...] of complete entries."""
+        result = []
+        if not os.path.isdir(self.directory):
+            return result
+        for name in os.listdir(self.directory):
+            meta_path = os.path.join(self.directory, name, "meta.json")
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    size = json.load(f).get("bytes", 0)
+                result.append((os.path.getmtime(meta_path), size, os.path.join(self.directory, name)))
+            except (OSError, ValueError):
+                continue
+        return result
+
+    def total_bytes(self):
+        return sum(size for _used, size, _path in self.entries())
+
+    def evict(self):
+        """Removes least recently used entries until the cache fits max_bytes (entries in use stay)."""
+        entries = sorted(self.entries())
+        pinned = self._pinned()
+        total = sum(size for _used, size, _path in entries)
+        for _used, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if os.path.abspath(path) in pinned:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def purge(self):
+        """Deletes every cached workbook not in use. Returns the number of bytes freed."""
+        freed = 0
+        pinned = self._pinned()
+        for _used, size, path in self.entries():
+            if os.path.abspath(path) not in pinned:
+                shutil.rmtree(path, ignore_errors=True)
+                freed += size
+        # Leftovers of interrupted writes and old formats (entries being written are in use)
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                if os.path.abspath(path) not in pinned and not os.path.exists(os.path.join(path, "meta.json")):
+                    shutil.rmtree(path, ignore_errors=True)
+        return freed
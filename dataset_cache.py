@@ -0,0 +1,649 @@
+"""
+Dataset Cache Module
+Process-wide cache of parsed source workbooks.
+A supplier file is parsed once; headers, preview rows, the category scan and the
+export all take their rows from that parse. Entries are keyed by the file's
+(path, size, mtime) fingerprint, so a file that changes on disk is parsed again.
+The rows are held only in a compact per-column store (ColumnStore), encoded
+block by block while the file is read; row-wise consumers see them through
+ColumnarRecords row views instead of one dict per row.
+"""
+
+import atexit
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+from collections.abc import Mapping, Sequence
+from operator import itemgetter
+
+import numpy as np
+
+from column_blocks import RowBlock
+
+
+# Data rows encoded at a time into a ColumnStore
+DEFAULT_BLOCK_ROWS = 5000
+
+# Streaming parses report the rows read so far after FIRST_PARTIAL_ROWS rows, then
+# each time PARTIAL_ROWS more (or as many as read so far, if larger) have been read
+FIRST_PARTIAL_ROWS = 2000
+PARTIAL_ROWS = 20000
+
+
+def file_fingerprint(path):
+    """
+    Identity of a file's current contents.
+
+    Returns:
+        tuple: (absolute path, size in bytes, mtime in ns)
+    """
+    st = os.stat(path)
+    return (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+
+
+def project_rows(rows, columns):
+    """
+    Cuts rows down to the given columns.
+
+    A row keeps the listed columns that lie within its own length, so short rows
+    stay short and a row dict built from it lacks the same keys as before.
+
+    Args:
+        rows: Row tuples (empty lists stand for missing rows and are kept as they are)
+        columns: Sorted 0-based column indices
+    """
+    columns = list(columns)
+    if not columns:
+        return [r if type(r) is list and not r else () for r in rows]
+    last = columns[-1]
+    getter = itemgetter(*columns)
+    single = len(columns) == 1
+    projected = []
+    append = projected.append
+    for r in rows:
+        if len(r) > last:
+            append((getter(r),) if single else getter(r))
+        elif type(r) is list and not r:
+            append(r)
+        else:
+            append(tuple(r[c] for c in columns if c < len(r)))
+    return projected
+
+
+class BlockBudget:
+    """
+    Cap on the encoded blocks held in memory by all ColumnStores together.
+
+    Only blocks a store can read back from its backing (the disk cache entry
+    the parse was written to) are counted; when they exceed max_bytes, the
+    least recently used ones are dropped and read again on their next use.
+    Blocks not written anywhere (a parse's unfinished block, a failed write)
+    are never dropped. max_bytes 0 means no cap.
+    """
+
+    def __init__(self, max_bytes=0):
+        self.max_bytes = max_bytes
+        self.bytes = 0 # size of the blocks counted
+        self._lock = threading.Lock() # never held while calling into a store
+        self._blocks = OrderedDict() # (id(store), block) -> (weakref to store, bytes), least recent first
+        self._by_store = {} # id(store) -> {block, ...}
+
+    def touch(self, store, b, nbytes):
+        """Counts block b of store as just used; drops least recently used blocks above the cap."""
+        victims = []
+        with self._lock:
+            key = (id(store), b)
+            if key in self._blocks:
+                self._blocks.move_to_end(key)
+            else:
+                if id(store) not in self._by_store:
+                    weakref.finalize(store, self.forget, id(store))
+                self._blocks[key] = (weakref.ref(store), nbytes)
+                self._by_store.setdefault(id(store), set()).add(b)
+                self.bytes += nbytes
+            while self.max_bytes and self.bytes > self.max_bytes and len(self._blocks) > 1:
+                (sid, vb), (ref, size) = self._blocks.popitem(last=False)
+                self._by_store[sid].discard(vb)
+                self.bytes -= size
+                victims.append((ref, vb))
+        for ref, vb in victims:
+            victim = ref()
+            if victim is not None:
+                victim._drop(vb)
+
+    def forget(self, store_id):
+        """Stops counting the blocks of a store that is gone."""
+        with self._lock:
+            for b in self._by_store.pop(store_id, ()):
+                _ref, size = self._blocks.pop((store_id, b))
+                self.bytes -= size
+
+
+class SourceDataset:
+    """
+    One parsed workbook: its header row, the data rows (held in a ColumnStore)
+    and data derived from them.
+
+    Derived values (row dicts, category counts, ...) are computed once per key
+    and shared by every consumer; treat them as read-only.
+    A projected dataset holds only some columns of the sheet (see project_rows);
+    its header row lists just those columns.
+    """
+
+    def __init__(self, fingerprint, store, complete=True, columns=None):
+        self.fingerprint = fingerprint
+        self.store = store
+        self.complete = complete # False while a streaming parse is still adding rows
+        self.columns = columns # source column indices held (None = all columns)
+        self._derived = {}
+        self._lock = threading.RLock() # compute() may ask for other derived values
+
+    @property
+    def header_row(self):
+        """The header row as read (None for an empty sheet)."""
+        return self.store.header_row
+
+    @property
+    def headers(self):
+        return self.store.headers
+
+    @property
+    def n_rows(self):
+        """Number of data rows (read so far, while the parse runs)."""
+        return self.store.n_rows
+
+    def iter_rows(self, start=0, stop=None):
+        """
+        Yields the data rows start ... stop - 1 as lists of row tuples, a store block at a time.
+
+        Rows have the shapes the reader gave them (short rows stay short, empty
+        list rows stay empty lists).
+        """
+        return self.store.iter_rows(start, stop)
+
+    def derived(self, key, compute):
+        """
+        Returns the value stored under key, computing it on first use.
+
+        Args:
+            key: Hashable description of the derived value
+            compute: Callable producing the value
+        """
+        with self._lock:
+            if key not in self._derived:
+                self._derived[key] = compute()
+            return self._derived[key]
+
+
+class RowView(Mapping):
+    """
+    Read-only {header: value} view of one data row of a ColumnStore.
+
+    Has the keys and values of dict(zip(headers, row)) without building the dict;
+    use dict(view) for a real copy.
+    """
+
+    __slots__ = ("_store", "_index")
+
+    def __init__(self, store, index):
+        self._store = store
+        self._index = index
+
+    def __getitem__(self, name):
+        store = self._store
+        return store.cell(self._index, store.layout(store.row_length(self._index))[name])
+
+    def __iter__(self):
+        store = self._store
+        return iter(store.layout(store.row_length(self._index)))
+
+    def __len__(self):
+        store = self._store
+        return len(store.layout(store.row_length(self._index)))
+
+    def __repr__(self):
+        return f"RowView({dict(self)!r})"
+
+
+class ColumnStore:
+    """
+    Data rows of one parsed workbook, held column by column.
+
+    The store is the only holder of the cells. A parse hands its rows over a
+    block at a time (add_block) and they are kept only as column_blocks.RowBlocks:
+    typed arrays for numbers, booleans and datetimes, codes into the block's
+    table of distinct strings for text. The header row is kept as read and the
+    header index (header -> column) is shared by all rows.
+
+    While a parse runs, set_tail() publishes the rows read after the last full
+    block as a provisional block, so the rows read so far can be viewed before
+    their block is complete.
+    """
+
+    def __init__(self, header_row, block_rows=DEFAULT_BLOCK_ROWS, backing=None, budget=None):
+        """
+        Args:
+            header_row: First row of the sheet (None for an empty sheet)
+            block_rows: Data rows per block
+            backing: Optional columnar_cache.CachedWorkbook holding the blocks on disk;
+                     blocks it has are read on first use and can be dropped again
+            budget: Optional BlockBudget the blocks held from backing count against
+        """
+        self.header_row = header_row
+        self.headers = list(header_row) if header_row is not None else []
+        self.width = len(self.headers)
+        self.block_rows = max(1, int(block_rows))
+        self.header_index = dict(zip(self.headers, range(self.width))) # duplicate headers keep the last column
+        self._layouts = {self.width: self.header_index}
+        self._blocks = [] # full blocks, the last one may be short once the parse is done (None = on disk only)
+        self._tail = None # provisional block of the rows after the full blocks
+        self._last = -1 # block last counted as used in the budget
+        self.n_rows = 0 # data rows visible
+        self.backing = backing
+        self.budget = budget
+        if backing is not None and backing.n_rows:
+            self.n_rows = backing.n_rows
+            self._blocks = [None] * backing.n_blocks
+
+    @classmethod
+    def open(cls, workbook, budget=None):
+        """Store over the rows of a cached workbook (columnar_cache.CachedWorkbook), read a block at a time."""
+        return cls(workbook.header_row, workbook.block_rows, workbook, budget)
+
+    def add_block(self, rows):
+        """
+        Encodes rows as the next block (block_rows rows; fewer only for the last block).
+
+        Returns:
+            RowBlock: The new block
+        """
+        block = RowBlock.encode(rows, self.width)
+        self.add_encoded(block)
+        return block
+
+    def add_encoded(self, block):
+        """Appends an already encoded block (see add_block)."""
+        # Published in this order, so a reader never finds a row missing
+        self._blocks.append(block)
+        self._tail = None
+        self.n_rows = (len(self._blocks) - 1) * self.block_rows + block.n
+
+    def track(self, b=None):
+        """Counts block b (default: the last one added) against the budget once backing has it; it may be dropped from then on."""
+        if b is None:
+            b = len(self._blocks) - 1
+        block = self._blocks[b]
+        if self.budget is not None and self.backing is not None and block is not None and b < self.backing.n_blocks:
+            self._last = b
+            self.budget.touch(self, b, block.nbytes)
+
+    def set_tail(self, rows):
+        """Publishes rows read after the last full block (replaced by the next add_block)."""
+        self._tail = RowBlock.encode(rows, self.width) if rows else None
+        self.n_rows = len(self._blocks) * self.block_rows + len(rows)
+
+    def _block(self, b):
+        blocks = self._blocks
+        if b >= len(blocks):
+            return self._tail
+        block = blocks[b]
+        if block is None:
+            block = blocks[b] = self.backing.block(b)
+            self._last = -1
+        if b != self._last and self.budget is not None and self.backing is not None and b < self.backing.n_blocks:
+            self._last = b
+            self.budget.touch(self, b, block.nbytes)
+        return block
+
+    def _drop(self, b):
+        # Called by the budget: block b is read from backing again when used
+        self._blocks[b] = None
+        if self._last == b:
+            self._last = -1
+
+    def layout(self, length):
+        """{header: column} of a row with length cells (the keys dict(zip(headers, row)) has)."""
+        layout = self._layouts.get(length)
+        if layout is None:
+            layout = self._layouts[length] = dict(zip(self.headers, range(length)))
+        return layout
+
+    def row_length(self, i):
+        """Number of cells of data row i."""
+        return max(self._block(i // self.block_rows).row_length(i % self.block_rows), 0)
+
+    def cell(self, i, column):
+        """Value of data row i in the given column."""
+        return self._block(i // self.block_rows).columns[column].value(i % self.block_rows)
+
+    def column(self, name, default, start, stop):
+        """Values of one column for data rows start ... stop - 1, like [row.get(name, default) ...]."""
+        column = self.header_index.get(name)
+        if column is None:
+            return [default] * (stop - start)
+
+        values = []
+        size = self.block_rows
+        for b in range(start // size, -(-stop // size)):
+            lo, hi = max(start - b * size, 0), min(stop - b * size, size)
+            block = self._block(b)
+            part = block.columns[column].values(lo, hi)
+            if block.lengths is not None:
+                for j in np.flatnonzero(block.lengths[lo:hi] <= column).tolist():
+                    # Short row: the value of an earlier duplicate header, or the default
+                    alt = self.layout(max(int(block.lengths[lo + j]), 0)).get(name)
+                    part[j] = default if alt is None else block.columns[alt].value(lo + j)
+            values.extend(part)
+        return values
+
+    def iter_blocks(self):
+        """Yields the RowBlocks in row order."""
+        for b in range(-(-self.n_rows // self.block_rows)):
+            yield self._block(b)
+
+    def iter_rows(self, start=0, stop=None):
+        """Yields data rows start ... stop - 1 as lists of row tuples, one list per block."""
+        stop = self.n_rows if stop is None else min(stop, self.n_rows)
+        size = self.block_rows
+        for b in range(start // size, -(-stop // size)):
+            lo, hi = max(start - b * size, 0), min(stop - b * size, size)
+            yield self._block(b).rows(lo, hi)
+
+    def memory_bytes(self):
+        """Approximate size of the encoded blocks in memory (arrays and string tables)."""
+        tail = self._tail
+        return (sum(block.nbytes for block in self._blocks if block is not None)
+                + (tail.nbytes if tail is not None else 0))
+
+
+class ColumnarRecords(Sequence):
+    """
+    Data rows of a dataset as read-only {header: value} row views over its ColumnStore.
+
+    Behaves like the list of row dicts get_all_rows returns (len, indexing,
+    iteration) over every row of the file, but no per-row dicts are kept: rows
+    are RowViews built on access and whole columns are read with column().
+    A view can be handed to PricingEngine.calculate_frame as it is.
+
+    While a file is still being parsed, stop limits the view to the data rows
+    read so far; a later view of the same parse with a larger stop continues it.
+    """
+
+    def __init__(self, dataset, stop=None, start=0):
+        """
+        Args:
+            dataset: SourceDataset
+            stop: Number of data rows visible (None = all rows of the dataset)
+            start: First data row visible (see tail())
+        """
+        self.dataset = dataset
+        self.store = dataset.store
+        self.stop = stop
+        self.start = start
+        self.headers = self.store.headers
+
+    def _end(self):
+        n = self.store.n_rows
+        return n if self.stop is None else min(n, self.stop)
+
+    def __len__(self):
+        return max(self._end() - self.start, 0)
+
+    @property
+    def complete(self):
+        """False while this is a view of the rows read so far of a running parse."""
+        return self.dataset.complete and self.stop is None
+
+    def continues(self, other):
+        """True if other shows a prefix of the rows shown here (same parse, fewer or equal rows)."""
+        return (isinstance(other, ColumnarRecords) and other.store is self.store
+                and other.start == self.start and len(other) <= len(self))
+
+    def tail(self, start):
+        """View of the rows from start on (same store, nothing is copied)."""
+        return ColumnarRecords(self.dataset, self.stop, self.start + start)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        n = len(self)
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError("record index out of range")
+        return RowView(self.store, index + self.start)
+
+    def __iter__(self):
+        store = self.store
+        for i in range(self.start, self._end()):
+            yield RowView(store, i)
+
+    def column(self, name, default=None):
+        """
+        Values of one column for every row, decoded from the store.
+
+        Matches [r.get(name, default) for r in records] without building rows.
+        """
+        return self.store.column(name, default, self.start, self.start + len(self))
+
+    def memory_bytes(self):
+        """Approximate size of the encoded columns (see ColumnStore.memory_bytes)."""
+        return self.store.memory_bytes()
+
+
+class DatasetCache:
+    """
+    Bounded cache of SourceDatasets for the last max_datasets files.
+
+    A lookup stats the file; a different size or mtime means the cached parse is
+    stale and the file is read again. Concurrent lookups of a missing file wait
+    for a single parse instead of parsing in parallel. With a disk cache set
+    (columnar_cache.ColumnarDiskCache), parses are written there block by block
+    as they are read, and a later run reads the blocks back on first use.
+
+    Rows held in memory are capped by budget (BlockBudget): blocks over it are
+    dropped and read back from the disk cache, or from a temporary spill
+    directory when there is no disk cache.
+
+    A file can be held in several column projections (all columns for the
+    export, the mapped columns for the preview). A projection is cut from any
+    cached parse that has its columns, or read from the disk cache, before the
+    file itself is parsed again.
+    """
+
+    def __init__(self, max_datasets=2, disk=None, block_rows=DEFAULT_BLOCK_ROWS, budget=None):
+        self.max_datasets = max_datasets
+        self.disk = disk
+        self.block_rows = block_rows # data rows per ColumnStore block of new parses
+        self.budget = budget if budget is not None else BlockBudget() # blocks held in memory by every store
+        self._spill = None # temporary ColumnarDiskCache backing parses under the budget when disk is None
+        self._lock = threading.Lock() # guards the dicts below only, never held while reading a file
+        self._entries = OrderedDict() # abs path -> {columns: SourceDataset}, all of one file version
+        self._loading = {} # (fingerprint, columns) -> [Event set when that parse ends, result to be cached]
+
+    def get(self, path, load, on_partial=None, columns=None):
+        """
+        Returns the dataset of path, parsing it with load() when needed.
+
+        The cache lock is held only to look entries up and store them; the parse,
+        the on_partial callbacks and the disk cache I/O run outside it, so lookups
+        of other files (and of cached ones) never wait for a parse.
+
+        Args:
+            path: Source file path
+            load: Callable(columns) returning the row tuples (header row first) cut
+                  down to those columns, any iterable (read as it is parsed)
+            on_partial: Optional callback(dataset, data_rows) called during a parse with
+                        the incomplete dataset and the number of data rows read so far
+            columns: Sorted tuple of 0-based column indices to keep (None = all)
+        """
+        fingerprint = file_fingerprint(path)
+        key = (fingerprint, columns)
+        while True:
+            with self._lock:
+                variants = self._variants(fingerprint)
+                dataset = variants.get(columns)
+                if dataset is not None:
+                    self._entries.move_to_end(fingerprint[0])
+                    return dataset
+                source = self._covering(variants, columns)
+                loading = self._loading.get(key)
+                if loading is None:
+                    loading = self._loading[key] = [threading.Event(), True]
+                    break
+            # Another thread is reading this file version: wait for it instead of parsing twice.
+            # If it failed, nothing was cached and the next pass parses here.
+            loading[0].wait()
+
+        dataset = writer = None
+        try:
+            if source is not None:
+                held, source = source
+                positions = columns if held is None else [held.index(c) for c in columns]
+                dataset = self._project(source, positions, columns)
+            elif self.disk is not None:
+                workbook = self.disk.load(fingerprint, columns)
+                if workbook is not None:
+                    dataset = SourceDataset(fingerprint, ColumnStore.open(workbook, self.budget), columns=columns)
+
+            if dataset is None:
+                rows = iter(load(columns))
+                store = ColumnStore(next(rows, None), self.block_rows, budget=self.budget)
+                disk = self._writable()
+                if disk is not None:
+                    writer = disk.writer(fingerprint, columns, store.header_row, store.block_rows)
+                    if writer is not None:
+                        store.backing = writer.workbook
+                dataset = self._parse(fingerprint, store, rows, on_partial, columns, writer)
+                if writer is not None:
+                    # A parse dropped by invalidate() while running is not persisted either
+                    if loading[1]:
+                        writer.commit()
+                    else:
+                        writer.abort()
+                    writer = None
+        finally:
+            if writer is not None:
+                writer.abort()
+            with self._lock:
+                del self._loading[key]
+                if dataset is not None and loading[1]:
+                    self._variants(fingerprint)[columns] = dataset
+                    self._entries.move_to_end(fingerprint[0])
+                    while len(self._entries) > self.max_datasets:
+                        self._entries.popitem(last=False)
+            loading[0].set()
+        return dataset
+
+    def _writable(self):
+        # Cache new parses are written to: the disk cache, else a spill directory if memory is capped
+        if self.disk is not None or not self.budget.max_bytes:
+            return self.disk
+        if self._spill is None:
+            from columnar_cache import ColumnarDiskCache
+            directory = tempfile.mkdtemp(prefix="dataset_spill_")
+            atexit.register(shutil.rmtree, directory, True)
+            self._spill = ColumnarDiskCache(directory, max_bytes=0) # entries live only while in use
+        return self._spill
+
+    def _variants(self, fingerprint):
+        # {columns: dataset} of the file's current version; a changed file starts over (lock held)
+        variants = self._entries.get(fingerprint[0])
+        if variants and next(iter(variants.values())).fingerprint != fingerprint:
+            variants = None
+        if variants is None:
+            variants = self._entries[fingerprint[0]] = {}
+        return variants
+
+    @staticmethod
+    def _covering(variants, columns):
+        # (held columns, dataset) of a cached parse that has all of columns, or None (lock held)
+        for held, source in variants.items():
+            if held is None or (columns is not None and set(columns) <= set(held)):
+                return held, source
+        return None
+
+    def _parse(self, fingerprint, store, rows, on_partial, columns=None, writer=None):
+        # Rows are encoded into the store a block at a time as they are read (and
+        # written to the disk cache through writer); only the rows of the unfinished
+        # block are held as tuples. At each report the unfinished block is
+        # published, so partial views see every row read so far.
+        dataset = SourceDataset(fingerprint, store, complete=False, columns=columns)
+        size = store.block_rows
+        pending = []
+        read = 0
+        next_report = FIRST_PARTIAL_ROWS
+        for row in rows:
+            pending.append(row)
+            read += 1
+            if len(pending) == size:
+                block = store.add_block(pending)
+                if writer is not None:
+                    writer.append(block)
+                    store.track()
+                pending = []
+            if on_partial is not None and read >= next_report:
+                store.set_tail(pending)
+                on_partial(dataset, read)
+                next_report = read + max(PARTIAL_ROWS, read)
+        if pending:
+            block = store.add_block(pending)
+            if writer is not None:
+                writer.append(block)
+                store.track()
+        dataset.complete = True
+        return dataset
+
+    def _project(self, source, positions, columns):
+        # Projection of a cached parse: its blocks cut down to the columns, nothing is
+        # decoded. Blocks of a parse read from disk are cut as they are read.
+        if source.store.backing is not None:
+            return SourceDataset(source.fingerprint,
+                                 ColumnStore.open(source.store.backing.project(positions), self.budget), columns=columns)
+        header_row = source.header_row
+        store = ColumnStore(None if header_row is None else project_rows([header_row], positions)[0],
+                            source.store.block_rows)
+        for block in source.store.iter_blocks():
+            store.add_encoded(block.project(positions))
+        return SourceDataset(source.fingerprint, store, columns=columns)
+
+    def peek(self, path):
+        """Returns the cached full (all columns) dataset of path if it is still current, else None."""
+        try:
+            fingerprint = file_fingerprint(path)
+        except OSError:
+            return None
+        with self._lock:
+            dataset = self._entries.get(fingerprint[0], {}).get(None)
+            if dataset is not None and dataset.fingerprint == fingerprint:
+                return dataset
+            return None
+
+    def contains(self, path):
+        """True if a full (all columns) parse of path's current version is cached in memory or on disk."""
+        if self.peek(path) is not None:
+            return True
+        if self.disk is None:
+            return False
+        try:
+            return self.disk.contains(file_fingerprint(path))
+        except OSError:
+            return False
+
+    def invalidate(self, path=None):
+        """Drops the cached parses of path (all files if path is None), including ones still running."""
+        with self._lock:
+            for (fingerprint, _columns), loading in self._loading.items():
+                if path is None or fingerprint[0] == os.path.abspath(path):
+                    loading[1] = False
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(os.path.abspath(path), None)
+
+
+# Shared by every ExcelHandler in the process
+dataset_cache = DatasetCache()
@@ -1,20 +1,520 @@
+import multiprocessing
 import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
 import openpyxl
+import pandas as pd
 from openpyxl import Workbook
 
+from category_paths import CategorySelection
+from dataset_cache import ColumnarRecords, dataset_cache, project_rows
+from export_log import ExportLogger
+from export_pipeline import StagePipeline
+from stock_filter import StockFilter
+from xlsx_reader import XlsxRowReader
+from xlsx_writer import XlsxStreamWriter
+
+# Rows priced together per calculate_frame call during export
+PRICING_BLOCK_SIZE = 2000
+
+# Shortest time between two export PROGRESS events (seconds; 10 per second)
+PROGRESS_INTERVAL = 0.1
+
+# Column-projected reads are used only when they leave out at least this share of
+# the columns; otherwise one full parse, which the export can reuse, is cheaper
+PROJECTION_MIN_DROPPED = 0.5
+
+class ExportStages:
+    """
+    Per-row export work, compiled once from the settings and the source header row.
+    
+    A block of source rows passes three stages: filter() applies the stock and
+    category filters to the raw cells, price() prices the rows that are left
+    (reading only the columns the pricing engine uses) and patch() writes the
+    new prices into the target columns by precomputed index. Rows dropped by a
+    filter are never priced.
+    """
+    
+    # (update counter, mapping key, target flag, result key, log label) per price column
+    TARGETS = (
+        ("discounted", "discounted_price_col", "update_discounted", "final_discounted_price", "İndirimli Fiyat"),
+        ("sell", "sell_price_col", "update_sell", "label_price", "Satış Fiyatı"),
+        ("market", "market_price_col", "update_market", "label_price", "Piyasa Fiyatı"),
+    )
+    
+    def __init__(self, headers, header_map, mappings, targets, selected_categories, pricing_engine, plan):
+        """
+        Args:
+            headers: Source header row
+            header_map: {header text: column index}
+            mappings: "mappings" settings
+            targets: "targets" settings (which price columns are updated)
+            selected_categories: Category paths to export (empty = all)
+            pricing_engine: PricingEngine
+            plan: PricingPlan snapshot used for the whole export
+        """
+        self.width = len(headers)
+        self.engine = pricing_engine
+        self.plan = plan
+        # Only the columns the pricing engine reads are handed to it
+        self.price_cols = {h: header_map[h] for h in pricing_engine.input_columns(plan) if h in header_map}
+        
+        self.patches = [] # (column index, result key, update counter, log label)
+        self.missing_targets = [] # enabled target columns not found in the header row
+        self.skipped_targets = [] # (log label, flag, column) of targets left alone
+        for counter, mapping_key, flag, result_key, label in self.TARGETS:
+            col = mappings.get(mapping_key)
+            if not (targets.get(flag) and col):
+                self.skipped_targets.append((label, targets.get(flag), col))
+            elif col in header_map:
+                self.patches.append((header_map[col], result_key, counter, label))
+            else:
+                self.missing_targets.append(col)
+        
+        # Stock filter: rows with stock <= 0 are dropped unless zero stock is included
+        stock_col = mappings.get("stock_col", "")
+        self.stock_col = stock_col if stock_col and not mappings.get("include_zero_stock", True) else None
+        self.stock_idx = header_map.get(stock_col)
+        self._stock_ok = {}
+        
+        # Category filter, decided once per distinct raw category cell
+        self.category_selection = CategorySelection(selected_categories)
+        self.category_idx = self.price_cols.get(plan.category_col) if plan.category_col else None
+        self._category_ok = {}
+        
+        self.skipped = {"stock": 0, "category": 0}
+    
+    @property
+    def filtering(self):
+        return self.stock_col is not None or bool(self.category_selection)
+    
+    def filter(self, rows):
+        """
+        Returns the positions of the rows that pass the stock and category filters.
+        
+        Rows whose pricing fails are matched on their main category only, so a
+        row passes here if either outcome could match; patch() settles it.
+        """
+        if not self.filtering:
+            return range(len(rows))
+        keep = []
+        for i, row in enumerate(rows):
+            reason = self.skip_reason(row)
+            if reason is None:
+                keep.append(i)
+            else:
+                self.skipped[reason] += 1
+        return keep
+    
+    def skip_reason(self, row):
+        """Returns "stock" or "category" if a filter drops the row before pricing, else None."""
+        if self.stock_col is not None and not self._stock_passes(self._cell(row, self.stock_idx)):
+            return "stock"
+        if self.category_selection and not any(self._category_passes(row)):
+            return "category"
+        return None
+    
+    def price(self, rows):
+        """Prices rows in one vectorized pass; returns calculate_row-style result dicts."""
+        if not rows:
+            return []
+        price_input = pd.DataFrame(
+            {h: [r[idx] if idx < len(r) else None for r in rows] for h, idx in self.price_cols.items()},
+            index=range(len(rows)), dtype=object
+        )
+        return self.engine.frame_to_results(self.engine.calculate_frame(price_input, self.plan))
+    
+    def patch(self, rows, results, update_count):
+        """
+        Builds the output rows: source cells with the new prices written in.
+        
+        Args:
+            rows: Source row tuples that passed filter()
+            results: price() results for rows
+            update_count: {update counter: count}, incremented per written price
+        
+        Returns:
+            list: Output row lists (unpriced rows unchanged), None where the row's
+                  category turns out not to be selected
+        """
+        width = self.width
+        patches = self.patches
+        out = []
+        for row, res in zip(rows, results):
+            priced = "error" not in res
+            # filter() let the row through if either pricing outcome matched; settle it now
+            if self.category_selection and not self._category_passes(row)[0 if priced else 1]:
+                self.skipped["category"] += 1
+                out.append(None)
+                continue
+            vals = list(row)
+            if len(vals) < width:
+                vals.extend([None] * (width - len(vals)))
+            if priced:
+                for idx, key, counter, _label in patches:
+                    vals[idx] = res[key]
+                    update_count[counter] += 1
+            out.append(vals)
+        return out
+    
+    @staticmethod
+    def _cell(row, idx):
+        # Short rows are padded with None in the output
+        return row[idx] if idx is not None and idx < len(row) else None
+    
+    def _stock_passes(self, value):
+        try:
+            return self._stock_ok[value]
+        except (KeyError, TypeError):
+            pass
+        try:
+            ok = not StockFilter.get_stock_value({self.stock_col: value}, self.stock_col) <= 0
+        except Exception:
+            ok = True # If the stock filter fails, don't block the export
+        try:
+            self._stock_ok[value] = ok
+        except TypeError:
+            pass
+        return ok
+    
+    def _category_passes(self, row):
+        # (priced row passes, unpriced row passes): same inputs calculate_frame derives the categories from
+        value = self._cell(row, self.category_idx) if self.category_idx is not None else ""
+        raw = "Kategorisiz" if self.plan.no_category_mode else str(value)
+        decision = self._category_ok.get(raw)
+        if decision is None:
+            info = self.engine.category_info(raw, self.plan) if raw else None
+            main = "Kategorisiz" if self.plan.no_category_mode else self.engine.extract_category(raw, self.plan)
+            selection = self.category_selection
+            decision = self._category_ok[raw] = (selection.matches(info.full_path if info else "", main),
+                                                 selection.matches("", main))
+        return decision
+
+
+class ExportProgress:
+    """
+    Time-throttled progress reporting of an export.
+    
+    update() may be called as often as convenient; a PROGRESS event goes out at
+    most every interval seconds, so the event (and GUI signal) count depends on
+    the export's duration, not its row count. Events carry
+    (part_num, part_rows, written_rows, source_rows_done, source_rows_total,
+    rows_per_sec, eta_seconds); the total and the ETA are None when unknown.
+    """
+    
+    def __init__(self, total, emit, interval=PROGRESS_INTERVAL):
+        """
+        Args:
+            total: Estimated number of source data rows (None = unknown)
+            emit: Callable(event) receiving the PROGRESS events
+            interval: Shortest time between two events (seconds)
+        """
+        self.total = total
+        self.emit = emit
+        self.interval = interval
+        self.done = 0
+        self._started = time.perf_counter()
+        self._last = None
+    
+    def update(self, part_num, part_rows, written, source_rows=0, force=False):
+        """
+        Args:
+            part_num, part_rows: Current part and the rows written to it
+            written: Rows written in total
+            source_rows: Source rows finished since the last call (written or filtered out)
+            force: Emit even if the last event is more recent than the interval
+        """
+        self.done += source_rows
+        now = time.perf_counter()
+        if not force and self._last is not None and now - self._last < self.interval:
+            return
+        self._last = now
+        elapsed = now - self._started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        # The estimate comes from the sheet dimension and may be off; never report past 100%
+        total = max(self.total, self.done) if self.total is not None else None
+        eta = (total - self.done) / rate if total is not None and rate > 0 else None
+        self.emit(("PROGRESS", (part_num, part_rows, written, self.done, total, rate, eta)))
+
+
+class ExportPartWriter:
+    """
+    Writes export rows into numbered part files of at most max_rows rows each.
+    
+    Runs on the export's writer thread; part events go out through emit() in the
+    order the single-threaded export yielded them, progress through an ExportProgress.
+    """
+    
+    def __init__(self, open_part, part_path, max_rows, emit, progress):
+        """
+        Args:
+            open_part: Callable(part number) returning a (workbook, worksheet) with the header row written
+            part_path: Callable(part number) returning the file the part is saved to
+            max_rows: Rows per part (0 = no split)
+            emit: Callable(event) receiving the PART_COMPLETE / PART_START events
+            progress: ExportProgress reporting the rows written
+        """
+        self.open_part = open_part
+        self.part_path = part_path
+        self.max_rows = max_rows
+        self.emit = emit
+        self.progress = progress
+        self.part_num = 1
+        self.current_row_count = 0
+        self.total_processed = 0
+        self.wb_out, self.ws_out = open_part(self.part_num)
+    
+    def write(self, rows, source_rows):
+        """
+        Args:
+            rows: Output rows of one block
+            source_rows: Source rows the block was made from (filtered ones included)
+        """
+        for row_vals in rows:
+            self.ws_out.append(row_vals)
+            self.current_row_count += 1
+            self.total_processed += 1
+            
+            if self.total_processed % 100 == 0:
+                self.progress.update(self.part_num, self.current_row_count, self.total_processed)
+            
+            # Check split
+            if self.max_rows > 0 and self.current_row_count >= self.max_rows:
+                self.wb_out.save(self.part_path(self.part_num))
+                self.emit(("PART_COMPLETE", (self.part_num, self.current_row_count)))
+                
+                self.part_num += 1
+                self.current_row_count = 0
+                self.wb_out, self.ws_out = self.open_part(self.part_num)
+                self.emit(("PART_START", self.part_num))
+        self.progress.update(self.part_num, self.current_row_count, self.total_processed, source_rows)
+    
+    def close(self):
+        """Saves the last part if it has rows."""
+        self.progress.update(self.part_num, self.current_row_count, self.total_processed, force=True)
+        if self.current_row_count > 0:
+            self.wb_out.save(self.part_path(self.part_num))
+            self.emit(("PART_COMPLETE", (self.part_num, self.current_row_count)))
+
+
+def _write_part_file(headers, rows, path, streaming, writer_engine):
+    """Writes one complete part file; runs in a ParallelPartWriter worker process."""
+    wb_out, ws_out = ExcelHandler._new_output_sheet(headers, path, streaming, writer_engine)
+    for row_vals in rows:
+        ws_out.append(row_vals)
+    wb_out.save(path)
+    return len(rows)
+
+
+class ParallelPartWriter:
+    """
+    ExportPartWriter variant that writes whole parts in worker processes.
+    
+    Rows of the current part are collected in memory; once the part is full it
+    is handed to a ProcessPoolExecutor worker, which serializes, compresses and
+    saves the file while the next parts are collected, so several parts are
+    written at once on separate cores. Part numbers follow the row order, so the
+    files are named as by the serial writer, and PART_COMPLETE events go out in
+    part order as the files land on disk. At most 2 x workers parts are in
+    flight, which bounds the rows held in memory.
+    
+    Workers are started with "spawn" (the export runs next to other threads, which
+    fork does not tolerate, and it is the only method on Windows).
+    """
+    
+    def __init__(self, headers, part_path, max_rows, emit, progress, workers, streaming, writer_engine):
+        """
+        Args:
+            headers: Header row written at the top of every part
+            part_path: Callable(part number) returning the file the part is saved to
+            max_rows: Rows per part (must be > 0)
+            emit: Callable(event) receiving the PART_COMPLETE / PART_START events
+            progress: ExportProgress reporting the rows collected
+            workers: Worker processes
+            streaming, writer_engine: Passed to ExcelHandler._new_output_sheet in the workers
+        """
+        self.headers = headers
+        self.part_path = part_path
+        self.max_rows = max_rows
+        self.emit = emit
+        self.progress = progress
+        self.workers = workers
+        self.streaming = streaming
+        self.writer_engine = writer_engine
+        self.part_num = 1
+        self.current_row_count = 0
+        self.total_processed = 0
+        self._rows = []
+        self._pending = deque() # (part number, future) in part order
+        self._pool = None
+    
+    def write(self, rows, source_rows):
+        for row_vals in rows:
+            self._rows.append(row_vals)
+            self.current_row_count += 1
+            self.total_processed += 1
+            
+            if self.total_processed % 100 == 0:
+                self.progress.update(self.part_num, self.current_row_count, self.total_processed)
+            
+            # Check split
+            if self.current_row_count >= self.max_rows:
+                self._submit()
+                self.part_num += 1
+                self.current_row_count = 0
+                self.emit(("PART_START", self.part_num))
+        self.progress.update(self.part_num, self.current_row_count, self.total_processed, source_rows)
+        self._collect(block=False)
+    
+    def close(self):
+        """Writes the last part if it has rows and waits for every part to be saved."""
+        self.progress.update(self.part_num, self.current_row_count, self.total_processed, force=True)
+        if self.current_row_count > 0:
+            self._submit()
+        self._collect(block=True)
+        self.stop()
+    
+    def stop(self):
+        """Shuts the worker processes down; parts not started yet are dropped."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+    
+    def _submit(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        future = self._pool.submit(_write_part_file, self.headers, self._rows, self.part_path(self.part_num),
+                                   self.streaming, self.writer_engine)
+        self._pending.append((self.part_num, future))
+        self._rows = []
+        # Wait for the oldest parts while too many are queued
+        while len(self._pending) >= 2 * self.workers:
+            self._complete_oldest()
+    
+    def _collect(self, block):
+        while self._pending and (block or self._pending[0][1].done()):
+            self._complete_oldest()
+    
+    def _complete_oldest(self):
+        part_num, future = self._pending.popleft()
+        rows = future.result() # raises the worker's exception
+        self.emit(("PART_COMPLETE", (part_num, rows)))
+
+
+class OpenpyxlRowReader:
+    """
+    Streams the rows of the active worksheet through openpyxl's read-only mode.
+    
+    Same interface as xlsx_reader.XlsxRowReader (context manager, iter_rows());
+    slower, but opens everything openpyxl can.
+    """
+    
+    def __init__(self, path):
+        self._wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def close(self):
+        self._wb.close()
+    
+    def iter_rows(self, columns=None):
+        """
+        Yields the rows as tuples of values (iter_rows(values_only=True)).
+        
+        Args:
+            columns: Optional sorted 0-based column indices to cut the rows down to
+        """
+        rows = self._wb.active.iter_rows(values_only=True)
+        if columns is None:
+            yield from rows
+        else:
+            for row in rows:
+                yield project_rows((row,), columns)[0]
+
+
+# Source file readers by name. A reader is created with the file path (raising if
+# it cannot open the file), used as a context manager and read with iter_rows(columns).
+READER_BACKENDS = {
+    "native": XlsxRowReader,
+    "openpyxl": OpenpyxlRowReader,
+}
+
+# Reader used when the chosen one cannot open a file
+FALLBACK_READER = "openpyxl"
+
+
 class ExcelHandler:
-    def __init__(self):
-        pass
+    def __init__(self, reader_backend="native", log=None):
+        """
+        Args:
+            reader_backend: Name of a READER_BACKENDS entry
+            log: Optional callback(message, level) for reader notices, e.g. the
+                 fallback to FALLBACK_READER (not reported if not given)
+        """
+        self.reader_backend = reader_backend
+        self.log = log
+
+    def iter_source_rows(self, filepath, columns=None, log=None):
+        """
+        Yields the rows of the active sheet as tuples of values.
+        
+        Rows look exactly like openpyxl's read-only iter_rows(values_only=True);
+        the backend only changes how fast they are produced. If the handler's
+        reader cannot open the file, FALLBACK_READER is used instead.
+        
+        Args:
+            filepath: Source .xlsx path
+            columns: Optional sorted 0-based column indices; rows are cut down to
+                     them (see dataset_cache.project_rows). The native reader skips
+                     the other cells while parsing.
+            log: Callback(message, level) for the reader used (default: the handler's log)
+        """
+        with self._open_reader(filepath, log) as reader:
+            yield from reader.iter_rows(columns)
+
+    def _open_reader(self, filepath, log=None):
+        try:
+            return READER_BACKENDS[self.reader_backend](filepath)
+        except Exception as e:
+            if self.reader_backend == FALLBACK_READER:
+                raise
+            log = log or self.log
+            if log is not None:
+                log(f"{self.reader_backend} okuyucu dosyayı açamadı ({e}), {FALLBACK_READER} kullanılıyor", "WARNING")
+            return READER_BACKENDS[FALLBACK_READER](filepath)
+
+    def estimate_rows(self, filepath):
+        """
+        Returns the number of data rows of the file, or None if it cannot be told up front.
+        
+        Exact when the file is in the dataset cache; otherwise read from the sheet's
+        dimension, which costs a few small reads (no cells, no shared strings).
+        """
+        dataset = dataset_cache.peek(filepath)
+        if dataset is not None:
+            return dataset.n_rows
+        try:
+            with XlsxRowReader(filepath, contents=False) as reader:
+                max_row = reader.max_row
+        except Exception:
+            return None
+        return max(max_row - 1, 0) if max_row is not None else None
 
     def get_headers(self, filepath):
         try:
-            wb = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
-            sheet = wb.active
-            headers = []
-            for row in sheet.iter_rows(min_row=1, max_row=1, values_only=True):
-                headers = list(row)
-                break
-            wb.close()
+            dataset = dataset_cache.peek(filepath)
+            if dataset is not None:
+                return dataset.headers
+            # Not parsed yet: only the first row is read here, the full parse happens in the loaders
+            rows = self.iter_source_rows(filepath)
+            headers = list(next(rows, []))
+            rows.close()
             return headers
         except Exception as e:
             print(f"Error reading headers: {e}")
@@ -25,38 +525,143 @@ class ExcelHandler:
         # or just reimplement to be safe.
         return self.get_all_rows(filepath, limit)
 
+    def column_indices(self, filepath, names):
+        """
+        Indices of the columns headed by one of names, for a projected read.
+        
+        Returns:
+            tuple: Sorted 0-based indices, or None to read every column (no names
+                   given, or too few columns would be left out, see PROJECTION_MIN_DROPPED)
+        """
+        if names is None:
+            return None
+        headers = self.get_headers(filepath)
+        wanted = {n for n in names if n}
+        indices = tuple(i for i, h in enumerate(headers) if h in wanted)
+        if len(headers) - len(indices) < PROJECTION_MIN_DROPPED * len(headers):
+            return None
+        return indices
+
+    def load_dataset(self, filepath, on_partial=None, columns=None):
+        """
+        Returns the parsed workbook from the process-wide dataset cache.
+        
+        The file is parsed on first use and again only after it changes on disk.
+        
+        Args:
+            filepath: Source .xlsx path
+            on_partial: Optional callback(dataset, data_rows) for the rows read so far
+                        while the file is being parsed (see DatasetCache.get)
+            columns: Optional header names; only these columns are read (the dataset
+                     and its header row then hold just them). None reads everything.
+        
+        Returns:
+            SourceDataset: header row, data rows (in a column store) and shared derived data
+        """
+        return dataset_cache.get(filepath, lambda cols: self.iter_source_rows(filepath, cols), on_partial,
+                                 self.column_indices(filepath, columns))
+
+    def get_records(self, filepath, on_partial=None, columns=None):
+        """
+        Returns every data row of the file as a column store with {header: value} row views.
+        
+        Unlike get_all_rows there is no row limit and no dict per row: cells are
+        kept as typed column arrays and rows are read through light views. The
+        object is shared by all callers asking for the same file version.
+        
+        Args:
+            filepath: Source .xlsx path
+            on_partial: Optional callback(ColumnarRecords) receiving views of the rows read
+                        so far while the file is parsed; the returned records continue them
+            columns: Optional header names to read (see load_dataset); the rows then
+                     only have these keys
+        
+        Returns:
+            ColumnarRecords
+        """
+        report = None
+        if on_partial is not None:
+            report = lambda ds, n: on_partial(ColumnarRecords(ds, stop=n))
+        dataset = self.load_dataset(filepath, report, columns)
+        return dataset.derived("columnar_records", lambda: ColumnarRecords(dataset))
+
     def get_all_rows(self, filepath, limit=None):
-        rows = []
+        """
+        Returns up to limit data rows as {header: value} dicts.
+        
+        The list is shared by all callers asking for the same file and limit; do not modify it.
+        """
         try:
-            wb = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
-            sheet = wb.active
-            headers = []
-            
-            for i, row in enumerate(sheet.iter_rows(values_only=True)):
-                if i == 0:
-                    headers = list(row)
-                    continue
-                
-                # Create dict based on headers
-                row_data = {}
-                for idx, val in enumerate(row):
-                    if idx < len(headers):
-                        row_data[headers[idx]] = val
-                
-                rows.append(row_data)
-                if limit and len(rows) >= limit:
-                    break
-            wb.close()
-            return rows
+            dataset = self.load_dataset(filepath)
+            return dataset.derived(("records", limit), lambda: self._rows_to_records(self._dataset_rows(dataset, limit), limit))
         except Exception as e:
             print(f"Error reading rows: {e}")
             return []
 
+    @staticmethod
+    def _dataset_rows(dataset, limit=None):
+        # Header row, then the data rows (up to limit) decoded from the store
+        if dataset.header_row is None:
+            return
+        yield dataset.header_row
+        for block in dataset.iter_rows(0, limit or None):
+            yield from block
+
+    @staticmethod
+    def _rows_to_records(rows, limit=None):
+        records = []
+        headers = []
+        
+        for i, row in enumerate(rows):
+            if i == 0:
+                headers = list(row)
+                continue
+            
+            # Create dict based on headers
+            row_data = {}
+            for idx, val in enumerate(row):
+                if idx < len(headers):
+                    row_data[headers[idx]] = val
+            
+            records.append(row_data)
+            if limit and len(records) >= limit:
+                break
+        return records
+    
+    @staticmethod
+    def _new_output_sheet(headers, path, streaming=True, writer_engine="openpyxl"):
+        """
+        Creates an output part workbook with the header row written.
+        
+        Args:
+            headers: Header row of the source sheet
+            path: Path the part will be saved to
+            streaming: Use a write-only workbook; rows are serialized as they are
+                appended, so memory stays flat regardless of part size
+            writer_engine: "openpyxl" or "native" (XlsxStreamWriter, always streaming)
+        
+        Returns:
+            tuple: (workbook, worksheet) - both support the openpyxl append()/save() calls used here
+        """
+        if writer_engine == "native":
+            writer = XlsxStreamWriter(path)
+            writer.append(headers)
+            return writer, writer
+        if streaming:
+            wb = Workbook(write_only=True)
+            ws = wb.create_sheet("Sheet")
+        else:
+            wb = Workbook()
+            ws = wb.active
+        ws.append(headers)
+        return wb, ws
+    
     def process_and_save_generator(self, filepath, settings_manager, pricing_engine):
         """
         Generator that yields progress updates:
         (status_type, data)
-        status_type: "PART_START", "PROGRESS", "PART_COMPLETE", "DONE", "ERROR"
+        status_type: "PART_START", "PROGRESS", "PART_COMPLETE", "LOG", "DONE", "ERROR"
+        PROGRESS comes at most every PROGRESS_INTERVAL seconds (see ExportProgress for its data).
         """
         # Create logs directory if it doesn't exist
         from datetime import datetime
@@ -64,24 +669,28 @@ class ExcelHandler:
         logs_dir = "logs"
         os.makedirs(logs_dir, exist_ok=True)
         
-        # Create timestamped log file
+        # Timestamped JSON-lines log; the GUI gets batched text chunks of it
         timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        log_filename = os.path.join(logs_dir, f"debug_export_{timestamp}.log")
-        
-        # Open debug log file
-        debug_log = open(log_filename, "w", encoding="utf-8")
+        log_filename = os.path.join(logs_dir, f"debug_export_{timestamp}.jsonl")
+        log_config = settings_manager.get("export_log", {})
+        log = ExportLogger(log_filename, log_config.get("gui_level", "INFO"),
+                           float(log_config.get("flush_seconds", 1.0)), float(log_config.get("gui_seconds", 0.5)))
         
-        def log_debug(msg):
-            debug_log.write(f"{msg}\n")
-            debug_log.flush()
-            print(f"[DEBUG] {msg}")
-            # Return tuple for yielding to GUI
-            return ("LOG", f"{msg}")
+        def gui_logs(force=False):
+            # Due records go to disk; GUI lines leave as one ("LOG", text) chunk at a capped rate
+            log.flush(force=False)
+            chunk = log.gui_chunk(force)
+            return [("LOG", chunk)] if chunk else []
         
+        pipeline = None
+        writer = None
         try:
             mappings = settings_manager.get("mappings")
             out_config = settings_manager.get("output")
-            max_rows = int(out_config.get("max_rows_per_file", 5000))
+            max_rows = int(out_config.get("max_rows_per_file", 5000)) # 0 = no split
+            streaming = bool(out_config.get("streaming_write", True))
+            writer_engine = out_config.get("writer_engine", "openpyxl")
+            parallel_parts = min(int(out_config.get("parallel_parts", 0)), os.cpu_count() or 1) # 0 = off
             out_dir = out_config.get("output_dir", os.path.dirname(filepath))
             filename_template = out_config.get("filename_template", "output_part_{n}.xlsx")
             
@@ -92,251 +701,230 @@ class ExcelHandler:
             col_market = mappings.get("market_price_col")
             
             # LOG: Initial settings
-            yield log_debug("=" * 80)
-            yield log_debug("EXPORT BAŞLADI")
-            yield log_debug(f"Kaynak dosya: {filepath}")
-            yield log_debug(f"Targets: {targets}")
-            yield log_debug(f"Base Price Source: {settings_manager.get('base_price_source', 'NOT SET')}")
-            yield log_debug(f"Column mappings:")
-            yield log_debug(f"  - Discounted: '{col_discounted}'")
-            yield log_debug(f"  - Sell: '{col_sell}'")
-            yield log_debug(f"  - Market: '{col_market}'")
-            yield log_debug("=" * 80)
+            log.info("=" * 80)
+            log.info("EXPORT BAŞLADI")
+            log.info(f"Kaynak dosya: {filepath}")
+            log.debug(f"Targets: {targets}")
+            log.debug(f"Base Price Source: {settings_manager.get('base_price_source', 'NOT SET')}")
+            log.debug(f"Column mappings:")
+            log.debug(f"  - Discounted: '{col_discounted}'")
+            log.debug(f"  - Sell: '{col_sell}'")
+            log.debug(f"  - Market: '{col_market}'")
+            log.info("=" * 80)
+            
+            # Open Source (streamed, or taken from the dataset cache if the preview parsed it).
+            # Reading, pricing and part writing run as pipeline stages on their own
+            # threads, so part N is saved while the rows of part N+1 are priced.
+            log.info(f"Okuyucu: {self.reader_backend}")
+            total_rows = self.estimate_rows(filepath)
+            log.info(f"Tahmini satır sayısı: {total_rows if total_rows is not None else 'bilinmiyor'}", total_rows=total_rows)
+            timings = dict.fromkeys(("okuma", "filtre", "fiyatlama", "hücre güncelleme", "yazma"), 0.0)
+            pipeline = StagePipeline(int(out_config.get("pipeline_depth", 4)))
+            
+            def read_blocks(put):
+                # Data rows go on every PRICING_BLOCK_SIZE rows: from the dataset cache if the
+                # file is parsed already, else straight from the reader as it parses
+                block = []
+                if dataset_cache.contains(filepath):
+                    dataset = self.load_dataset(filepath)
+                    log.debug("Satırlar dosya önbelleğinden okunuyor")
+                    pipeline.emit(("HEADERS", None if dataset.header_row is None else list(dataset.header_row)))
+                    for rows in dataset.iter_rows():
+                        block.extend(rows)
+                        while len(block) >= PRICING_BLOCK_SIZE:
+                            put(block[:PRICING_BLOCK_SIZE])
+                            del block[:PRICING_BLOCK_SIZE]
+                else:
+                    rows = self.iter_source_rows(filepath, log=lambda msg, level: log.log(level, msg))
+                    try:
+                        first_row = next(rows, None)
+                        pipeline.emit(("HEADERS", None if first_row is None else list(first_row)))
+                        for row in rows:
+                            block.append(row)
+                            if len(block) == PRICING_BLOCK_SIZE:
+                                put(block)
+                                block = []
+                    finally:
+                        rows.close()
+                if block:
+                    put(block)
+            
+            pipeline.add_stage("okuma", read_blocks)
+            pipeline.start()
             
-            # Open Source
-            wb_src = openpyxl.load_workbook(filepath, read_only=True, data_only=True)
-            sheet_src = wb_src.active
+            first_row = None
+            for event in pipeline.events():
+                if event[0] == "HEADERS":
+                    first_row = event[1]
+                    break
             
             headers = []
             header_map = {} 
             
-            row_iterator = sheet_src.iter_rows(values_only=True)
-            
-            try:
-                first_row = next(row_iterator)
-                headers = list(first_row)
-                yield log_debug(f"\nHeaders okundu ({len(headers)} sütun):")
-                for idx, h in enumerate(headers):
-                    # Force string for robust matching with settings (UI Combos use strings)
-                    h_str = str(h) if h is not None else ""
-                    header_map[h_str] = idx
-                    yield log_debug(f"  [{idx}] '{h_str}'")
-                
-                yield log_debug(f"\nHeader map oluşturuldu:")
-                yield log_debug(f"  Total headers: {len(header_map)}")
-                yield log_debug(f"  Discounted column '{col_discounted}' in map: {col_discounted in header_map}")
-                yield log_debug(f"  Sell column '{col_sell}' in map: {col_sell in header_map}")
-                yield log_debug(f"  Market column '{col_market}' in map: {col_market in header_map}")
-            except StopIteration:
-                yield log_debug("HATA: Dosya boş")
-                debug_log.close()
+            if first_row is None:
+                log.error("HATA: Dosya boş")
+                log.close()
+                yield from gui_logs(force=True)
                 yield ("ERROR", "Dosya boş.")
                 return 
             
-            # Count total rows for estimation (optional, skip for speed or just count)
-            # We will just proceed.
+            headers = list(first_row)
+            log.debug(f"\nHeaders okundu ({len(headers)} sütun):")
+            for idx, h in enumerate(headers):
+                # Force string for robust matching with settings (UI Combos use strings)
+                h_str = str(h) if h is not None else ""
+                header_map[h_str] = idx
+                log.debug(f"  [{idx}] '{h_str}'")
+            
+            log.debug(f"\nHeader map oluşturuldu:")
+            log.debug(f"  Total headers: {len(header_map)}")
+            log.debug(f"  Discounted column '{col_discounted}' in map: {col_discounted in header_map}")
+            log.debug(f"  Sell column '{col_sell}' in map: {col_sell in header_map}")
+            log.debug(f"  Market column '{col_market}' in map: {col_market in header_map}")
             
-            part_num = 1
-            current_row_count = 0
-            total_processed = 0
+            if writer_engine == "native":
+                write_mode = "yerel akışlı yazıcı"
+            else:
+                write_mode = "openpyxl akışlı (write-only)" if streaming else "openpyxl standart"
+            log.info(f"Yazım modu: {write_mode}, dosya başına max satır: {max_rows or 'sınırsız'}")
             
-            wb_out = Workbook()
-            ws_out = wb_out.active
-            ws_out.append(headers) 
+            def part_path(n):
+                return os.path.join(out_dir, filename_template.replace("{n}", str(n)))
             
-            yield ("PART_START", part_num)
+            # Split exports can write their parts in worker processes
+            progress = ExportProgress(total_rows, pipeline.emit)
+            if parallel_parts > 0 and max_rows > 0:
+                writer = ParallelPartWriter(headers, part_path, max_rows, pipeline.emit, progress,
+                                            parallel_parts, streaming, writer_engine)
+                log.info(f"Paralel yazım: {parallel_parts} işlem")
+            else:
+                writer = ExportPartWriter(
+                    lambda n: self._new_output_sheet(headers, part_path(n), streaming, writer_engine),
+                    part_path, max_rows, pipeline.emit, progress)
             
-            yield log_debug(f"\n{'='*80}")
-            yield log_debug("SATIRLAR İŞLENMEYE BAŞLIYOR")
-            yield log_debug(f"{'='*80}\n")
+            yield from gui_logs()
+            yield ("PART_START", writer.part_num)
             
-            row_num = 0
+            log.info(f"\n{'='*80}")
+            log.info("SATIRLAR İŞLENMEYE BAŞLIYOR")
+            log.info(f"{'='*80}\n")
+            
+            row_num = [0]
             update_count = {"discounted": 0, "sell": 0, "market": 0}
-
-            for row_vals in row_iterator:
-                row_num += 1
-                row_vals = list(row_vals)
-                
-                # Pad row to match headers length (fix for OpenPyXL truncating trailing empty cells)
-                if len(row_vals) < len(headers):
-                    row_vals.extend([None] * (len(headers) - len(row_vals)))
-                
-                # Build row dict
-                row_dict = {}
-                for h, idx in header_map.items():
-                    if idx < len(row_vals):
-                        row_dict[h] = row_vals[idx]
-                
-                # Calculate
-                res = pricing_engine.calculate_row(row_dict)
-                
-                # Log first 5 rows in detail
-                if row_num <= 5:
-                    yield log_debug(f"\n--- Satır {row_num} ---")
-                    yield log_debug(f"Hesaplama sonucu:")
-                    yield log_debug(f"  final_discounted_price: {res.get('final_discounted_price', 'N/A')}")
-                    yield log_debug(f"  label_price: {res.get('label_price', 'N/A')}")
-                    yield log_debug(f"  error: {res.get('error', 'YOK')}")
-                
-                if "error" not in res:
-                    # Update Discounted Price
-                    if targets.get("update_discounted") and col_discounted:
-                        if col_discounted in header_map:
-                            idx = header_map[col_discounted]
-                            old_value = row_vals[idx]
-                            new_value = res["final_discounted_price"]
-                            row_vals[idx] = new_value
-                            update_count["discounted"] += 1
-                            
-                            if row_num <= 5:
-                                yield log_debug(f"  İndirimli Fiyat güncellendi: {old_value} -> {new_value}")
-                            
-                            # Verify update
-                            if row_vals[idx] != new_value:
-                                yield log_debug(f"  UYARI: Satır {row_num}, index {idx} güncellenemedi, zorlanıyor...")
-                                row_vals[idx] = new_value
-                        else:
-                            if row_num <= 5:
-                                yield log_debug(f"  UYARI: '{col_discounted}' sütunu header_map'te bulunamadı!")
-                    elif row_num <= 5:
-                        yield log_debug(f"  İndirimli Fiyat atlandı (target: {targets.get('update_discounted')}, col: '{col_discounted}')")
-                    
-                    # Update Sell Price
-                    if targets.get("update_sell") and col_sell:
-                        if col_sell in header_map:
-                            idx = header_map[col_sell]
-                            old_value = row_vals[idx]
-                            new_value = res["label_price"]
-                            row_vals[idx] = new_value
-                            update_count["sell"] += 1
-                            
-                            if row_num <= 5:
-                                yield log_debug(f"  Satış Fiyatı güncellendi: {old_value} -> {new_value}")
-                            
-                            # Verify update
-                            if row_vals[idx] != new_value:
-                                yield log_debug(f"  UYARI: Satır {row_num}, index {idx} güncellenemedi, zorlanıyor...")
-                                row_vals[idx] = new_value
-                        else:
-                            if row_num <= 5:
-                                yield log_debug(f"  UYARI: '{col_sell}' sütunu header_map'te bulunamadı!")
-                    elif row_num <= 5:
-                        yield log_debug(f"  Satış Fiyatı atlandı (target: {targets.get('update_sell')}, col: '{col_sell}')")
-                    
-                    # Update Market Price
-                    if targets.get("update_market") and col_market:
-                        if col_market in header_map:
-                            idx = header_map[col_market]
-                            old_value = row_vals[idx]
-                            new_value = res["label_price"]
-                            row_vals[idx] = new_value
-                            update_count["market"] += 1
-                            
-                            if row_num <= 5:
-                                yield log_debug(f"  Piyasa Fiyatı güncellendi: {old_value} -> {new_value}")
-                            
-                            # Verify update
-                            if row_vals[idx] != new_value:
-                                yield log_debug(f"  UYARI: Satır {row_num}, index {idx} güncellenemedi, zorlanıyor...")
-                                row_vals[idx] = new_value
-                        else:
-                            if row_num <= 5:
-                                yield log_debug(f"  UYARI: '{col_market}' sütunu header_map'te bulunamadı!")
-                    elif row_num <= 5:
-                        yield log_debug(f"  Piyasa Fiyatı atlandı (target: {targets.get('update_market')}, col: '{col_market}')")
-                
-                # ===== NEW FEATURE: Apply export filters (stock + category) =====
-                # Get filter settings
-                stock_col = mappings.get("stock_col", "")
-                include_zero_stock = mappings.get("include_zero_stock", True)
-                selected_categories = settings_manager.get("selected_categories", [])
-                
-                # Stock filter
-                if stock_col and not include_zero_stock:
-                    try:
-                        from stock_filter import StockFilter
-                        stock_val = StockFilter.get_stock_value(row_dict, stock_col)
-                        if stock_val <= 0:
-                            if row_num <= 5:
-                                yield log_debug(f"  Satır atlandı: Stok = 0")
-                            continue  # Skip zero stock items
-                    except:
-                        pass  # If stock filter fails, don't block export
+            
+            # Pricing settings are compiled once for the whole export
+            plan = pricing_engine.get_plan()
+            for issue in plan.segment_index.issues:
+                log.warning(f"UYARI (Kâr Segmentleri): {issue}")
+            
+            # Column indices, filters and targets resolved once; rows then go
+            # filter -> price (survivors only) -> patch -> write
+            stages = ExportStages(headers, header_map, mappings, targets,
+                                  settings_manager.get("selected_categories", []), pricing_engine, plan)
+            for col in stages.missing_targets:
+                log.warning(f"UYARI: '{col}' sütunu header_map'te bulunamadı!")
+            for label, flag, col in stages.skipped_targets:
+                log.info(f"{label} atlandı (target: {flag}, col: '{col}')")
+            
+            def price_block(block, put):
+                t = time.perf_counter()
+                keep = stages.filter(block)
+                survivors = block if len(keep) == len(block) else [block[i] for i in keep]
+                timings["filtre"] += time.perf_counter() - t
                 
-                # Category tree filter
-                if selected_categories:
-                    raw_cat_path = res.get("full_category_path", "")
-                    # Normalize path (handle spacing differences: "A>B" vs "A > B")
-                    if raw_cat_path:
-                        full_cat_path = " > ".join([p.strip() for p in str(raw_cat_path).split(">") if p.strip()])
-                    else:
-                        full_cat_path = ""
-                    
-                    main_cat = str(res.get("main_category", ""))
-                    
-                    cat_match = False
-                    for selected in selected_categories:
-                        if full_cat_path == selected or \
-                           main_cat == selected or \
-                           full_cat_path.startswith(selected + " >") or \
-                           main_cat.startswith(selected + " >"):
-                            cat_match = True
-                            break
-                    
-                    if not cat_match:
-                        if row_num <= 5:
-                            yield log_debug(f"  Satır atlandı: Kategori seçili değil")
-                        continue  # Skip if not in selected categories
-                # ===== END NEW FEATURE =====
+                t = time.perf_counter()
+                results = stages.price(survivors)
+                timings["fiyatlama"] += time.perf_counter() - t
                 
-                ws_out.append(row_vals)
-                current_row_count += 1
-                total_processed += 1
+                t = time.perf_counter()
+                out_rows = stages.patch(survivors, results, update_count)
+                timings["hücre güncelleme"] += time.perf_counter() - t
                 
-                if total_processed % 100 == 0:
-                    yield ("PROGRESS", (part_num, current_row_count, total_processed))
+                # Log the first 5 source rows in detail
+                if row_num[0] < 5:
+                    positions = {i: k for k, i in enumerate(keep)}
+                    for i in range(min(5 - row_num[0], len(block))):
+                        log.debug(f"\n--- Satır {row_num[0] + i + 1} ---")
+                        k = positions.get(i)
+                        if k is None:
+                            reason = "Stok = 0" if stages.skip_reason(block[i]) == "stock" else "Kategori seçili değil"
+                            log.debug(f"  Satır atlandı: {reason}")
+                            continue
+                        res = results[k]
+                        log.debug(f"Hesaplama sonucu:")
+                        log.debug(f"  final_discounted_price: {res.get('final_discounted_price', 'N/A')}")
+                        log.debug(f"  label_price: {res.get('label_price', 'N/A')}")
+                        log.debug(f"  error: {res.get('error', 'YOK')}")
+                        if out_rows[k] is None:
+                            log.debug(f"  Satır atlandı: Kategori seçili değil")
+                        elif "error" not in res:
+                            for idx, _key, _counter, label in stages.patches:
+                                old_value = block[i][idx] if idx < len(block[i]) else None
+                                log.debug(f"  {label} güncellendi: {old_value} -> {out_rows[k][idx]}")
+                row_num[0] += len(block)
                 
-                # Check split
-                if current_row_count >= max_rows:
-                    # Save current
-                    fname = filename_template.replace("{n}", str(part_num))
-                    save_path = os.path.join(out_dir, fname)
-                    wb_out.save(save_path)
-                    
-                    yield ("PART_COMPLETE", (part_num, current_row_count))
-                    
-                    # Reset
-                    part_num += 1
-                    current_row_count = 0
-                    wb_out = Workbook()
-                    ws_out = wb_out.active
-                    ws_out.append(headers)
-                    yield ("PART_START", part_num)
+                put(([row_vals for row_vals in out_rows if row_vals is not None], len(block)))
+            
+            pipeline.add_stage("fiyatlama", price_block)
+            pipeline.add_stage("yazma", lambda item, put: writer.write(*item), lambda put: writer.close(), last=True)
+            pipeline.start()
             
-            # Save valid leftover
-            if current_row_count > 0:
-                fname = filename_template.replace("{n}", str(part_num))
-                save_path = os.path.join(out_dir, fname)
-                wb_out.save(save_path)
-                yield ("PART_COMPLETE", (part_num, current_row_count))
+            queue_peaks = {} # queue label -> (most items seen waiting at a part end, capacity)
+            for event in pipeline.events():
+                yield from gui_logs()
+                yield event
+                if event[0] == "PART_COMPLETE":
+                    queues = pipeline.queue_depths()
+                    log.debug("Kuyruklar: " + ", ".join(f"{label} {waiting}/{size}" for label, waiting, size in queues),
+                              part=event[1][0], queues={label: waiting for label, waiting, _size in queues})
+                    # Peak per queue for the summary below (the per-part line stays at DEBUG)
+                    for label, waiting, size in queues:
+                        peak = queue_peaks.get(label, (0, size))[0]
+                        queue_peaks[label] = (max(peak, waiting), size)
             
-            wb_src.close()
+            busy = pipeline.busy_seconds()
+            timings["okuma"] = busy["okuma"]
+            timings["yazma"] = busy["yazma"]
+            total_processed = writer.total_processed
+            part_num = writer.part_num
             
-            yield log_debug(f"\n{'='*80}")
-            yield log_debug("İŞLEM TAMAMLANDI")
-            yield log_debug(f"Toplam satır: {total_processed}")
-            yield log_debug(f"Güncelleme sayıları:")
-            yield log_debug(f"  - İndirimli Fiyat: {update_count['discounted']}")
-            yield log_debug(f"  - Satış Fiyatı: {update_count['sell']}")
-            yield log_debug(f"  - Piyasa Fiyatı: {update_count['market']}")
-            yield log_debug(f"{'='*80}")
-            debug_log.close()
+            log.info(f"\n{'='*80}")
+            log.info("İŞLEM TAMAMLANDI")
+            log.info(f"Toplam satır: {total_processed}", rows=total_processed, parts=part_num)
+            log.info(f"Güncelleme sayıları:", updates=update_count)
+            log.info(f"  - İndirimli Fiyat: {update_count['discounted']}")
+            log.info(f"  - Satış Fiyatı: {update_count['sell']}")
+            log.info(f"  - Piyasa Fiyatı: {update_count['market']}")
+            log.info(f"Filtrelenen satırlar: stok {stages.skipped['stock']}, kategori {stages.skipped['category']}",
+                     skipped=stages.skipped)
+            log.info("Aşama süreleri: " + " | ".join(f"{name} {secs:.2f} sn" for name, secs in timings.items()),
+                     seconds={name: round(secs, 3) for name, secs in timings.items()})
+            utilization = pipeline.utilization()
+            log.info("Aşama doluluğu: " + " | ".join(f"{name} %{share * 100:.0f}" for name, share in utilization.items()),
+                     utilization={name: round(share, 3) for name, share in utilization.items()})
+            if queue_peaks:
+                log.info("Kuyruk doluluğu (en çok): " + " | ".join(f"{label} {peak}/{size}" for label, (peak, size) in queue_peaks.items()),
+                         queue_peaks={label: peak for label, (peak, _size) in queue_peaks.items()})
+            log.info(f"{'='*80}")
+            log.close()
+            yield from gui_logs(force=True)
             
             yield ("DONE", f"Toplam {total_processed} satır işlendi, {part_num} dosya oluşturuldu.")
             
         except Exception as e:
-            yield log_debug(f"\nFATAL HATA: {str(e)}")
+            if pipeline is not None:
+                pipeline.stop()
+            if isinstance(writer, ParallelPartWriter):
+                writer.stop()
+            log.error(f"\nFATAL HATA: {str(e)}")
             import traceback
-            yield log_debug(traceback.format_exc())
-            debug_log.close()
+            log.error(traceback.format_exc())
+            log.close()
+            yield from gui_logs(force=True)
             yield ("ERROR", str(e))
+        finally:
+            if pipeline is not None:
+                pipeline.stop()
+            if isinstance(writer, ParallelPartWriter):
+                writer.stop()
+            log.close()
@@ -0,0 +1,119 @@
+"""
+Export Log Module
+Buffered, leveled JSON-lines logger for exports.
+Records are kept in memory and written to the log file in batches (at most
+flush_seconds apart, errors right away), so a log call costs no file I/O.
+Records at or above the GUI level are also collected as formatted text lines
+and handed out in chunks at most every gui_seconds, so the GUI gets one signal
+per chunk instead of one per line. The file always receives every level.
+"""
+
+import json
+import threading
+import time
+from datetime import datetime
+
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+
+
+class ExportLogger:
+    """
+    Thread-safe logger writing one JSON object per line:
+    {"ts": "...", "level": "INFO", "msg": "...", <extra fields>}.
+
+    Stage threads may log directly; only the thread driving the export should
+    take GUI chunks (gui_chunk) and close the logger.
+    """
+
+    def __init__(self, path, gui_level="INFO", flush_seconds=1.0, gui_seconds=0.5):
+        """
+        Args:
+            path: JSON-lines file to write (overwritten)
+            gui_level: Lowest level handed to the GUI ("DEBUG", "INFO", "WARNING", "ERROR")
+            flush_seconds: Longest time a record waits in memory before it is written
+            gui_seconds: Shortest time between two GUI chunks
+        """
+        self.path = path
+        self.gui_level = LEVELS.get(str(gui_level).upper(), LEVELS["INFO"])
+        self.flush_seconds = flush_seconds
+        self.gui_seconds = gui_seconds
+        self.counts = dict.fromkeys(LEVELS, 0)
+        self._file = open(path, "w", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._pending = [] # JSON lines not written yet
+        self._gui = [] # GUI lines not handed out yet
+        self._last_flush = time.monotonic()
+        self._last_gui = 0.0
+
+    def log(self, level, msg, **fields):
+        """
+        Records a message.
+
+        Args:
+            level: One of LEVELS
+            msg: Message text (also what the GUI shows)
+            **fields: Extra JSON fields (values JSON can't store are written with str())
+        """
+        now = datetime.now()
+        record = {"ts": now.isoformat(timespec="milliseconds"), "level": level, "msg": msg}
+        record.update(fields)
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            self.counts[level] += 1
+            self._pending.append(line)
+            if LEVELS[level] >= self.gui_level:
+                self._gui.append(f"[{now:%Y-%m-%d %H:%M:%S}] [{level}] {msg}")
+            if level == "ERROR" or time.monotonic() - self._last_flush >= self.flush_seconds:
+                self._write()
+
+    def debug(self, msg, **fields):
+        self.log("DEBUG", msg, **fields)
+
+    def info(self, msg, **fields):
+        self.log("INFO", msg, **fields)
+
+    def warning(self, msg, **fields):
+        self.log("WARNING", msg, **fields)
+
+    def error(self, msg, **fields):
+        self.log("ERROR", msg, **fields)
+
+    def flush(self, force=True):
+        """Writes the buffered records (only if the oldest is due, unless force)."""
+        with self._lock:
+            if force or time.monotonic() - self._last_flush >= self.flush_seconds:
+                self._write()
+
+    def gui_chunk(self, force=False):
+        """
+        Returns the GUI lines collected since the last chunk as one text.
+
+        Returns None when there are none, or (unless force) when the last chunk
+        was handed out less than gui_seconds ago.
+        """
+        with self._lock:
+            if not self._gui:
+                return None
+            now = time.monotonic()
+            if not force and now - self._last_gui < self.gui_seconds:
+                return None
+            chunk = "\n".join(self._gui)
+            self._gui = []
+            self._last_gui = now
+            return chunk
+
+    def close(self):
+        """Writes what is left and closes the file (safe to call twice)."""
+        with self._lock:
+            if self._file.closed:
+                return
+            self._write()
+            self._file.close()
+
+    def _write(self):
+        if self._pending and not self._file.closed:
+            self._file.write("".join(self._pending))
+            self._file.flush()
+            self._pending = []
+        self._last_flush = time.monotonic()
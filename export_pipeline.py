@@ -0,0 +1,206 @@
+"""
+Export Pipeline Module
+Runs a chain of stages on their own threads, connected by bounded queues.
+Each stage takes the items the previous stage produced and hands its results on,
+so reading, pricing and part writing overlap instead of taking turns. The
+bounded queues keep a fast stage at most a few blocks ahead of a slow one.
+Events from any stage (progress, log lines) are collected on one queue and
+handed to the caller's thread, which stays the only one talking to the GUI.
+"""
+
+import queue
+import threading
+import time
+
+
+# End-of-stream marker passed down the chain after a stage's last item
+_END = object()
+
+# How often blocked threads look at the stop flag (seconds)
+_POLL = 0.1
+
+
+class PipelineStopped(Exception):
+    """Raised inside a stage thread when the pipeline shuts down early."""
+
+
+class StagePipeline:
+    """
+    Chain of stage threads joined by bounded queues.
+
+    The first stage is a source: work(put) calls put(item) for each item it
+    produces. Every later stage gets work(item, put) per incoming item and an
+    optional finish(put) once its input has ended; the last stage's put has no
+    queue behind it and must not be called. Stages can be added and started in
+    several steps (e.g. the source first, the rest once it has told the caller
+    what it reads), but only at the end of the chain.
+
+    An exception in any stage stops the whole pipeline and is raised again from
+    events() in the caller's thread.
+    """
+
+    def __init__(self, depth=4):
+        """
+        Args:
+            depth: Items each queue between two stages holds before the producer waits
+        """
+        self.depth = max(1, int(depth))
+        self._events = queue.Queue()
+        self._stop = threading.Event()
+        self._stages = [] # [name, thread, started]
+        self._queues = [] # [label, queue] between consecutive stages ("okuma→fiyatlama")
+        self._outbox = None # queue the last added stage writes into
+        self._busy = {} # stage name -> seconds spent working (not waiting on queues)
+        self._busy_lock = threading.Lock()
+        self._error = None
+        self._started_at = None
+
+    def add_stage(self, name, work, finish=None, last=False):
+        """
+        Appends a stage to the chain.
+
+        Args:
+            name: Stage name (used in the statistics)
+            work: work(put) for the first stage, work(item, put) for the others
+            finish: Optional finish(put) called after the stage's input has ended
+            last: True for the final stage (no queue is created behind it)
+        """
+        inbox = self._outbox
+        if self._stages and inbox is None:
+            raise ValueError("the pipeline already has its last stage")
+        if inbox is not None:
+            self._queues[-1][0] += f"→{name}"
+        outbox = None
+        if not last:
+            outbox = queue.Queue(self.depth)
+            self._queues.append([name, outbox])
+        self._outbox = outbox
+        self._busy[name] = 0.0
+        thread = threading.Thread(target=self._run, args=(name, work, finish, inbox, outbox),
+                                  name=f"export-{name}", daemon=True)
+        self._stages.append([name, thread, False])
+
+    def start(self):
+        """Starts the stages added since the last call."""
+        if self._started_at is None:
+            self._started_at = time.perf_counter()
+        for stage in self._stages:
+            if not stage[2]:
+                stage[2] = True
+                stage[1].start()
+
+    def emit(self, event):
+        """Queues an event for the caller's thread (safe from any stage)."""
+        self._events.put(event)
+
+    def events(self):
+        """
+        Yields the events emitted by the stages until every started stage has finished.
+
+        Raises the first exception a stage failed with. The caller may stop
+        iterating at any point and call events() again later.
+        """
+        while True:
+            try:
+                event = self._events.get(timeout=_POLL)
+            except queue.Empty:
+                event = None
+            if event is not None:
+                yield event
+                continue
+            if self._error is not None:
+                raise self._error
+            # Once the threads are done, return after anything emitted right before they ended
+            if self._events.empty() and not any(
+                    thread.is_alive() for _name, thread, started in self._stages if started):
+                if self._error is not None:
+                    raise self._error
+                return
+
+    def stop(self):
+        """Asks every stage to stop and waits for the threads to end."""
+        self._stop.set()
+        for _name, thread, started in self._stages:
+            if started:
+                thread.join()
+
+    def queue_depths(self):
+        """Returns [(label, items waiting, capacity), ...] for the queues between stages."""
+        return [(label, q.qsize(), q.maxsize) for label, q in self._queues]
+
+    def utilization(self):
+        """Returns {stage name: share of the elapsed time spent working} (0.0 - 1.0)."""
+        if self._started_at is None:
+            return dict.fromkeys(self._busy, 0.0)
+        elapsed = max(time.perf_counter() - self._started_at, 1e-9)
+        with self._busy_lock:
+            return {name: min(busy / elapsed, 1.0) for name, busy in self._busy.items()}
+
+    def busy_seconds(self):
+        """Returns {stage name: seconds spent working}."""
+        with self._busy_lock:
+            return dict(self._busy)
+
+    # ---- stage threads ----
+
+    def _run(self, name, work, finish, inbox, outbox):
+        # Busy time is counted up to each put() and resumed after it, so waiting
+        # on a full queue is left out and long-running sources report as they go
+        mark = [0.0]
+
+        def account():
+            now = time.perf_counter()
+            with self._busy_lock:
+                self._busy[name] += now - mark[0]
+            mark[0] = now
+
+        def put(item):
+            if outbox is None:
+                raise RuntimeError(f"stage '{name}' is the last stage and cannot pass items on")
+            account()
+            self._put(outbox, item)
+            mark[0] = time.perf_counter()
+
+        def timed(call, *args):
+            mark[0] = time.perf_counter()
+            call(*args)
+            account()
+
+        try:
+            if inbox is None:
+                timed(work, put)
+            else:
+                while True:
+                    item = self._get(inbox)
+                    if item is _END:
+                        break
+                    timed(work, item, put)
+                if finish is not None:
+                    timed(finish, put)
+            if outbox is not None:
+                self._put(outbox, _END)
+        except PipelineStopped:
+            pass
+        except BaseException as e:
+            if self._error is None:
+                self._error = e
+            self._stop.set()
+
+    def _put(self, q, item):
+        while True:
+            if self._stop.is_set():
+                raise PipelineStopped()
+            try:
+                q.put(item, timeout=_POLL)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, q):
+        while True:
+            if self._stop.is_set():
+                raise PipelineStopped()
+            try:
+                return q.get(timeout=_POLL)
+            except queue.Empty:
+                continue
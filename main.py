@@ -1,9 +1,13 @@
+import multiprocessing
 import os
 import sys
+import threading
+from collections import Counter
 from datetime import datetime
+from dataclasses import replace
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                                QTabWidget, QLabel, QLineEdit, QPushButton, QFileDialog, 
-                               QComboBox, QTableWidget, QTableWidgetItem, QHeaderView, 
+                               QComboBox, QTableWidget, QTableWidgetItem, QTableView, QHeaderView, 
                                QCheckBox, QSpinBox, QDoubleSpinBox, QMessageBox, QProgressBar,
                                QGroupBox, QFormLayout, QStyleFactory, QProgressDialog,
                                QPlainTextEdit, QStackedWidget, QDialog, QMenu, QScrollArea)
@@ -11,14 +15,19 @@ from PySide6.QtCore import Qt, QThread, Signal, QTimer
 from PySide6.QtGui import QIcon, QPalette, QColor, QFont, QPixmap
 
 import ctypes
+import numpy as np
 try:
     import winreg
 except ImportError:
     winreg = None
 
 from settings import SettingsManager
-from pricing_engine import PricingEngine
+from pricing_engine import PricingEngine, PricingPlan, ProfitSegmentIndex
+from category_paths import CategorySelection, CategoryTrie
+from models import PandasTableModel
 from excel_io import ExcelHandler
+from dataset_cache import ColumnarRecords, dataset_cache
+from columnar_cache import ColumnarDiskCache
 
 # Import openpyxl for the new generator logic
 # Import openpyxl for the new generator logic
@@ -28,8 +37,9 @@ from updater import GitUpdateWorker
 
 class Worker(QThread):
     progress_part = Signal(str, int, int) # status, part_num, row_count
+    progress_total = Signal(int, int, float, float) # source rows done, total (0 = unknown), rows/sec, eta sec (-1 = unknown)
     finished = Signal(bool, str)
-    log_message = Signal(str)  # For debug messages to GUI
+    log_message = Signal(str)  # Batched export log lines, already formatted
     
     def __init__(self, filepath, settings_manager, pricing_engine):
         super().__init__()
@@ -56,39 +66,367 @@ class Worker(QThread):
             elif status_type == "PART_START":
                 self.progress_part.emit("START", data, 0)
             elif status_type == "PROGRESS":
-                # data = (part_num, current_rows, total_processed)
+                # data = (part_num, current_rows, total_processed, done, total, rows_per_sec, eta)
                 self.progress_part.emit("PROGRESS", data[0], data[1])
+                self.progress_total.emit(data[3], data[4] or 0, data[5], -1.0 if data[6] is None else data[6])
             elif status_type == "PART_COMPLETE":
                 # data = (part_num, final_rows)
                 self.progress_part.emit("COMPLETE", data[0], data[1])
             elif status_type == "LOG":
-                # Log message to GUI
+                # Chunk of log lines to GUI
                 self.log_message.emit(str(data))
 
 class FileLoaderWorker(QThread):
-    finished = Signal(list)
+    partial = Signal(object) # ColumnarRecords of the rows read so far (only while the file is parsed)
+    finished = Signal(object) # ColumnarRecords (every row of the file)
     failed = Signal(str)
+    log_message = Signal(str, str) # message, level (reader notices)
     
-    def __init__(self, filepath):
+    def __init__(self, filepath, columns=None):
         super().__init__()
         self.filepath = filepath
-        self.io = ExcelHandler()
+        self.columns = columns # header names to read (None = all columns)
+        self.io = ExcelHandler(log=self.log_message.emit)
 
     def run(self):
         try:
-            rows = self.io.get_all_rows(self.filepath, limit=50000)
+            rows = self.io.get_records(self.filepath, on_partial=self.partial.emit, columns=self.columns)
             self.finished.emit(rows)
         except Exception as e:
             self.failed.emit(str(e))
 
+# Preview table columns read straight from the priced results (see PricedPreview)
+PRICE_COLUMNS = ("Stok Kodu", "Ürün Adı", "Kategori", "Baz Fiyat", "Kâr", "Yeni İndirimli", "Yeni Etiket")
+
+
+def price_text(new_p, base):
+    """New price as shown in the preview table, with an arrow when it moved."""
+    txt = str(new_p)
+    if abs(new_p - base) > 0.001:
+        if new_p > base:
+            txt += " ▲"
+        else:
+            txt += " ▼"
+    return txt
+
+
+def _object_array(values):
+    arr = np.empty(len(values), dtype=object)
+    arr[:] = values
+    return arr
+
+
+def _sort_number(v):
+    # Price/Number columns; text that is not a number sorts lowest
+    try:
+        # Replace comma with dot if it's a string representation of a float
+        if isinstance(v, str):
+            v = v.replace(",", ".")
+        return float(v)
+    except (ValueError, TypeError):
+        return -1.0
+
+
+class PricedPreview:
+    """
+    Priced preview rows of one loaded row set under one pricing plan.
+
+    Built once by PreviewPriceCache and never changed afterwards, so a
+    PreviewWorker can filter it while another run prices newer rows: a repricing
+    or an appended chunk makes a new PricedPreview. The table cells are built
+    here too, once per pricing; a refresh only indexes them with the rows shown.
+    Per-column extras (stock values, variant cells, sort keys) are added later,
+    under the snapshot's own lock.
+    """
+    
+    def __init__(self, rows, results, engine, plan, previous=None):
+        """
+        Args:
+            rows: ColumnarRecords priced; "_row_index" of each result points into them
+            results: Results of the rows not in previous (calculate_frame, frame_to_results)
+            engine: PricingEngine (category paths)
+            plan: PricingPlan the results were priced with
+            previous: PricedPreview of a prefix of rows, extended here
+        """
+        self.rows = rows
+        self.fingerprint = plan.fingerprint
+        start = len(previous) if previous is not None else 0
+        
+        n = len(results)
+        search_text = [None] * n
+        main_cats = [None] * n
+        full_paths = [None] * n
+        has_path = np.zeros(n, dtype=bool)
+        changed = np.zeros(n, dtype=bool)
+        cells = {h: [None] * n for h in PRICE_COLUMNS}
+        delta = np.zeros(n, dtype=np.int8)
+        category_links = np.zeros(n, dtype=bool)
+        errors = np.zeros(n, dtype=bool)
+        
+        for i, res in enumerate(results):
+            res["_row_index"] = start + i # Source row (rows[index]) for the comparison dialog
+            
+            cat = str(res.get("main_category", ""))
+            main_cats[i] = cat
+            
+            # Search looks at stock code, name and the price strings
+            search_text[i] = "\0".join((
+                str(res.get("stock_code", "")).lower(),
+                str(res.get("product_name", "")).lower(),
+                str(res.get("base_price", "")),
+                str(res.get("final_discounted_price", "")),
+                str(res.get("label_price", "")),
+            ))
+            
+            # Normalize path immediately for accurate filtering
+            raw_path = res.get("full_category_path", cat)
+            if raw_path:
+                full_paths[i] = engine.category_info(raw_path, plan).full_path
+            else:
+                full_paths[i] = cat # Fallback to main category if full path missing
+            # Rows counted in the category dropdown and tree
+            has_path[i] = bool(res.get("full_category_path", res.get("main_category", "")))
+            
+            try:
+                base = float(res.get("base_price", 0))
+                final = float(res.get("final_discounted_price", 0))
+                changed[i] = abs(final - base) > 0.01
+            except:
+                pass
+            
+            # Table cells
+            if "error" in res:
+                cells["Ürün Adı"][i] = f"ERROR: {res.get('error')}"
+                errors[i] = True
+                continue
+            
+            cells["Stok Kodu"][i] = str(res.get("stock_code", ""))
+            cells["Ürün Adı"][i] = str(res.get("product_name", ""))
+            
+            # Full category path; clickable if it has subcategories
+            full_cat_path = str(res.get("full_category_path", res.get("main_category", "")))
+            cells["Kategori"][i] = full_cat_path
+            category_links[i] = ">" in full_cat_path
+            
+            base = res["base_price"]
+            new_p = res["final_discounted_price"]
+            cells["Baz Fiyat"][i] = str(base)
+            cells["Kâr"][i] = str(res["profit_added"])
+            cells["Yeni İndirimli"][i] = price_text(new_p, base)
+            cells["Yeni Etiket"][i] = str(res["label_price"])
+            if abs(new_p - base) > 0.001:
+                delta[i] = 1 if new_p > base else -1
+        
+        categories = {c for c in main_cats if c}
+        cells = {h: _object_array(values) for h, values in cells.items()}
+        full_paths = _object_array(full_paths)
+        if previous is not None:
+            # New containers: workers may still be reading the previous snapshot
+            results = previous.results + results
+            search_text = previous.search_text + search_text
+            main_cats = previous.main_cats + main_cats
+            categories |= previous.categories
+            full_paths = np.concatenate([previous.full_paths, full_paths])
+            has_path = np.concatenate([previous.has_path, has_path])
+            changed = np.concatenate([previous.changed, changed])
+            cells = {h: np.concatenate([previous.cells[h], values]) for h, values in cells.items()}
+            delta = np.concatenate([previous.delta, delta])
+            category_links = np.concatenate([previous.category_links, category_links])
+            errors = np.concatenate([previous.errors, errors])
+        
+        self.results = results
+        self.search_text = search_text
+        self.main_cats = main_cats
+        self.full_paths = full_paths
+        self.has_path = has_path
+        self.categories = frozenset(categories)
+        self.changed = changed
+        self.cells = cells # PRICE_COLUMNS header -> object array of cell texts (None = empty)
+        self.delta = delta # -1/0/+1 price move per row ("Yeni İndirimli" color)
+        self.category_links = category_links
+        self.errors = errors
+        
+        self._lock = threading.RLock()
+        self._stock_values = {}
+        self._extras = {}
+    
+    def __len__(self):
+        return len(self.results)
+    
+    def _extra(self, key, compute):
+        with self._lock:
+            value = self._extras.get(key)
+            if value is None:
+                value = self._extras[key] = compute()
+            return value
+    
+    def stock_values(self, stock_col):
+        """Stock value per row for a stock column (computed once per column)."""
+        with self._lock:
+            values = self._stock_values.get(stock_col)
+            if values is None:
+                from stock_filter import StockFilter
+                values = [StockFilter.get_stock_value({stock_col: v}, stock_col)
+                          for v in self.rows.column(stock_col, 0)[:len(self.results)]]
+                self._stock_values[stock_col] = values
+            return values
+    
+    def column(self, name, default=""):
+        """Raw values of a source column per row (same as r_data.get(name, default))."""
+        return self.rows.column(name, default)[:len(self.results)]
+    
+    def stock_cells(self, stock_col):
+        """(cell texts, zero stock mask) of the "Stok" column for a stock column."""
+        def compute():
+            values = self.stock_values(stock_col)
+            texts = _object_array([str(v) for v in values])
+            texts[self.errors] = None
+            mask = np.array(values, dtype=np.float64) <= 0
+            return texts, mask & ~self.errors
+        return self._extra(("stock", stock_col), compute)
+    
+    def variant_cells(self, variant_col):
+        """(cell texts, link mask) of the "Varyant ID" column for a variant column ("" = none)."""
+        def compute():
+            if variant_col:
+                texts = _object_array([str(v) for v in self.column(variant_col)])
+            else:
+                texts = _object_array(["-"] * len(self.results))
+            links = texts != "-"
+            texts[self.errors] = None
+            return texts, links & ~self.errors
+        return self._extra(("variant", variant_col), compute)
+    
+    def sort_keys(self, field, numeric, column=None):
+        """
+        Sort key per row: the value as a float (-1.0 if not a number) or the rank
+        of its lower-cased text.
+        
+        Args:
+            field: Result key (stock_code, base_price, ...)
+            numeric: Sort as numbers
+            column: Source column to read instead of a result key (variant ID)
+        """
+        def compute():
+            if column:
+                values = self.column(column)
+            else:
+                values = [res.get(field, "") for res in self.results]
+            if numeric:
+                return np.fromiter((_sort_number(v) for v in values), dtype=np.float64, count=len(values))
+            _texts, ranks = np.unique(_object_array([str(v).lower() for v in values]), return_inverse=True)
+            return ranks.reshape(-1)
+        return self._extra(("sort", field, numeric, column), compute)
+    
+    def category_counts(self, order):
+        """{normalized category path: rows} over the rows shown (rows without a category are left out)."""
+        shown = order[self.has_path[order]]
+        return dict(Counter(self.full_paths[shown].tolist()))
+    
+    def filter_mask(self, search_txt, cat_filter, category_selection, stock_col=None, include_zero_stock=True):
+        """
+        Boolean mask of rows passing the preview filters.
+        
+        Args:
+            search_txt: Lower-cased search text ("" = no search)
+            cat_filter: Dropdown category path or "Tüm Kategoriler"
+            category_selection: CategorySelection from the tree (empty = all)
+            stock_col: Stock column name (zero stock rows dropped unless include_zero_stock)
+        """
+        n = len(self.results)
+        keep = np.ones(n, dtype=bool)
+        
+        if stock_col and not include_zero_stock:
+            keep &= ~(np.array(self.stock_values(stock_col), dtype=np.float64) <= 0)
+        
+        # Category checks run once per distinct (path, main category) pair
+        if cat_filter != "Tüm Kategoriler" or category_selection:
+            prefix = cat_filter + " >"
+            decided = {}
+            for i, key in enumerate(zip(self.full_paths, self.main_cats)):
+                ok = decided.get(key)
+                if ok is None:
+                    full_cat_path, cat = key
+                    ok = True
+                    # Cat Filter (Dropdown Selection): full path or a subcategory
+                    if cat_filter != "Tüm Kategoriler":
+                        ok = full_cat_path == cat_filter or full_cat_path.startswith(prefix)
+                    # Category Tree Filter: path or any of its parents selected
+                    if ok and category_selection:
+                        ok = category_selection.matches(full_cat_path, cat)
+                    decided[key] = ok
+                if not ok:
+                    keep[i] = False
+        
+        if search_txt:
+            keep &= np.fromiter((search_txt in t for t in self.search_text), dtype=bool, count=n)
+        
+        return keep
+
+
+class PreviewPriceCache:
+    """
+    Priced preview rows, kept until the data or a pricing setting changes.
+    
+    Search, category, stock and variant changes only rebuild a row mask over the
+    priced rows; calculate_frame runs again only when the loaded rows are replaced
+    or the pricing plan fingerprint moves. Rows that continue the priced ones (next
+    chunk of a file still loading) are priced on their own and appended.
+    Shared by consecutive PreviewWorker runs, which each get a PricedPreview
+    snapshot and read nothing else.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self.reprice_count = 0
+    
+    def get(self, all_rows, engine, plan):
+        """
+        Returns the PricedPreview of all_rows under plan (repricing if needed).
+        
+        A run asking for fewer rows of the same load than are priced already (an
+        older worker still running) gets the current snapshot, which extends its
+        rows, instead of pricing the cache back to them.
+        
+        Args:
+            all_rows: ColumnarRecords of the loaded file (same object = same data)
+            engine: PricingEngine
+            plan: PricingPlan snapshot
+        """
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or plan.fingerprint != snapshot.fingerprint:
+                snapshot = self._price(all_rows, engine, plan)
+            elif all_rows is snapshot.rows or snapshot.rows.continues(all_rows):
+                pass
+            elif all_rows.continues(snapshot.rows):
+                snapshot = self._price(all_rows, engine, plan, previous=snapshot)
+            else:
+                snapshot = self._price(all_rows, engine, plan)
+            self._snapshot = snapshot
+            return snapshot
+    
+    def _price(self, all_rows, engine, plan, previous=None):
+        # One vectorized pass straight over the store's columns (no row dicts are built)
+        start = len(previous) if previous is not None else 0
+        results = engine.frame_to_results(engine.calculate_frame(all_rows.tail(start) if start else all_rows, plan))
+        if previous is None:
+            self.reprice_count += 1
+        return PricedPreview(all_rows, results, engine, plan, previous)
+
+
 class PreviewWorker(QThread):
-    finished = Signal(list, int, set) # results, changed_count, categories_set
+    finished = Signal(object, object, int) # PricedPreview, row indices shown (in table order), changed_count
     
     def __init__(self, all_rows, engine, search_txt, cat_filter, variant_col=None, variant_val_col=None, show_unique_variant=False, 
-                 stock_col=None, include_zero_stock=True, selected_categories=None):  # NEW: Added stock and category filter params
+                 stock_col=None, include_zero_stock=True, selected_categories=None, price_cache=None):  # NEW: Added stock and category filter params
         super().__init__()
         self.all_rows = all_rows
         self.engine = engine
+        # Snapshot pricing settings once for this run
+        self.plan = engine.get_plan()
+        self.price_cache = price_cache if price_cache is not None else PreviewPriceCache()
         self.search_txt = search_txt.lower()
         self.cat_filter = cat_filter
         self.variant_col = variant_col
@@ -98,188 +436,106 @@ class PreviewWorker(QThread):
         self.stock_col = stock_col
         self.include_zero_stock = include_zero_stock
         self.selected_categories = selected_categories if selected_categories else []
+        self.category_selection = CategorySelection(self.selected_categories)
         # ===== END NEW FEATURE =====
 
     def run(self):
-        filtered_rows = []
-        cats = set()
+        # Priced rows are reused while pricing settings are unchanged; filters only build a mask.
+        # Everything below reads this snapshot only: a newer run may replace the cache meanwhile
+        priced = self.price_cache.get(self.all_rows, self.engine, self.plan)
+        keep = priced.filter_mask(self.search_txt, self.cat_filter, self.category_selection,
+                                  self.stock_col, self.include_zero_stock)
+        order = np.flatnonzero(keep) # snapshot rows shown, in table order
+        
+        if not self.variant_col:
+            self.finished.emit(priced, order, int(np.count_nonzero(priced.changed[order])))
+            return
         
+        variant_ids = priced.column(self.variant_col)
+        shown = []
         seen_variants = set()
-        
         changed_variants = set() 
         changed_simple_count = 0
         
-        for r_data in self.all_rows:
-            res = self.engine.calculate_row(r_data)
-            res["_raw_data"] = r_data # Attach raw data for comparison
-            
-            s_code = str(res.get("stock_code", "")).lower()
-            p_name = str(res.get("product_name", "")).lower()
-            cat = str(res.get("main_category", ""))
-            
-            if cat: cats.add(cat)
-            
-            # ===== NEW FEATURE: Stock Filter =====
-            # Apply stock filtering if enabled
-            if self.stock_col and not self.include_zero_stock:
-                from stock_filter import StockFilter
-                stock_val = StockFilter.get_stock_value(r_data, self.stock_col)
-                if stock_val <= 0:
-                    continue  # Skip zero stock items
-            
-            # Store stock value in result for display
-            if self.stock_col:
-                from stock_filter import StockFilter
-                res["_stock_value"] = StockFilter.get_stock_value(r_data, self.stock_col)
-            # ===== END NEW FEATURE =====
-            
-            # Search Filter
-            # Check stock, name, and also price strings
-            search_match = False
-            if not self.search_txt:
-                search_match = True
-            else:
-                if self.search_txt in s_code or self.search_txt in p_name:
-                    search_match = True
-                else:
-                    # Check prices
-                    try:
-                        if self.search_txt in str(res.get("base_price", "")) or \
-                           self.search_txt in str(res.get("final_discounted_price", "")) or \
-                           self.search_txt in str(res.get("label_price", "")):
-                            search_match = True
-                    except:
-                        pass
-            
-            
-            # Normalize path immediately for accurate filtering
-            raw_path = res.get("full_category_path", cat)
-            if raw_path:
-                full_cat_path = " > ".join([p.strip() for p in str(raw_path).split(">") if p.strip()])
-            else:
-                full_cat_path = cat # Fallback to main category if full path missing
-
-            # Cat Filter (Dropdown Selection)
-            # FIX: Compare against full path, not just main category
-            if self.cat_filter != "Tüm Kategoriler":
-                if not (full_cat_path == self.cat_filter or full_cat_path.startswith(self.cat_filter + " >")):
-                    continue
-            
-            # ===== NEW FEATURE: Category Tree Filter (Enhanced) =====
-            # If category tree has selections, filter by them using FULL path
-            if self.selected_categories:
-                # Path already normalized above
-                pass 
-                
-                # Check if current category or any parent is selected
-                cat_match = False
-                for selected in self.selected_categories:
-                    # Match full path, main category, or if full path starts with selected
-                    if full_cat_path == selected or \
-                       cat == selected or \
-                       full_cat_path.startswith(selected + " >") or \
-                       cat.startswith(selected + " >"):
-                        cat_match = True
-                        break
-                
-                if not cat_match:
-                    continue  # Skip if not in selected categories
-                
-        
-        # Fixed duplicate block
-        
-            # ===== END NEW FEATURE =====
+        for i in order:
+            v_id = variant_ids[i]
             
-            if not search_match:
-                continue
-                
             # Unique Variant Logic for Display
-            if self.variant_col and self.show_unique_variant:
-                v_id = r_data.get(self.variant_col, "")
+            if self.show_unique_variant:
                 if v_id and str(v_id) in seen_variants:
-                    # Duplicate variant, calculate for stats but DON'T add to display list
-                    # Wait, requirement says "hide", so we skip adding to filtered_rows
-                    
-                    # But we still need to calculate change stats? 
-                    # Usually "Show Unique" implies visualizing 1 representative.
-                    # We will skip adding to filtered_rows.
+                    # Duplicate variant: counted in the stats below but hidden from the list
                     pass
                 else:
-                    filtered_rows.append(res)
+                    shown.append(i)
                     if v_id: seen_variants.add(str(v_id))
-            else:
-                filtered_rows.append(res)
-            
             
-            # Check Change
-            try:
-                base = float(res.get("base_price", 0))
-                final = float(res.get("final_discounted_price", 0))
-                if abs(final - base) > 0.01:
-                    if self.variant_col:
-                        # Variant Mode: Track unique Variant IDs that changed
-                        v_id = r_data.get(self.variant_col, "")
-                        res["_variant_id"] = v_id 
-                        res["_variant_val"] = r_data.get(self.variant_val_col, "") if self.variant_val_col else ""
-                        if v_id:
-                            changed_variants.add(str(v_id))
-                        else:
-                            changed_simple_count += 1
-                    else:
-                        changed_simple_count += 1
+            # Check Change: Variant Mode tracks unique Variant IDs that changed
+            if priced.changed[i]:
+                if v_id:
+                    changed_variants.add(str(v_id))
                 else:
-                    # Even if no change, if we want to show it in table, we might need variant info
-                    if self.variant_col:
-                        res["_variant_id"] = r_data.get(self.variant_col, "")
-                        res["_variant_val"] = r_data.get(self.variant_val_col, "") if self.variant_val_col else ""
-
-            except:
-                pass
-                
-        final_count = len(changed_variants) if self.variant_col else changed_simple_count
-        if self.variant_col and changed_simple_count > 0:
-             # Add fallback for rows without variant ID
-             final_count += changed_simple_count
-
-        self.finished.emit(filtered_rows, final_count, cats)
+                    # Fallback for rows without variant ID
+                    changed_simple_count += 1
+        
+        if self.show_unique_variant:
+            order = np.array(shown, dtype=np.intp)
+        self.finished.emit(priced, order, len(changed_variants) + changed_simple_count)
 
 class CategoryWorker(QThread):
     finished = Signal(set)
+    log_message = Signal(str, str) # message, level (reader notices)
     
     
-    def __init__(self, filepath, cat_col, engine, no_cat_mode=False):
+    def __init__(self, filepath, cat_col, engine, no_cat_mode=False, columns=None):
         super().__init__()
         self.filepath = filepath
         self.cat_col = cat_col
         self.engine = engine
-        self.io = ExcelHandler()
+        self.io = ExcelHandler(log=self.log_message.emit)
         self.no_cat_mode = no_cat_mode
+        # Header names to read (None = all); the category column is always among them
+        self.columns = None if columns is None else sorted(set(columns) | {cat_col})
 
     def run(self):
         # ===== ENHANCED: Collect full category paths AND counts for tree =====
-        # Scan up to 50k rows for categories to ensure consistency with preview
-        rows = self.io.get_all_rows(self.filepath, limit=50000)
+        # Every row of the file is counted (same rows as the preview and the export)
+        # Rows come from the shared dataset cache; counts are kept per file version and settings
+        dataset = self.io.load_dataset(self.filepath, columns=self.columns)
+        plan = self.engine.get_plan()
+        key = ("category_counts", self.cat_col, self.no_cat_mode, plan.delimiter_regex.pattern)
+        category_counts = dataset.derived(key, lambda: self.count_categories(
+            self.io.get_records(self.filepath, columns=self.columns).column(self.cat_col, ""), plan))
+        
+        # Emit dictionary {path: count} instead of just list
+        self.finished.emit(dict(category_counts))
+        # ===== END ENHANCEMENT =====
+
+    def count_categories(self, values, plan):
+        """
+        Counts rows per normalized category path.
+        
+        Args:
+            values: Raw category cell of every row
+            plan: PricingPlan snapshot (delimiters)
+        """
         category_counts = {}
         
         if self.no_cat_mode:
             # All items are "Kategorisiz"
-            count = len(rows)
+            count = len(values)
             if count > 0:
                 category_counts["Kategorisiz"] = count
         else:
-            for r in rows:
-                raw = str(r.get(self.cat_col, ""))
+            # Each distinct cell text is normalized once, then weighted by its row count
+            for raw, count in Counter(str(v) for v in values).items():
                 if raw and raw != "nan":
                     # Normalize path immediately: "A>B" -> "A > B"
                     # This ensures tree keys match exactly with later preview logic
-                    normalized_path = " > ".join([p.strip() for p in raw.split(">") if p.strip()])
+                    normalized_path = self.engine.category_info(raw, plan).full_path
                     
                     if normalized_path:
-                        category_counts[normalized_path] = category_counts.get(normalized_path, 0) + 1
-                    
-        # Emit dictionary {path: count} instead of just list
-        self.finished.emit(category_counts)
-        # ===== END ENHANCEMENT =====
+                        category_counts[normalized_path] = category_counts.get(normalized_path, 0) + count
+        return category_counts
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -295,8 +551,8 @@ class MainWindow(QMainWindow):
         
         self.sm = SettingsManager()
         self.engine = PricingEngine(self.sm)
-        self.io = ExcelHandler()
-        self.io = ExcelHandler()
+        self.configure_dataset_cache()
+        self.io = ExcelHandler(log=self.log)
         self.current_headers = []
         # ===== NEW FEATURE: Persistent Category State =====
         self.persistent_selected_categories = set()
@@ -875,6 +1131,11 @@ class MainWindow(QMainWindow):
             self.log_view.appendPlainText(log_entry)
         print(log_entry)
 
+    def append_log_chunk(self, chunk):
+        """Appends lines that arrive already formatted (the export's batched log)."""
+        if hasattr(self, 'log_view'):
+            self.log_view.appendPlainText(chunk)
+
     def create_file_tab(self):
         widget = QWidget()
         layout = QVBoxLayout(widget)
@@ -992,8 +1253,34 @@ class MainWindow(QMainWindow):
         btn_sett_layout.addWidget(btn_load_sett)
         layout.addLayout(btn_sett_layout)
         
+        # Parsed workbook cache
+        btn_purge_cache = QPushButton("Dosya Önbelleğini Temizle")
+        btn_purge_cache.setToolTip("Daha önce açılan Excel dosyalarının hızlı açılış için saklanan kopyalarını siler.")
+        btn_purge_cache.clicked.connect(self.purge_dataset_cache)
+        layout.addWidget(btn_purge_cache)
+        
         return widget
 
+    def configure_dataset_cache(self):
+        """Attaches the on-disk columnar cache to the shared dataset cache (per settings)."""
+        conf = self.sm.get("dataset_cache", {})
+        dataset_cache.block_rows = int(conf.get("block_rows", 5000))
+        dataset_cache.budget.max_bytes = int(conf.get("memory_budget_mb", 256)) * 1024 * 1024
+        if conf.get("enabled", True):
+            max_bytes = int(conf.get("max_size_mb", 2048)) * 1024 * 1024
+            # A relative directory lives next to the settings file, not in the working directory
+            directory = os.path.join(os.path.dirname(os.path.abspath(self.sm.filepath)), conf.get("directory", "cache"))
+            dataset_cache.disk = ColumnarDiskCache(directory, max_bytes)
+        else:
+            dataset_cache.disk = None
+
+    def purge_dataset_cache(self):
+        freed = dataset_cache.disk.purge() if dataset_cache.disk is not None else 0
+        dataset_cache.invalidate()
+        msg = f"Dosya önbelleği temizlendi ({freed / (1024 * 1024):.1f} MB)."
+        self.log(msg)
+        QMessageBox.information(self, "Önbellek", msg)
+
     def create_categories_tab(self):
         widget = QWidget()
         layout = QVBoxLayout(widget)
@@ -1037,7 +1324,6 @@ class MainWindow(QMainWindow):
         self.category_tree = CategoryTreeWidget()
         # Remove width limit since it's now full tab
         # self.category_tree.setMaximumWidth(300) 
-        self.category_tree.itemChanged.connect(self.on_category_tree_changed)
         self.category_tree.selectionChanged.connect(self.sync_category_selection)
         tab_tree_layout.addWidget(self.category_tree)
         
@@ -1100,8 +1386,16 @@ class MainWindow(QMainWindow):
         self.table_segments = QTableWidget(0, 5)
         self.table_segments.setHorizontalHeaderLabels(["Min", "Max", "Tip", "Değer", "Ek Tutar (TL)"])
         self.table_segments.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table_segments.itemChanged.connect(self.update_segment_warnings)
         layout.addWidget(self.table_segments)
         
+        # Gaps / overlaps between segments, refreshed on every edit
+        self.lbl_segment_warnings = QLabel()
+        self.lbl_segment_warnings.setWordWrap(True)
+        self.lbl_segment_warnings.setStyleSheet("color: #d35400;")
+        self.lbl_segment_warnings.hide()
+        layout.addWidget(self.lbl_segment_warnings)
+        
         btn_row = QHBoxLayout()
         btn_add = QPushButton("Segment Ekle")
         btn_add.clicked.connect(self.add_segment_row)
@@ -1195,14 +1489,18 @@ class MainWindow(QMainWindow):
         # --- Table Area with Loading Overlay ---
         self.preview_stack = QStackedWidget()
         
-        # Page 0: Table
-        self.table_preview = QTableWidget()
+        # Page 0: Table (virtual: only visible rows are rendered)
+        self.preview_model = PandasTableModel()
+        self.preview_model.delta_col_name = "Yeni İndirimli"
+        self.preview_model.link_tooltips = {"Kategori": "Hiyerarşiyi görmek için tıklayın"}
+        self.table_preview = QTableView()
+        self.table_preview.setModel(self.preview_model)
         self.table_preview.setAlternatingRowColors(True)
         # Enable header clicking for sorting
         self.table_preview.horizontalHeader().setSectionsClickable(True)
         self.table_preview.horizontalHeader().sectionClicked.connect(self.on_preview_header_clicked)
         # Click handler for variants
-        self.table_preview.cellClicked.connect(self.on_preview_cell_clicked)
+        self.table_preview.clicked.connect(lambda idx: self.on_preview_cell_clicked(idx.row(), idx.column()))
         # Context Menu
         self.table_preview.setContextMenuPolicy(Qt.CustomContextMenu)
         self.table_preview.customContextMenuRequested.connect(self.show_preview_context_menu)
@@ -1226,17 +1524,13 @@ class MainWindow(QMainWindow):
         
         layout.addWidget(self.preview_stack)
         
-        # --- Pagination ---
-        self.pagination_layout = QHBoxLayout()
-        self.pagination_widget = QWidget()
-        self.pagination_widget.setLayout(self.pagination_layout)
-        layout.addWidget(self.pagination_widget)
-        
         # State
         self.all_rows_cache = []
-        self.filtered_rows = []
-        self.current_page = 1
-        self.items_per_page = 50
+        self.preview_price_cache = PreviewPriceCache()
+        self.stale_preview_workers = [] # replaced PreviewWorkers still running
+        self.preview_priced = None # PricedPreview the table shows
+        self.preview_order = np.zeros(0, dtype=np.intp) # its rows shown, in table order
+        self.preview_rerun_pending = False
         self.sort_col = -1 # None
         self.sort_asc = True
         
@@ -1258,8 +1552,33 @@ class MainWindow(QMainWindow):
         dir_layout.addWidget(self.edit_output_dir)
         dir_layout.addWidget(btn_dir)
         
+        self.combo_writer_engine = QComboBox()
+        # Internal keys mapped to display names
+        self.writer_engine_map = {
+            "openpyxl": "openpyxl",
+            "Yerel Hızlı Yazıcı": "native"
+        }
+        self.combo_writer_engine.addItems(list(self.writer_engine_map.keys()))
+        self.combo_writer_engine.setToolTip("Yerel yazıcı, hücreleri doğrudan XLSX dosyasına yazar (openpyxl'den birkaç kat hızlı).")
+        
+        self.chk_streaming_write = QCheckBox("Akışlı yazım (düşük bellek)")
+        self.chk_streaming_write.setChecked(True)
+        self.chk_streaming_write.setToolTip("Satırlar dosyaya eklendikçe yazılır; büyük dosyalar bölünmeden çıkarılabilir.")
+        
+        self.spin_parallel_parts = QSpinBox()
+        self.spin_parallel_parts.setRange(0, os.cpu_count() or 1)
+        self.spin_parallel_parts.setValue(0)
+        self.spin_parallel_parts.setSpecialValueText("Kapalı")
+        self.spin_parallel_parts.setToolTip("Bölünen dosyaların part'ları bu kadar işlemde aynı anda yazılır (çok çekirdekli makinelerde büyük exportlar için).")
+        
         form.addRow("Dosya Başına Max Satır:", self.spin_max_rows)
         form.addRow("Çıktı Klasörü:", dir_layout)
+        form.addRow("Yazıcı Motoru:", self.combo_writer_engine)
+        form.addRow("", self.chk_streaming_write)
+        form.addRow("Paralel Part Yazımı (işlem):", self.spin_parallel_parts)
+        # The native writer always streams
+        self.combo_writer_engine.currentTextChanged.connect(
+            lambda text: self.chk_streaming_write.setEnabled(self.writer_engine_map.get(text) != "native"))
 
         layout.addLayout(form)
         
@@ -1390,11 +1709,57 @@ class MainWindow(QMainWindow):
         
         self.table_segments.setItem(row, 3, QTableWidgetItem("0"))
         self.table_segments.setItem(row, 4, QTableWidgetItem("0"))
+        self.update_segment_warnings()
 
     def remove_segment_row(self):
         curr = self.table_segments.currentRow()
         if curr >= 0:
             self.table_segments.removeRow(curr)
+            self.update_segment_warnings()
+
+    def read_segment_table(self):
+        """
+        Reads the profit segment table.
+        
+        Returns:
+            Tuple of (segment dicts in settings format, table row index of each segment).
+            Rows with unreadable numbers are left out.
+        """
+        segments = []
+        table_rows = []
+        for r in range(self.table_segments.rowCount()):
+            try:
+                min_v = float(self.table_segments.item(r, 0).text())
+                max_v = float(self.table_segments.item(r, 1).text())
+                
+                # UI text to Internal Value
+                ui_type = self.table_segments.cellWidget(r, 2).currentText()
+                type_v = "PERCENT" if "YÜZDE" in ui_type else "TL"
+                
+                val_v = float(self.table_segments.item(r, 3).text())
+                extra_v = float(self.table_segments.item(r, 4).text())
+                segments.append({"min": min_v, "max": max_v, "type": type_v, "value": val_v, "extra_added": extra_v})
+                table_rows.append(r)
+            except:
+                pass
+        return segments, table_rows
+
+    def update_segment_warnings(self, *args):
+        """Shows gaps, overlaps and invalid ranges of the segment table under it."""
+        if not hasattr(self, 'lbl_segment_warnings'):
+            return
+        raw_segments, table_rows = self.read_segment_table()
+        # Number segments by their table row so messages match what the user sees
+        segments = [replace(seg, row=table_rows[seg.row - 1] + 1)
+                    for seg in PricingPlan.parse_segments(raw_segments)]
+        issues = ProfitSegmentIndex(segments).issues
+        
+        if issues:
+            self.lbl_segment_warnings.setText("⚠ " + "\n⚠ ".join(issues))
+            self.lbl_segment_warnings.show()
+        else:
+            self.lbl_segment_warnings.clear()
+            self.lbl_segment_warnings.hide()
 
     def extract_categories_from_file(self):
         fname = self.path_edit.text()
@@ -1419,8 +1784,11 @@ class MainWindow(QMainWindow):
         if hasattr(self, 'cat_worker') and self.cat_worker.isRunning():
             self.cat_worker.wait()
 
-        self.cat_worker = CategoryWorker(fname, cat_col, self.engine, no_cat_mode=no_cat_mode)
+        # Same columns as the preview, so a later preview reuses this read
+        self.cat_worker = CategoryWorker(fname, cat_col, self.engine, no_cat_mode=no_cat_mode,
+                                         columns=self.preview_columns())
         self.cat_worker.finished.connect(self.on_categories_extracted)
+        self.cat_worker.log_message.connect(self.log)
         self.cat_worker.start()
 
     def on_categories_extracted(self, unique_cats_data):
@@ -1481,9 +1849,7 @@ class MainWindow(QMainWindow):
     def select_all_categories(self):
         """Select all categories in the tree"""
         try:
-            # Get all category paths from tree
-            all_paths = list(self.category_tree.item_map.keys())
-            self.category_tree.set_selected_categories(all_paths)
+            self.category_tree.select_all()
             self.log("Tüm kategoriler seçildi.")
             # Refresh preview if data is loaded
             if hasattr(self, 'all_rows_cache') and self.all_rows_cache:
@@ -1518,12 +1884,6 @@ class MainWindow(QMainWindow):
         if selection_changed and hasattr(self, 'all_rows_cache') and self.all_rows_cache:
             self.apply_filters()
 
-    
-    def on_category_tree_changed(self, item, column):
-        """Called when category tree selection changes - DO NOTHING until manual refresh"""
-        pass
-        # Auto refresh disabled as per user request
-        # if hasattr(self, 'all_rows_cache') and self.all_rows_cache: ...
     # ===== END NEW FEATURE =====
 
     def collect_settings(self):
@@ -1569,21 +1929,7 @@ class MainWindow(QMainWindow):
         })
         
         # Profit Segments
-        segments = []
-        for r in range(self.table_segments.rowCount()):
-            try:
-                min_v = float(self.table_segments.item(r, 0).text())
-                max_v = float(self.table_segments.item(r, 1).text())
-                
-                # UI text to Internal Value
-                ui_type = self.table_segments.cellWidget(r, 2).currentText()
-                type_v = "PERCENT" if "YÜZDE" in ui_type else "TL"
-                
-                val_v = float(self.table_segments.item(r, 3).text())
-                extra_v = float(self.table_segments.item(r, 4).text())
-                segments.append({"min": min_v, "max": max_v, "type": type_v, "value": val_v, "extra_added": extra_v})
-            except:
-                pass
+        segments, _ = self.read_segment_table()
         self.sm.set("profit_segments", segments)
         
         self.sm.set("global_min_profit", self.spin_global_min_profit.value())
@@ -1610,7 +1956,11 @@ class MainWindow(QMainWindow):
         # Output
         self.sm.set("output", {
             "max_rows_per_file": self.spin_max_rows.value(),
-            "output_dir": self.edit_output_dir.text()
+            "output_dir": self.edit_output_dir.text(),
+            "streaming_write": self.chk_streaming_write.isChecked(),
+            "writer_engine": self.writer_engine_map.get(self.combo_writer_engine.currentText(), "openpyxl"),
+            "pipeline_depth": self.sm.get("output", {}).get("pipeline_depth", 4),
+            "parallel_parts": self.spin_parallel_parts.value()
         })
         
         # ===== NEW FEATURE: Save selected categories from tree =====
@@ -1729,17 +2079,53 @@ class MainWindow(QMainWindow):
         if hasattr(self, 'loader_worker') and self.loader_worker.isRunning():
             self.loader_worker.wait()
 
-        self.loader_worker = FileLoaderWorker(f)
+        self.loader_worker = FileLoaderWorker(f, columns=self.preview_columns())
+        self.preview_rerun_pending = False
+        self.loader_worker.partial.connect(self.on_file_partial)
         self.loader_worker.finished.connect(self.on_file_loaded)
         self.loader_worker.failed.connect(self.on_file_load_failed)
+        self.loader_worker.log_message.connect(self.log)
         self.loader_worker.start()
 
+    def preview_columns(self):
+        """Header names the preview and the category scan read (mapped columns plus stock and variant columns)."""
+        mappings = self.sm.get("mappings", {})
+        names = [mappings.get(k) for k in ("stock_code_col", "product_name_col", "category_col",
+                                          "buy_price_col", "sell_price_col", "discounted_price_col",
+                                          "market_price_col", "variant_id_col", "variant_val_col", "stock_col")]
+        names += [self.combo_stock_col.currentText(), self.combo_variant.currentText(), self.combo_variant_val.currentText()]
+        return sorted({n for n in names if n})
+
+    def preview_columns_missing(self):
+        """True if the loaded rows lack a column the preview now needs (e.g. after a mapping change)."""
+        if not isinstance(self.all_rows_cache, ColumnarRecords):
+            return False
+        loaded = set(self.all_rows_cache.headers)
+        return any(n in self.current_headers and n not in loaded for n in self.preview_columns())
+
+    def on_file_partial(self, rows):
+        # Rows read so far: the first chunk is shown right away, later chunks refresh it
+        first = not self.all_rows_cache or not rows.continues(self.all_rows_cache)
+        self.all_rows_cache = rows
+        if first:
+            self.log(f"İlk {len(rows)} satır okundu, önizleme gösteriliyor. Dosyanın geri kalanı okunuyor...")
+            self.lbl_loading.setText("Fiyatlar Hesaplanıyor ve Filtreleniyor...")
+        self.refresh_loaded_preview()
+
     def on_file_loaded(self, rows):
         self.btn_refresh_preview.setEnabled(True)
         self.all_rows_cache = rows
         self.log(f"Excel'den {len(self.all_rows_cache)} satır okundu. Şimdi veriler işleniyor...")
         self.lbl_loading.setText("Fiyatlar Hesaplanıyor ve Filtreleniyor...")
-        self.apply_filters()
+        self.refresh_loaded_preview()
+
+    def refresh_loaded_preview(self):
+        """Previews newly loaded rows; while a preview pass runs, it is repeated once that pass ends."""
+        if hasattr(self, 'preview_worker') and self.preview_worker.isRunning():
+            self.preview_rerun_pending = True
+        else:
+            # Keep the table visible if earlier chunks are already shown
+            self.run_apply_filters(show_loading=self.preview_stack.currentIndex() != 0)
 
     def on_file_load_failed(self, err):
         self.btn_refresh_preview.setEnabled(True)
@@ -1753,8 +2139,14 @@ class MainWindow(QMainWindow):
             return
         self.search_timer.start(500) # Wait 500ms
 
-    def run_apply_filters(self):
-        self.preview_stack.setCurrentIndex(1) # Loading...
+    def run_apply_filters(self, show_loading=True):
+        if self.preview_columns_missing():
+            self.log("Önizleme için okunmamış sütunlar gerekiyor, dosya yeniden okunuyor...")
+            self.refresh_preview()
+            return
+        
+        if show_loading:
+            self.preview_stack.setCurrentIndex(1) # Loading...
         
         search_txt = self.search_bar.text()
         # ===== NEW FEATURE: Get category from hierarchical combo =====
@@ -1784,9 +2176,9 @@ class MainWindow(QMainWindow):
         # Safely handle existing worker
         if hasattr(self, 'preview_worker') and self.preview_worker.isRunning():
             self.preview_worker.finished.disconnect() # Ignore old results
-            # Safely handle existing worker
-        if hasattr(self, 'preview_worker') and self.preview_worker.isRunning():
-            self.preview_worker.finished.disconnect() 
+            # Keep it referenced until it stops: a QThread destroyed while running aborts the app
+            self.stale_preview_workers.append(self.preview_worker)
+        self.stale_preview_workers = [worker for worker in self.stale_preview_workers if worker.isRunning()]
 
         self.preview_worker = PreviewWorker(
             self.all_rows_cache, 
@@ -1799,8 +2191,9 @@ class MainWindow(QMainWindow):
             # ===== NEW FEATURE: Pass new parameters =====
             stock_col=stock_col,
             include_zero_stock=include_zero_stock,
-            selected_categories=selected_cats
+            selected_categories=selected_cats,
             # ===== END NEW FEATURE =====
+            price_cache=self.preview_price_cache
         )
         if selected_cats:
             self.log(f"DEBUG: Filtreleme başladı. Seçili: {len(selected_cats)}", "DEBUG")
@@ -1812,24 +2205,22 @@ class MainWindow(QMainWindow):
         self.preview_worker.finished.connect(self.on_preview_worker_finished)
         self.preview_worker.start()
 
-    def on_preview_worker_finished(self, results, changed_count, categories):
-        self.filtered_rows = results
+    def on_preview_worker_finished(self, priced, order, changed_count):
+        self.preview_priced = priced
+        self.preview_order = order
+        source_rows = priced.rows
         
         # Update Stats
-        total = len(self.filtered_rows)
-        self.lbl_stats.setText(f"Toplam Sonuç: {total} | Fiyatı Değişen: {changed_count}")
+        total = len(order)
+        stats = f"Toplam Sonuç: {total} | Fiyatı Değişen: {changed_count}"
+        if not source_rows.complete:
+            stats += f" | Dosya okunuyor ({len(source_rows)} satır)..."
+        self.lbl_stats.setText(stats)
         self.log(f"Filtreleme uygulandı. Eşleşen: {total}, Değişen: {changed_count}")
 
         # ===== NEW FEATURE: Update hierarchical dropdown with counts =====
-        # Calculate category counts from filtered results
-        # Calculate category counts from filtered results
-        category_counts = {}
-        for row in self.filtered_rows:
-            raw_cat = row.get("full_category_path", row.get("main_category", ""))
-            if raw_cat:
-                # Normalize path to match tree structure
-                full_cat = " > ".join([p.strip() for p in str(raw_cat).split(">") if p.strip()]) 
-                category_counts[full_cat] = category_counts.get(full_cat, 0) + 1
+        # Calculate category counts from filtered results (paths normalized when priced)
+        category_counts = priced.category_counts(order)
         
         # Get selected categories from tree for filtering dropdown
         selected_cats = []
@@ -1838,14 +2229,17 @@ class MainWindow(QMainWindow):
         except:
             pass
         
+        # One hierarchy with subtree totals, shared by the dropdown and the tree
+        category_trie = CategoryTrie(category_counts)
+        
         # Populate hierarchical dropdown
         self.combo_preview_cat.blockSignals(True)
-        self.combo_preview_cat.populate_categories(category_counts, selected_cats)
+        self.combo_preview_cat.populate_categories(category_trie, selected_cats)
         self.combo_preview_cat.blockSignals(False)
         
         # Also update tree with counts
         try:
-            self.category_tree.update_counts(category_counts)
+            self.category_tree.update_counts(category_trie)
         except:
             pass
         # ===== END NEW FEATURE =====
@@ -1854,13 +2248,17 @@ class MainWindow(QMainWindow):
         if self.sort_col != -1:
             self.sort_filtered_data()
 
-        # Reset to page 1
-        self.current_page = 1
-        self.update_pagination_controls()
-        self.update_table_view()
+        # Column widths are fitted once the whole file is in; sizing reads every visible cell
+        # and is many times slower while the loader thread competes for the interpreter
+        self.update_table_view(resize_columns=source_rows.complete)
         
         # Back to table
         self.preview_stack.setCurrentIndex(0)
+        
+        # Rows that finished loading while this pass ran
+        if self.preview_rerun_pending:
+            self.preview_rerun_pending = False
+            self.run_apply_filters(show_loading=False)
 
     def on_preview_header_clicked(self, logicalIndex):
         if self.sort_col == logicalIndex:
@@ -1870,9 +2268,7 @@ class MainWindow(QMainWindow):
             self.sort_asc = True
             
         self.sort_filtered_data()
-        self.current_page = 1
         self.update_table_view()
-        self.update_pagination_controls()
 
     def sort_filtered_data(self):
         # headers = ["Stok Kodu", "Ürün Adı", "Kategori", "Baz Fiyat", "Kâr", "Yeni İndirimli", "Yeni Etiket"]
@@ -1899,23 +2295,16 @@ class MainWindow(QMainWindow):
             key_map[7] = "label_price"
 
         key = key_map.get(self.sort_col)
-        if not key: return
+        if not key or self.preview_priced is None: return
         
-        def safe_sort(item):
-            v = item.get(key, "")
-            # Price/Number columns
-            if self.sort_col in [3, 4, 5, 6] or (is_variant and self.sort_col in [4, 5, 6, 7]): # Adjusted indices for variant mode
-                try:
-                    # Replace comma with dot if it's a string representation of a float
-                    if isinstance(v, str):
-                        v = v.replace(",", ".")
-                    return float(v)
-                except (ValueError, TypeError):
-                    return -1.0 # Default low value for sort
-            # String columns
-            return str(v).lower()
-            
-        self.filtered_rows.sort(key=safe_sort, reverse=not self.sort_asc)
+        # Price/Number columns
+        numeric = self.sort_col in [3, 4, 5, 6] or (is_variant and self.sort_col in [4, 5, 6, 7]) # Adjusted indices for variant mode
+        column = self.combo_variant.currentText() if key == "_variant_id" else None
+        keys = self.preview_priced.sort_keys(key, numeric, column)[self.preview_order]
+        if not self.sort_asc:
+            keys = -keys
+        # Stable, like list.sort: equal keys keep their current order
+        self.preview_order = self.preview_order[np.argsort(keys, kind="stable")]
 
     def export_logs(self):
         # Create logs directory if it doesn't exist
@@ -1936,85 +2325,11 @@ class MainWindow(QMainWindow):
             except Exception as e:
                 QMessageBox.critical(self, "Hata", f"Kaydedilemedi: {e}")
 
-    def update_pagination_controls(self):
-        # Clear existing buttons
-        # Note: Deleting widgets from layout strictly
-        while self.pagination_layout.count():
-            item = self.pagination_layout.takeAt(0)
-            w = item.widget()
-            if w: w.deleteLater()
-            
-        import math
-        total_pages = math.ceil(len(self.filtered_rows) / self.items_per_page)
-        if total_pages < 1: total_pages = 1
-        
-        # Smart Pagination: Show 1..5 ... Last
+    def update_table_view(self, resize_columns=True):
+        priced, order = self.preview_priced, self.preview_order
+        if priced is None: return
         
-        start_p = max(1, self.current_page - 2)
-        end_p = min(total_pages, start_p + 4)
-        
-        # Adjust if near end
-        if end_p - start_p < 4:
-            start_p = max(1, end_p - 4)
-
-        # Prev
-        if self.current_page > 1:
-            btn = QPushButton("<")
-            btn.setFixedWidth(30)
-            btn.clicked.connect(lambda: self.change_page(self.current_page - 1))
-            self.pagination_layout.addWidget(btn)
-            
-        # First Page
-        if start_p > 1:
-            btn = QPushButton("1")
-            btn.setFixedWidth(30)
-            btn.setCheckable(True)
-            btn.clicked.connect(lambda: self.change_page(1))
-            self.pagination_layout.addWidget(btn)
-            if start_p > 2:
-                self.pagination_layout.addWidget(QLabel("..."))
-
-        for p in range(start_p, end_p + 1):
-            btn = QPushButton(str(p))
-            btn.setFixedWidth(30)
-            btn.setCheckable(True)
-            if p == self.current_page:
-                btn.setChecked(True)
-                btn.setEnabled(False) # Current page disabled
-            btn.clicked.connect(lambda checked, page=p: self.change_page(page))
-            self.pagination_layout.addWidget(btn)
-            
-        # Last Page
-        if end_p < total_pages:
-            if end_p < total_pages - 1:
-                self.pagination_layout.addWidget(QLabel("..."))
-            btn = QPushButton(str(total_pages))
-            btn.setFixedWidth(30)
-            btn.setCheckable(True)
-            btn.clicked.connect(lambda: self.change_page(total_pages))
-            self.pagination_layout.addWidget(btn)
-            
-        # Next
-        if self.current_page < total_pages:
-            btn = QPushButton(">")
-            btn.setFixedWidth(30)
-            btn.clicked.connect(lambda: self.change_page(self.current_page + 1))
-            self.pagination_layout.addWidget(btn)
-            
-        self.pagination_layout.addStretch()
-
-    def change_page(self, page):
-        self.current_page = page
-        self.update_pagination_controls()
-        self.update_table_view()
-
-    def update_table_view(self):
-        start_idx = (self.current_page - 1) * self.items_per_page
-        end_idx = start_idx + self.items_per_page
-        
-        page_data = self.filtered_rows[start_idx:end_idx]
-        
-        headers = ["Stok Kodu", "Ürün Adı", "Kategori", "Baz Fiyat", "Kâr", "Yeni İndirimli", "Yeni Etiket"]
+        headers = list(PRICE_COLUMNS)
         
         # Add Variant Header if enabled
         is_variant = self.chk_variants.isChecked()
@@ -2028,105 +2343,31 @@ class MainWindow(QMainWindow):
             insert_pos = 3 if is_variant else 2
             headers.insert(insert_pos + 1, "Stok")  # After kategori
         # ===== END NEW FEATURE =====
-            
-        self.table_preview.setColumnCount(len(headers))
-        self.table_preview.setHorizontalHeaderLabels(headers)
-        self.table_preview.setRowCount(0)
         
-        for res in page_data:
-            row = self.table_preview.rowCount()
-            self.table_preview.insertRow(row)
-            
-            if "error" in res:
-                self.table_preview.setItem(row, 1, QTableWidgetItem(f"ERROR: {res.get('error')}"))
-                continue
-
-            s_code = str(res.get("stock_code", ""))
-            p_name = str(res.get("product_name", ""))
-            
-            self.table_preview.setItem(row, 0, QTableWidgetItem(s_code))
-            self.table_preview.setItem(row, 1, QTableWidgetItem(p_name))
-            
-            col_idx = 2
-            if is_variant:
-                v_id = str(res.get("_variant_id", "-"))
-                item_v_id = QTableWidgetItem(v_id)
-                if v_id != "-":
-                    item_v_id.setForeground(QColor("blue"))
-                    font = item_v_id.font()
-                    font.setUnderline(True)
-                    item_v_id.setFont(font)
-                self.table_preview.setItem(row, col_idx, item_v_id)
-                col_idx += 1
-                
-            # ===== NEW FEATURE: Show full category path instead of just main =====
-            full_cat_path = res.get("full_category_path", res.get("main_category", ""))
-            cat_item = QTableWidgetItem(str(full_cat_path))
-            
-            # Make it clickable (blue, underlined) if it has subcategories
-            if ">" in str(full_cat_path):
-                cat_item.setForeground(QColor("blue"))
-                font = cat_item.font()
-                font.setUnderline(True)
-                cat_item.setFont(font)
-                cat_item.setToolTip("Hiyerarşiyi görmek için tıklayın")
-            
-            self.table_preview.setItem(row, col_idx, cat_item)
-            col_idx += 1
-            # ===== END NEW FEATURE =====
-            
-            # ===== NEW FEATURE: Display stock value =====
-            if has_stock:
-                stock_val = res.get("_stock_value", 0)
-                stock_item = QTableWidgetItem(str(stock_val))
-                
-                # Highlight zero stock with red background
-                if stock_val <= 0:
-                    stock_item.setBackground(QColor(255, 200, 200))  # Light red
-                    stock_item.setToolTip("Stok Yok")
-                    # Make text darker in dark mode
-                    if self.sm.get("theme") == "dark" or (self.sm.get("theme") == "system" and self.is_system_dark()):
-                        stock_item.setForeground(Qt.black)
-                
-                self.table_preview.setItem(row, col_idx, stock_item)
-                col_idx += 1
-            # ===== END NEW FEATURE =====
-            
-            base = res["base_price"]
-            new_p = res["final_discounted_price"]
-            
-            item_new = QTableWidgetItem(self.update_price_visuals(new_p, base)) # Use helper for text
-            if abs(new_p - base) > 0.001:
-                item_new.setBackground(QColor(200, 255, 200) if new_p > base else QColor(255, 200, 200))
-                # Adjust text color for dark mode readiness
-            if abs(new_p - base) > 0.001:
-                item_new.setBackground(QColor(200, 255, 200) if new_p > base else QColor(255, 200, 200))
-                # Adjust text color
-                if self.sm.get("theme") == "dark" or (self.sm.get("theme") == "system" and self.is_system_dark()):
-                     item_new.setForeground(Qt.black) 
-                font = item_new.font()
-                font.setBold(True)
-                item_new.setFont(font)
-            
-            # Use separate helper or just inline, logic is clean enough here
-            # But let's respect previous step's intent to add arrows
-            arrow_txt = str(new_p)
-            if new_p > base + 0.001: arrow_txt += " ▲"
-            elif new_p < base - 0.001: arrow_txt += " ▼"
-            item_new.setText(arrow_txt)
-
-            self.table_preview.setItem(row, col_idx, QTableWidgetItem(str(base))); col_idx+=1
-            self.table_preview.setItem(row, col_idx, QTableWidgetItem(str(res["profit_added"]))); col_idx+=1
-            self.table_preview.setItem(row, col_idx, item_new); col_idx+=1
-            self.table_preview.setItem(row, col_idx, QTableWidgetItem(str(res["label_price"])))
-            
-            # Set Flags for all items in row to be non-editable but enabled
-            for c in range(self.table_preview.columnCount()):
-                it = self.table_preview.item(row, c)
-                if it:
-                    it.setFlags(Qt.ItemIsEnabled | Qt.ItemIsSelectable)
+        # Cells are built once per pricing in the snapshot; the rows shown are picked by indexing
+        columns = {h: cells[order] for h, cells in priced.cells.items()}
+        links = {"Kategori": priced.category_links[order]}
+        stock_mask = None
+        if is_variant:
+            texts, variant_links = priced.variant_cells(self.combo_variant.currentText())
+            columns["Varyant ID"] = texts[order]
+            links["Varyant ID"] = variant_links[order]
+        if has_stock:
+            texts, zero_stock = priced.stock_cells(self.combo_stock_col.currentText())
+            columns["Stok"] = texts[order]
+            stock_mask = zero_stock[order]
+        
+        self.preview_model.dark_mode = self.sm.get("theme") == "dark" or (self.sm.get("theme") == "system" and self.is_system_dark())
+        self.preview_model.setColumns(
+            headers,
+            [columns[h] for h in headers],
+            stock_mask=stock_mask,
+            delta=priced.delta[order],
+            links=links,
+        )
         
-        self.table_preview.resizeColumnsToContents()
+        if resize_columns:
+            self.table_preview.resizeColumnsToContents()
         
     def on_preview_cell_clicked(self, row, col):
         # Determine logical column index for Variant ID
@@ -2145,32 +2386,26 @@ class MainWindow(QMainWindow):
         
         # Check if clicked on category column
         if col == cat_col_idx:
-            item = self.table_preview.item(row, col)
-            if item:
-                category = item.text()
-                if category and category != "-":
-                    # Show category detail dialog
-                    from category_tree import CategoryDetailDialog
-                    dialog = CategoryDetailDialog(category, self)
-                    dialog.exec()
-                    return
+            category = self.preview_model.cell_text(row, col)
+            if category and category != "-":
+                # Show category detail dialog
+                from category_tree import CategoryDetailDialog
+                dialog = CategoryDetailDialog(category, self)
+                dialog.exec()
+                return
         # ===== END NEW FEATURE =====
         
         if not self.chk_variants.isChecked(): return
         
         if col == 2:
-            item = self.table_preview.item(row, col)
-            if not item: return
-            v_id = item.text()
+            v_id = self.preview_model.cell_text(row, col)
             if v_id and v_id != "-":
                 self.show_variant_details(v_id)
 
     def show_variant_details(self, variant_id):
         # Find all rows with this variant id in ALL rows cache
-        group_rows = []
-        for r_data in self.all_rows_cache:
-            if str(r_data.get(self.combo_variant.currentText(), "")) == variant_id:
-                group_rows.append(r_data)
+        variant_ids = self.all_rows_cache.column(self.combo_variant.currentText(), "")
+        group_rows = [self.all_rows_cache[i] for i, v in enumerate(variant_ids) if str(v) == variant_id]
         
         if not group_rows: return
         
@@ -2189,7 +2424,10 @@ class MainWindow(QMainWindow):
         
         val_col_name = self.combo_variant_val.currentText()
         
-        for i, row in enumerate(group_rows):
+        # Price the whole group at once
+        group_results = self.engine.frame_to_results(self.engine.calculate_frame(group_rows))
+        
+        for i, (row, res) in enumerate(zip(group_rows, group_results)):
             p_name = row.get(self.combo_name.currentText(), "-")
             
             # Parse Variation
@@ -2226,8 +2464,6 @@ class MainWindow(QMainWindow):
             table.setItem(i, 2, QTableWidgetItem(status))
             
             
-            # Recalc price for display
-            res = self.engine.calculate_row(row)
             price_txt = f"{res.get('final_discounted_price', 0)} TL"
             
             # Arrow
@@ -2267,25 +2503,21 @@ class MainWindow(QMainWindow):
         menu.exec(self.table_preview.viewport().mapToGlobal(position))
 
     def copy_cell_data(self, col_idx):
-        row = self.table_preview.currentRow()
+        row = self.table_preview.currentIndex().row()
         if row < 0: return
         
-        item = self.table_preview.item(row, col_idx)
-        if item:
-            txt = item.text()
+        txt = self.preview_model.cell_text(row, col_idx)
+        if txt:
             QApplication.clipboard().setText(txt)
             # Optional: Show small status/tooltip?
             self.lbl_stats.setText(f"Kopyalandı: {txt}")
 
     def open_comparison_dialog(self):
-        row = self.table_preview.currentRow()
-        if row < 0: return
-        
-        real_idx = (self.current_page - 1) * self.items_per_page + row
-        if real_idx >= len(self.filtered_rows): return
+        row = self.table_preview.currentIndex().row()
+        if self.preview_priced is None or row < 0 or row >= len(self.preview_order): return
         
-        calc_res = self.filtered_rows[real_idx]
-        raw_data = calc_res.get("_raw_data", {})
+        calc_res = self.preview_priced.results[self.preview_order[row]]
+        raw_data = self.preview_priced.rows[calc_res["_row_index"]] if "_row_index" in calc_res else {}
         
         dlg = QDialog(self)
         dlg.setWindowTitle("Ürün Fiyat Analizi")
@@ -2396,19 +2628,8 @@ class MainWindow(QMainWindow):
         dlg.exec()
 
     def update_price_visuals(self, new_p, base):
-        # Helper for main table visuals
-        txt = str(new_p)
-        if abs(new_p - base) > 0.001:
-            if new_p > base:
-                txt += " ▲"
-            else:
-                txt += " ▼"
-        return txt
-        
-    # Override update_table_view's item creation to use arrow helper
-    # We need to inject this modification back into update_table_view or simply update it there.
-    # Since I'm appending here, I will replace update_table_view in a separate block or rely on previous replace if I was editing it.
-    # Wait, the previous block was `update_table_view`. Let's fix the arrow display there.
+        # Helper for main table visuals (cells are built by price_text when priced)
+        return price_text(new_p, base)
     
     def is_system_dark(self):
          # Quick helper re-using registry logic if needed, or just store state
@@ -2453,27 +2674,39 @@ class MainWindow(QMainWindow):
         
         self.worker = Worker(f, self.sm, self.engine)
         self.worker.progress_part.connect(self.on_part_progress)
-        self.worker.log_message.connect(lambda msg: self.log(msg, "DEBUG"))
+        self.worker.progress_total.connect(self.on_total_progress)
+        self.worker.log_message.connect(self.append_log_chunk)
         self.worker.finished.connect(self.on_processing_finished)
         self.worker.start()
 
     def on_part_progress(self, status, part_num, row_count):
+        # The bar shows the whole export (on_total_progress); part events update the label
         if status == "START":
             self.lbl_part_status.setText(f"Part {part_num} dosyası oluşturuluyor...")
-            self.progress_bar_part.setValue(0)
-            self.progress_bar_part.setFormat(f"Part {part_num}: Başlatılıyor")
             self.log(f"Part {part_num} yazılmaya başlandı...")
-        elif status == "PROGRESS":
-            self.progress_bar_part.setValue(row_count % 100) # Just a visual trick or use indefinite
-            self.progress_bar_part.setFormat(f"Part {part_num}: {row_count} satır")
+        elif status == "PROGRESS" and row_count > 0:
+            self.lbl_part_status.setText(f"Part {part_num}: {row_count} satır yazıldı")
         elif status == "COMPLETE":
-            self.progress_bar_part.setValue(100)
             self.lbl_part_status.setText(f"Part {part_num} tamamlandı ({row_count} satır).")
             self.log(f"Part {part_num} tamamlandı. ({row_count} satır)")
 
+    def on_total_progress(self, done, total, rate, eta):
+        speed = f"{rate:,.0f} satır/sn".replace(",", ".")
+        if total <= 0:
+            self.progress_bar_part.setFormat(f"{done} satır | {speed}")
+            return
+        percent = min(100, done * 100 // total)
+        remaining = ""
+        if eta >= 0 and done < total:
+            minutes, seconds = divmod(int(round(eta)), 60)
+            remaining = f" | kalan ~{minutes} dk {seconds} sn" if minutes else f" | kalan ~{seconds} sn"
+        self.progress_bar_part.setValue(percent)
+        self.progress_bar_part.setFormat(f"%{percent} ({done}/{total} satır) | {speed}{remaining}")
+
     def on_processing_finished(self, success, msg):
         self.btn_run.setEnabled(True)
         if success:
+            self.progress_bar_part.setValue(100)
             self.log(f"İşlem başarıyla tamamlandı: {msg}")
             QMessageBox.information(self, "Tamamlandı", msg)
         else:
@@ -2562,6 +2795,8 @@ class MainWindow(QMainWindow):
                 QMessageBox.critical(self, "Hata", f"Yüklenemedi: {e}")
 
 if __name__ == "__main__":
+    # Parallel part writing starts worker processes; needed for frozen Windows builds
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     # Global logger for unhandled exceptions (optional but good)
     def handle_exception(exc_type, exc_value, exc_traceback):
@@ -1,70 +1,162 @@
 from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex
-from PySide6.QtGui import QColor
+from PySide6.QtGui import QColor, QFont
+import numpy as np
 import pandas as pd
 
+# Qt enum attribute lookups are slow in PySide6; data() compares against these
+DISPLAY_ROLE = Qt.DisplayRole
+BACKGROUND_ROLE = Qt.BackgroundRole
+FOREGROUND_ROLE = Qt.ForegroundRole
+FONT_ROLE = Qt.FontRole
+TOOLTIP_ROLE = Qt.ToolTipRole
+CELL_FLAGS = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+COLOR_ALERT = QColor(255, 200, 200)   # Light Red
+COLOR_UP = QColor(200, 255, 200)      # Light Green
+COLOR_LINK = QColor("blue")
+COLOR_DARK_TEXT = QColor(Qt.black)
+
 class PandasTableModel(QAbstractTableModel):
     """
-    Pandas DataFrame tabanli, yuksek performansli QTableView modeli.
-    Stok <= 0 durumunda satirlari renklendirir.
+    Pandas DataFrame (veya hazir kolon dizileri) tabanli, yuksek performansli
+    (sanal) QTableView modeli.
+    Hucreler kolon listelerinden okunur; QTableView sadece gorunen satirlari ister.
+    Renklendirme bilgileri (stok maskesi, fiyat degisimi, linkler) satir bazinda
+    onceden hesaplanmis dizilerden gelir, data() icinde iloc/iat yapilmaz.
     """
     def __init__(self, data=None):
         super().__init__()
-        self._data = data if data is not None else pd.DataFrame()
         self.stock_col_name = "Stok" # Varsayilan kolon adi
+        self.delta_col_name = None   # Fiyat degisimine gore renklenen kolon
+        self.link_tooltips = {}      # kolon adi -> link hucrelerinin tooltip'i
+        self.dark_mode = False       # Renkli hucrelerde yazi siyah olsun
+
+        self._link_font = QFont()
+        self._link_font.setUnderline(True)
+        self._bold_font = QFont()
+        self._bold_font.setBold(True)
+
+        self._set_data(data if data is not None else pd.DataFrame())
+
+    def setDataFrame(self, df, stock_mask=None, delta=None, links=None):
+        """
+        Tabloyu yeni veriyle degistirir.
+
+        Args:
+            df: Gosterilecek DataFrame (kolonlar = basliklar)
+            stock_mask: Satir basina bool dizi, True = stok <= 0 (stock_col_name kolonu)
+            delta: Satir basina -1/0/+1 dizi, fiyat dususu/ayni/artisi (delta_col_name kolonu)
+            links: {kolon adi: satir basina bool dizi}, tiklanabilir (mavi, alti cizili) hucreler
+        """
+        self.beginResetModel()
+        self._set_data(df if df is not None else pd.DataFrame(), stock_mask, delta, links)
+        self.endResetModel()
+
+    def setColumns(self, headers, columns, stock_mask=None, delta=None, links=None):
+        """
+        Tabloyu DataFrame kurmadan, hazir kolonlarla degistirir.
 
-    def setDataFrame(self, df):
+        Args:
+            headers: Kolon basliklari
+            columns: Baslik sirasiyla kolon basina liste veya dizi (hepsi ayni uzunlukta)
+            stock_mask, delta, links: setDataFrame ile ayni
+        """
         self.beginResetModel()
-        self._data = df.copy() if df is not None else pd.DataFrame()
+        self._set_columns(headers, columns, stock_mask, delta, links)
         self.endResetModel()
 
+    def _set_data(self, df, stock_mask=None, delta=None, links=None):
+        self._set_columns(df.columns, [df[c].tolist() for c in df.columns], stock_mask, delta, links)
+
+    def _set_columns(self, headers, columns, stock_mask=None, delta=None, links=None):
+        self._headers = [str(c) for c in headers]
+        # Kolon bazli listeler/diziler: data() icinde O(1) erisim
+        self._columns = list(columns)
+        self._row_count = len(self._columns[0]) if self._columns else 0
+
+        col_pos = {name: i for i, name in enumerate(self._headers)}
+        self._stock_col = col_pos.get(self.stock_col_name, -1)
+        self._delta_col = col_pos.get(self.delta_col_name, -1)
+        self._stock_mask = np.asarray(stock_mask, dtype=bool) if stock_mask is not None else None
+        self._delta = np.asarray(delta, dtype=np.int8) if delta is not None else None
+        self._links = {col_pos[name]: np.asarray(mask, dtype=bool)
+                       for name, mask in (links or {}).items() if name in col_pos}
+
     def rowCount(self, parent=QModelIndex()):
-        if self._data is None: return 0
-        return self._data.shape[0]
+        if parent.isValid(): return 0
+        return self._row_count
 
     def columnCount(self, parent=QModelIndex()):
-        if self._data is None: return 0
-        return self._data.shape[1]
+        if parent.isValid(): return 0
+        return len(self._columns)
+
+    def cell_text(self, row, col):
+        """Hucrenin ekranda gorunen metni."""
+        if not (0 <= row < self._row_count and 0 <= col < len(self._columns)):
+            return ""
+        val = self._columns[col][row]
+        if val is None or (isinstance(val, float) and val != val): return ""
+        return str(val)
+
+    def _is_stock_alert(self, row, col):
+        return col == self._stock_col and self._stock_mask is not None and self._stock_mask[row]
+
+    def _delta_of(self, row, col):
+        if col == self._delta_col and self._delta is not None:
+            return int(self._delta[row])
+        return 0
+
+    def _is_link(self, row, col):
+        mask = self._links.get(col)
+        return mask is not None and mask[row]
 
     def data(self, index, role=Qt.DisplayRole):
         if not index.isValid():
             return None
-        
+
         row = index.row()
         col = index.column()
-        
-        if role == Qt.DisplayRole:
-            val = self._data.iat[row, col]
-            if pd.isna(val): return ""
-            return str(val)
-
-        elif role == Qt.BackgroundRole:
-            # Stok kontrolu
-            if self.stock_col_name in self._data.columns:
-                try:
-                    # Stok degerine gore satir rengi
-                    # Performans icin iloc yerine onceden hesaplanmis bir maske kullanilabilir
-                    # ama 10k satirda bu da hizli calisir.
-                    s_val = self._data.iloc[row][self.stock_col_name]
-                    if float(s_val) <= 0:
-                        return QColor(255, 235, 238) # Light Red
-                except (ValueError, TypeError):
-                    pass
-        
-        elif role == Qt.ToolTipRole:
-             if self.stock_col_name in self._data.columns:
-                try:
-                    s_val = self._data.iloc[row][self.stock_col_name]
-                    if float(s_val) <= 0:
-                        return "Stok Yok"
-                except:
-                    pass
+
+        if role == DISPLAY_ROLE:
+            return self.cell_text(row, col)
+
+        elif role == BACKGROUND_ROLE:
+            # Stok <= 0 (onceden hesaplanmis maske)
+            if self._is_stock_alert(row, col):
+                return COLOR_ALERT
+            delta = self._delta_of(row, col)
+            if delta:
+                return COLOR_UP if delta > 0 else COLOR_ALERT
+
+        elif role == FOREGROUND_ROLE:
+            if self._is_link(row, col):
+                return COLOR_LINK
+            if self.dark_mode and (self._is_stock_alert(row, col) or self._delta_of(row, col)):
+                return COLOR_DARK_TEXT
+
+        elif role == FONT_ROLE:
+            if self._is_link(row, col):
+                return self._link_font
+            if self._delta_of(row, col):
+                return self._bold_font
+
+        elif role == TOOLTIP_ROLE:
+            if self._is_stock_alert(row, col):
+                return "Stok Yok"
+            if self._is_link(row, col):
+                return self.link_tooltips.get(self._headers[col])
 
         return None
 
-    def headerData(self, section, orientation, role):
-        if role == Qt.DisplayRole:
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return CELL_FLAGS
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == DISPLAY_ROLE:
             if orientation == Qt.Horizontal:
-                return str(self._data.columns[section])
+                return self._headers[section] if 0 <= section < len(self._headers) else None
             if orientation == Qt.Vertical:
-                return str(self._data.index[section] + 1)
+                return str(section + 1)
         return None
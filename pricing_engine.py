@@ -1,11 +1,284 @@
 import math
+import os
 import re
+import threading
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field, fields
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+
+from category_paths import CategoryPathCache
+from sharded_pricing import ShardedPricer
+
+# Output columns of calculate_frame, in calculate_row key order
+FRAME_COLUMNS = [
+    "stock_code", "product_name", "main_category", "full_category_path",
+    "base_price", "profit_added", "raw_discounted_price",
+    "final_discounted_price", "label_price", "discount_rate_used", "error"
+]
+
+# Messages behind PricingEngine.price_arrays' error codes (0 = no error)
+PRICE_ERRORS = (None, "Invalid base price", "Zero or negative base price")
+
+# Arrays returned by PricingEngine.price_arrays and their dtypes
+PRICE_ARRAYS = {**dict.fromkeys(FRAME_COLUMNS[4:-1], np.float64), "error_code": np.int8}
+
+
+@dataclass(frozen=True)
+class ProfitSegment:
+    """A profit segment with its bounds and profit rule already parsed."""
+    min: float
+    max: float
+    mode: object   # "percent", "amount" or None (unusable value -> no profit)
+    value: float
+    extra: object  # float, or None when extra_added cannot be read
+    row: int = 0   # 1-based position in the settings list (for messages)
+
+
+class ProfitSegmentIndex:
+    """
+    Sorted interval index over profit segments.
+
+    Segment bounds are cut into elementary pieces (each boundary value and each open
+    range between two boundaries). Every piece is owned by the first segment in
+    settings order that covers it, so lookups give the same answer as the old linear
+    "first match wins" scan, in O(log n): bisect for scalars, searchsorted for arrays.
+    Gaps and overlaps are collected in `issues` at build time.
+    """
+
+    def __init__(self, segments):
+        self.segments = tuple(segments)
+        usable = [s for s in self.segments if not (math.isnan(s.min) or math.isnan(s.max))]
+
+        self.bounds = sorted({s.min for s in usable} | {s.max for s in usable})
+        n = len(self.bounds)
+        bounds = np.array(self.bounds, dtype=np.float64)
+
+        # point_owner[k]: segment owning the value bounds[k]
+        # gap_owner[k]: segment owning the open range (bounds[k-1], bounds[k]); ends stay -1
+        point_owner = np.full(n, -1, dtype=np.int64)
+        gap_owner = np.full(n + 1, -1, dtype=np.int64)
+        for pos, seg in enumerate(self.segments):
+            if seg not in usable or seg.min > seg.max:
+                continue
+            lo = bisect_left(self.bounds, seg.min)
+            hi = bisect_right(self.bounds, seg.max)
+            points = point_owner[lo:hi]
+            points[points < 0] = pos
+            gaps = gap_owner[lo + 1:hi]
+            gaps[gaps < 0] = pos
+
+        self._bounds_arr = bounds
+        self._point_owner = point_owner
+        self._gap_owner = gap_owner
+        self._point_list = point_owner.tolist()
+        self._gap_list = gap_owner.tolist()
+
+        self.issues = self._validate(usable)
+
+    def lookup(self, price):
+        """Returns the position of the matching segment in `segments`, or -1."""
+        k = bisect_left(self.bounds, price)
+        if k < len(self.bounds) and self.bounds[k] == price:
+            return self._point_list[k]
+        return self._gap_list[k]
+
+    def lookup_array(self, prices):
+        """Vectorized lookup: int array of segment positions (-1 = no segment)."""
+        n = len(self.bounds)
+        k = np.searchsorted(self._bounds_arr, prices, side="left")
+        if n == 0:
+            return np.full(len(prices), -1, dtype=np.int64)
+        k_clip = np.minimum(k, n - 1)
+        exact = (k < n) & (self._bounds_arr[k_clip] == prices)
+        return np.where(exact, self._point_owner[k_clip], self._gap_owner[k])
+
+    def _validate(self, usable):
+        """Lists invalid ranges, overlaps and gaps as user-facing messages."""
+        issues = []
+
+        def fmt(v):
+            return f"{v:g}"
+
+        ranges = []
+        for seg in self.segments:
+            if seg not in usable or seg.min > seg.max:
+                issues.append(f"Segment {seg.row}: geçersiz aralık ({fmt(seg.min)} - {fmt(seg.max)}), hiç uygulanmaz.")
+            else:
+                ranges.append(seg)
+
+        ranges.sort(key=lambda s: (s.min, s.max))
+        reach = None  # segment reaching furthest so far
+        for seg in ranges:
+            if reach is not None:
+                if seg.min <= reach.max:
+                    first, second = sorted([reach, seg], key=lambda s: s.row)
+                    issues.append(
+                        f"Segment {first.row} ({fmt(first.min)} - {fmt(first.max)}) ile "
+                        f"Segment {second.row} ({fmt(second.min)} - {fmt(second.max)}) çakışıyor; "
+                        f"ortak aralıkta Segment {first.row} uygulanır."
+                    )
+                else:
+                    issues.append(
+                        f"{fmt(reach.max)} ile {fmt(seg.min)} arasındaki fiyatlar hiçbir segmente girmiyor "
+                        f"(sadece global minimum kâr uygulanır)."
+                    )
+            if reach is None or seg.max > reach.max:
+                reach = seg
+        return issues
+
+
+@dataclass(frozen=True)
+class PricingPlan:
+    """
+    Immutable snapshot of every setting the pricing pipeline reads, parsed once.
+    Build it with PricingPlan.from_settings(); PricingEngine.get_plan() caches it.
+    """
+    no_category_mode: bool
+    category_col: object
+    base_col: object
+    product_name_col: object
+    stock_code_col: object
+    delimiters: tuple
+    delimiter_regex: re.Pattern
+    discount_map: MappingProxyType  # category -> rate (0.0 - 1.0)
+    default_rate: float
+    segments: tuple                 # ProfitSegment, in settings order
+    segment_index: ProfitSegmentIndex = field(compare=False)
+    global_min_profit: float
+    enable_global_min: bool
+    rounding_mode: str
+    rounding_step: float
+    ends_with_99: bool
+    min_discounted_price: float
+    max_discounted_price: float
+
+    @classmethod
+    def from_settings(cls, sm):
+        mappings = sm.get("mappings")
+
+        config = sm.get("category_extraction")
+        delimiters = tuple(config.get("delimiters", [";", ">", "|", ","]))
+
+        cats = sm.get("categories")
+        mapping = cats.get("mapping", {})
+        default_rate = cats.get("default_discount", 50.0)
+
+        segments = cls.parse_segments(sm.get("profit_segments", []))
+
+        r_config = sm.get("rounding")
+        step = float(r_config.get("step", 1.0))
+        if step <= 0: step = 1.0
+
+        limits = sm.get("limits")
+
+        return cls(
+            no_category_mode=bool(mappings.get("no_category_mode", False)),
+            category_col=mappings.get("category_col"),
+            base_col=mappings.get(sm.get("base_price_source")),
+            product_name_col=mappings.get("product_name_col", ""),
+            stock_code_col=mappings.get("stock_code_col", ""),
+            delimiters=delimiters,
+            delimiter_regex=re.compile('|'.join(map(re.escape, delimiters))),
+            discount_map=MappingProxyType({k: float(v) / 100.0 for k, v in mapping.items()}),
+            default_rate=float(default_rate) / 100.0,
+            segments=segments,
+            segment_index=ProfitSegmentIndex(segments),
+            global_min_profit=float(sm.get("global_min_profit", 0.0)),
+            enable_global_min=bool(sm.get("enable_global_min", False)),
+            rounding_mode=r_config.get("mode", "ceiling"),
+            rounding_step=step,
+            ends_with_99=bool(r_config.get("ends_with_99", False)),
+            min_discounted_price=float(limits.get("min_discounted_price", 0)),
+            max_discounted_price=float(limits.get("max_discounted_price", 999999)),
+        )
+
+    @classmethod
+    def parse_segments(cls, raw_segments):
+        """Parses settings-style segment dicts; entries with unreadable bounds are skipped."""
+        segments = []
+        for row, seg in enumerate(raw_segments, start=1):
+            # Safely cast
+            try:
+                s_min = float(seg["min"])
+                s_max = float(seg["max"])
+            except:
+                continue
+            mode, val, extra = cls._parse_segment_profit(seg)
+            segments.append(ProfitSegment(s_min, s_max, mode, val, extra, row))
+        return tuple(segments)
+
+    @staticmethod
+    def _parse_segment_profit(seg):
+        """
+        Parses a segment's profit rule the way the per-row code always did.
+        Returns (mode, value, extra); see ProfitSegment.
+        """
+        try:
+            val = float(seg["value"])
+            t = str(seg["type"]).upper()
+        except:
+            return None, 0.0, None
+        # Check Type
+        mode = "percent" if ("PERCENT" in t or "YÜZDE" in t) else "amount"
+        # Extra Fixed Amount (if any)
+        try:
+            extra = float(seg.get("extra_added", 0.0))
+        except:
+            extra = None
+        return mode, val, extra
+
+    def __reduce__(self):
+        # MappingProxyType cannot be pickled; send a plain dict (process pool workers)
+        state = {f.name: getattr(self, f.name) for f in fields(self)}
+        state["discount_map"] = dict(self.discount_map)
+        return _plan_from_state, (state,)
+
+    @property
+    def fingerprint(self):
+        """Hashable key of everything that influences prices (for result caches)."""
+        return (
+            self.no_category_mode, self.category_col, self.base_col,
+            self.product_name_col, self.stock_code_col, self.delimiters,
+            tuple(sorted(self.discount_map.items())), self.default_rate,
+            self.segments, self.global_min_profit, self.enable_global_min,
+            self.rounding_mode, self.rounding_step, self.ends_with_99,
+            self.min_discounted_price, self.max_discounted_price,
+        )
+
+
+def _plan_from_state(state):
+    state["discount_map"] = MappingProxyType(state["discount_map"])
+    return PricingPlan(**state)
+
 
 class PricingEngine:
     def __init__(self, settings_manager):
         self.sm = settings_manager
+        self._plan = None
+        self._plan_revision = None
+        self._shards = None # ShardedPricer, started on the first very large calculate_frame
+        self._shards_lock = threading.Lock()
+        # Raw category text -> CategoryInfo, shared by preview, category scan and export
+        self.category_cache = CategoryPathCache()
 
-    def extract_category(self, raw_text):
+    def get_plan(self):
+        """
+        Returns the compiled PricingPlan for the current settings.
+        It is rebuilt only when the settings revision moved, and the previous plan
+        object is kept when the rebuilt one is equivalent.
+        """
+        revision = self.sm.revision
+        if self._plan is None or self._plan_revision != revision:
+            plan = PricingPlan.from_settings(self.sm)
+            if self._plan is None or plan.fingerprint != self._plan.fingerprint:
+                self._plan = plan
+            self._plan_revision = revision
+        return self._plan
+
+    def extract_category(self, raw_text, plan=None):
         """
         Extracts the main category from a raw string based on settings.
         Example: "Fantezi;Fantezi>Jartiyer" -> "Fantezi"
@@ -13,92 +286,73 @@ class PricingEngine:
         if not raw_text or not isinstance(raw_text, str):
             return "Uncategorized"
 
-        config = self.sm.get("category_extraction")
-        delimiters = config.get("delimiters", [";", ">", "|", ","])
-        
-        # Create a regex pattern for split
-        pattern = '|'.join(map(re.escape, delimiters))
-        parts = re.split(pattern, raw_text)
-        
-        if parts:
-            return parts[0].strip()
-        return raw_text.strip()
+        return self.category_info(raw_text, plan).main_category
 
-    def get_discount_rate(self, category):
+    def category_info(self, raw_text, plan=None):
+        """
+        Resolves raw category text through the shared cache.
+
+        Args:
+            raw_text: Raw category cell text
+            plan: optional PricingPlan snapshot (its delimiters are used)
+
+        Returns:
+            CategoryInfo: (main_category, full_path, path_id); full_path is the
+            normalized "A > B > C" form ("" for empty text)
+        """
+        plan = plan or self.get_plan()
+        return self.category_cache.get(str(raw_text), plan.delimiter_regex)
+
+    def get_discount_rate(self, category, plan=None):
         """
         Returns the discount rate (0.0 - 1.0) for a given category.
         If mapped percentage is 50, returns 0.50.
         """
-        cats = self.sm.get("categories")
-        mapping = cats.get("mapping", {})
-        default_rate = cats.get("default_discount", 50.0)
-
+        plan = plan or self.get_plan()
         # Check exact match
-        if category in mapping:
-            return float(mapping[category]) / 100.0
-        
-        return float(default_rate) / 100.0
+        return plan.discount_map.get(category, plan.default_rate)
 
-    def calculate_profit(self, base_price):
+    def calculate_profit(self, base_price, plan=None):
         """
         Calculates profit amount based on segments and global min profit.
         """
-        segments = self.sm.get("profit_segments", [])
-        global_min = float(self.sm.get("global_min_profit", 0.0))
-        
+        plan = plan or self.get_plan()
+
         applied_profit = 0.0
-        
-        # Find matching segment
+
+        # Find matching segment (first one in settings order)
         matched_segment = None
-        for seg in segments:
-            # Safely cast
-            try:
-                s_min = float(seg["min"])
-                s_max = float(seg["max"])
-            except:
-                continue
-                
-            if s_min <= base_price <= s_max:
-                matched_segment = seg
-                break
-        
-        if matched_segment:
-            try:
-                val = float(matched_segment["value"])
-                t = str(matched_segment["type"]).upper()
-                
-                # Check Type
-                if "PERCENT" in t or "YÜZDE" in t:
-                    # Percentage: Base * (Val/100)
-                    applied_profit = base_price * (val / 100.0)
-                else:
-                    # Assume Amount (TL)
-                    applied_profit = val
-                
-                # Add Extra Fixed Amount (if any)
-                extra = float(matched_segment.get("extra_added", 0.0))
-                applied_profit += extra
-            except:
-                pass
-        
+        pos = plan.segment_index.lookup(base_price)
+        if pos >= 0:
+            matched_segment = plan.segments[pos]
+
+        if matched_segment and matched_segment.mode is not None:
+            if matched_segment.mode == "percent":
+                # Percentage: Base * (Val/100)
+                applied_profit = base_price * (matched_segment.value / 100.0)
+            else:
+                # Assume Amount (TL)
+                applied_profit = matched_segment.value
+
+            # Add Extra Fixed Amount (if any)
+            if matched_segment.extra is not None:
+                applied_profit += matched_segment.extra
+
         # Apply Global Min Profit
         # Logic: Profit cannot be less than Global Min Profit (IF ENABLED)
-        if self.sm.get("enable_global_min", False):
-            if applied_profit < global_min:
-                applied_profit = global_min
-            
+        if plan.enable_global_min:
+            if applied_profit < plan.global_min_profit:
+                applied_profit = plan.global_min_profit
+
         return applied_profit
 
-    def apply_rounding(self, price):
+    def apply_rounding(self, price, plan=None):
         """
         Applies rounding rules and .99 logic.
         """
-        r_config = self.sm.get("rounding")
-        mode = r_config.get("mode", "ceiling")
-        step = float(r_config.get("step", 1.0))
-        ends_99 = r_config.get("ends_with_99", False)
-
-        if step <= 0: step = 1
+        plan = plan or self.get_plan()
+        mode = plan.rounding_mode
+        step = plan.rounding_step
 
         rounded_price = price
 
@@ -116,62 +370,57 @@ class PricingEngine:
         # Common logic: If we rounded to integer (e.g. 150), make it 149.99 or 150.99?
         # Requirement: "xx.99"
         # Let's assume we simply enforce .99 on the integer part if step >= 1
-        
-        if ends_99:
+
+        if plan.ends_with_99:
             # If we have 150, and we want it to end in .99
             # Usually people want 149.99 (psychological under) or 159.99
             # The prompt says: "yuvarlandıktan sonra -0.01 veya +0.99 mantığıyla"
-            
-            # Simple approach: floor to int, then add 0.99? 
+
+            # Simple approach: floor to int, then add 0.99?
             # Or if we have 150 -> 149.99
-            
-            # Let's try: take the rounded price. 
+
+            # Let's try: take the rounded price.
             # If it's an integer like 150.0:
             # Option A: 149.99 (Loss of 0.01) - safer for customers?
             # Option B: 150.99 (Gain of 0.99)
-            
+
             # Prompt says: "yuvarlandıktan sonra -0.01" implied.
             # Example: 153 -> round(10) -> 160 -> -0.01 -> 159.99
             # Example: 153 -> round(10) -> 150 -> -0.01 -> 149.99
-            
-            # However this depends on the Step. 
+
+            # However this depends on the Step.
             # If step is 10, valid values are 10, 20, 30.
             # 20 -> 19.99
-            
+
             rounded_price = rounded_price - 0.01
 
         return rounded_price
 
-    def calculate_row(self, row_data):
+    def calculate_row(self, row_data, plan=None):
         """
         Main pipeline for a single row.
         row_data: dict with keys matching settings mapping (e.g. 'KATEGORILER': '...', 'ALIS': 100)
+        plan: optional PricingPlan snapshot (defaults to get_plan())
         Returns: dict with new values
         """
-        mappings = self.sm.get("mappings")
-        
+        plan = plan or self.get_plan()
+
         # 1. Extract Category
-        no_cat_mode = mappings.get("no_category_mode", False)
-        
-        if no_cat_mode:
+        if plan.no_category_mode:
             raw_cat = "Kategorisiz"
             main_cat = "Kategorisiz"
         else:
-            cat_col = mappings.get("category_col")
-            raw_cat = str(row_data.get(cat_col, ""))
-            main_cat = self.extract_category(raw_cat)
-        
+            raw_cat = str(row_data.get(plan.category_col, ""))
+            main_cat = self.extract_category(raw_cat, plan)
+
         # 2. Get Discount Rate
-        # Discount rate is what we show to customer. 
+        # Discount rate is what we show to customer.
         # Label Price = Discounted Price / (1 - rate)
-        discount_rate = self.get_discount_rate(main_cat)
-        
+        discount_rate = self.get_discount_rate(main_cat, plan)
+
         # 3. Base Price
-        base_source_key = self.sm.get("base_price_source") # e.g. "buy_price_col"
-        base_col_name = mappings.get(base_source_key)
-        
         try:
-            base_price = float(row_data.get(base_col_name, 0))
+            base_price = float(row_data.get(plan.base_col, 0))
         except (ValueError, TypeError):
             return {"error": "Invalid base price", "main_category": main_cat}
 
@@ -179,44 +428,47 @@ class PricingEngine:
              return {"error": "Zero or negative base price", "main_category": main_cat}
 
         # 4. Calculate Profit
-        profit = self.calculate_profit(base_price)
-        
+        profit = self.calculate_profit(base_price, plan)
+
         # 5. Raw Discounted Price
         raw_discounted_price = base_price + profit
-        
+
         # 6. Limits (Min/Max Discounted)
-        limits = self.sm.get("limits")
-        min_p = float(limits.get("min_discounted_price", 0))
-        max_p = float(limits.get("max_discounted_price", 999999))
-        
+        min_p = plan.min_discounted_price
+        max_p = plan.max_discounted_price
+
         if raw_discounted_price < min_p: raw_discounted_price = min_p
         if raw_discounted_price > max_p: raw_discounted_price = max_p
-        
+
+        # NaN (e.g. a "nan" cell) or an unbounded price cannot be rounded
+        if not math.isfinite(raw_discounted_price):
+            return {"error": "Invalid base price", "main_category": main_cat}
+
         # Inflation check (Optional in prompt, skipped for simplicity or add later)
-        
+
         # 7. Rounding & .99
-        final_discounted_price = self.apply_rounding(raw_discounted_price)
-        
+        final_discounted_price = self.apply_rounding(raw_discounted_price, plan)
+
         # Re-check max limit after rounding (e.g. 1000 -> 999.99 is OK, but 1000.99 is not if max is 1000)
         if final_discounted_price > max_p:
-            # If rounding pushed it over, we should probably clamp it back. 
+            # If rounding pushed it over, we should probably clamp it back.
             # But if .99 is strict, clamping to 1000 loses .99.
             # Prompt says: "Maksimum sınırla çakışma durumunda (örn. 1000 tavan) doğru davran: 999.99"
-            final_discounted_price = math.floor(max_p) - 0.01 if self.sm.get("rounding").get("ends_with_99") else max_p
+            final_discounted_price = math.floor(max_p) - 0.01 if plan.ends_with_99 else max_p
 
         # 8. Calculate Label (Sell) Price
         # label = discounted / (1 - rate)
         # Avoid div by zero
         if discount_rate >= 1.0: discount_rate = 0.99 # Safety
-        
+
         label_price = final_discounted_price / (1.0 - discount_rate)
-        
+
         # Optional: Round label price too? Prompt says optional. Let's doing simple rounding to 2 decimals.
         label_price = round(label_price, 2)
-        
+
         # Pass through identity info
-        p_name = row_data.get(mappings.get("product_name_col", ""), "")
-        s_code = row_data.get(mappings.get("stock_code_col", ""), "")
+        p_name = row_data.get(plan.product_name_col, "")
+        s_code = row_data.get(plan.stock_code_col, "")
 
         return {
             "stock_code": s_code,
@@ -232,3 +484,241 @@ class PricingEngine:
             "label_price": label_price,
             "discount_rate_used": discount_rate * 100
         }
+
+    # ===== Batch (vectorized) pricing =====
+
+    def calculate_frame(self, data, plan=None):
+        """
+        Vectorized counterpart of calculate_row for a whole column set.
+
+        Args:
+            data: pandas DataFrame, dict of column name -> sequence, list of row dicts
+                  (same keys as calculate_row's row_data) or a column store with
+                  column(name, default) (dataset_cache.ColumnarRecords). Use object
+                  dtype to keep raw cell values exact.
+            plan: optional PricingPlan snapshot (defaults to get_plan())
+
+        Returns:
+            DataFrame with one row per input row and FRAME_COLUMNS as columns.
+            Failed rows carry their message in "error" (None otherwise) and NaN prices.
+            Values are identical to calculate_row (see frame_to_results).
+        """
+        plan = plan or self.get_plan()
+        n = self._frame_length(data)
+
+        # 1. Categories (extracted once per distinct raw string)
+        if plan.no_category_mode:
+            raw_cats = np.full(n, "Kategorisiz", dtype=object)
+            main_cats = raw_cats.copy()
+        else:
+            raw_cats = np.array([str(v) for v in self._frame_column(data, plan.category_col, "", n)], dtype=object)
+            codes, uniques = pd.factorize(raw_cats)
+            main_cats = np.array([self.extract_category(u, plan) for u in uniques], dtype=object)[codes] if n else raw_cats
+
+        # 2. Discount rates (once per distinct main category)
+        codes, uniques = pd.factorize(main_cats)
+        rates = np.array([self.get_discount_rate(u, plan) for u in uniques], dtype=np.float64)[codes] if n else np.zeros(0)
+        rates[rates >= 1.0] = 0.99  # Safety (same as calculate_row)
+
+        # 3. Base price
+        base = self._to_float_array(self._frame_column(data, plan.base_col, 0, n))
+
+        # 4-8. Prices (row by row independent; very large sets go to the process pool)
+        shards = self._shard_pool(n)
+        if shards is not None:
+            prices = shards.map(PricingEngine.price_arrays, (base, rates), PRICE_ARRAYS, (plan,))
+        else:
+            prices = self.price_arrays(base, rates, plan)
+
+        def obj(values):
+            return pd.Series(np.asarray(values, dtype=object), dtype=object)
+
+        return pd.DataFrame({
+            "stock_code": obj(self._frame_column(data, plan.stock_code_col, "", n)),
+            "product_name": obj(self._frame_column(data, plan.product_name_col, "", n)),
+            "main_category": obj(main_cats),
+            "full_category_path": obj(raw_cats),
+            **{name: prices[name] for name in FRAME_COLUMNS[4:-1]},
+            "error": obj(np.array(PRICE_ERRORS, dtype=object)[prices["error_code"]]),
+        }, columns=FRAME_COLUMNS)
+
+    @staticmethod
+    def price_arrays(base, rates, plan):
+        """
+        Numeric core of calculate_frame: prices from base prices and discount rates.
+
+        No value depends on another row, so any row range can be priced on its own
+        (sharded_pricing.ShardedPricer relies on that).
+
+        Args:
+            base: float64 base prices (NaN = unreadable)
+            rates: float64 discount rates (0.0 - 0.99)
+            plan: PricingPlan
+
+        Returns:
+            dict with the float64 price columns of FRAME_COLUMNS (NaN for failed rows)
+            and "error_code" (int8 index into PRICE_ERRORS, 0 = no error)
+        """
+        n = len(base)
+        error_code = np.zeros(n, dtype=np.int8)
+        invalid = np.isnan(base)
+        non_positive = ~invalid & (base <= 0)
+        error_code[invalid] = 1
+        error_code[non_positive] = 2
+        ok = ~(invalid | non_positive)
+
+        b = base[ok]
+
+        # 4-7. Profit, limits, rounding
+        profit = PricingEngine._calculate_profit_array(b, plan)
+        raw_discounted = b + profit
+
+        min_p = plan.min_discounted_price
+        max_p = plan.max_discounted_price
+        raw_discounted = np.where(raw_discounted < min_p, min_p, raw_discounted)
+        raw_discounted = np.where(raw_discounted > max_p, max_p, raw_discounted)
+
+        # NaN or unbounded prices cannot be rounded (same check as calculate_row)
+        finite = np.isfinite(raw_discounted)
+        if not finite.all():
+            dropped = np.flatnonzero(ok)[~finite]
+            error_code[dropped] = 1
+            ok[dropped] = False
+            b, profit, raw_discounted = b[finite], profit[finite], raw_discounted[finite]
+
+        final = PricingEngine._apply_rounding_array(raw_discounted, plan)
+        if plan.ends_with_99:
+            final = np.where(final > max_p, math.floor(max_p) - 0.01, final)
+        else:
+            final = np.where(final > max_p, max_p, final)
+
+        # 8. Label price: round(x, 2) is not reproducible with np.round, so round the
+        # (few) distinct values with Python's round and scatter them back
+        rates_ok = rates[ok]
+        label_raw = final / (1.0 - rates_ok)
+        uniq, inverse = np.unique(label_raw, return_inverse=True)
+        label = np.array([round(v, 2) for v in uniq.tolist()], dtype=np.float64)[inverse.reshape(-1)]
+
+        def scatter(values):
+            out = np.full(n, np.nan)
+            out[ok] = values
+            return out
+
+        return {
+            "base_price": scatter(b),
+            "profit_added": scatter(profit),
+            "raw_discounted_price": scatter(raw_discounted),
+            "final_discounted_price": scatter(final),
+            "label_price": scatter(label),
+            "discount_rate_used": scatter(rates_ok * 100),
+            "error_code": error_code,
+        }
+
+    def frame_to_results(self, priced):
+        """
+        Converts a calculate_frame result into calculate_row-style dicts (same keys and values).
+        """
+        cols = {c: priced[c].tolist() for c in FRAME_COLUMNS}
+        results = []
+        for i in range(len(priced)):
+            err = cols["error"][i]
+            if err is not None:
+                results.append({"error": err, "main_category": cols["main_category"][i]})
+                continue
+            results.append({c: cols[c][i] for c in FRAME_COLUMNS[:-1]})
+        return results
+
+    def input_columns(self, plan=None):
+        """Returns the source column names calculate_row / calculate_frame read."""
+        plan = plan or self.get_plan()
+        cols = [plan.category_col, plan.base_col, plan.product_name_col, plan.stock_code_col]
+        return [c for c in dict.fromkeys(cols) if c]
+
+    @staticmethod
+    def _calculate_profit_array(base, plan):
+        """Vectorized calculate_profit (first matching segment wins)."""
+        segments = plan.segments
+        owner = plan.segment_index.lookup_array(base)
+
+        # Per-segment profit rule as arrays; the extra slot (-1) means "no segment"
+        percent = np.array([s.mode == "percent" for s in segments] + [False])
+        usable = np.array([s.mode is not None for s in segments] + [False])
+        factor = np.array([s.value / 100.0 for s in segments] + [0.0])
+        value = np.array([s.value for s in segments] + [0.0])
+        has_extra = np.array([s.extra is not None for s in segments] + [False])
+        extra = np.array([s.extra if s.extra is not None else 0.0 for s in segments] + [0.0])
+
+        with np.errstate(invalid="ignore"):  # inf/NaN bases are masked out below
+            profit = np.where(percent[owner], base * factor[owner], value[owner])
+            profit = np.where(has_extra[owner], profit + extra[owner], profit)
+        profit = np.where(usable[owner], profit, 0.0)
+
+        if plan.enable_global_min:
+            profit = np.where(profit < plan.global_min_profit, plan.global_min_profit, profit)
+        return profit
+
+    @staticmethod
+    def _apply_rounding_array(prices, plan):
+        """Vectorized apply_rounding."""
+        step = plan.rounding_step
+
+        if plan.rounding_mode == "ceiling":
+            rounded = np.ceil(prices / step) * step
+        elif plan.rounding_mode == "floor":
+            rounded = np.floor(prices / step) * step
+        else: # round (half to even, like Python's round)
+            rounded = np.round(prices / step) * step
+
+        if plan.ends_with_99:
+            rounded = rounded - 0.01
+        return rounded
+
+    def _shard_pool(self, n):
+        """Returns the ShardedPricer for pricing n rows, or None to price them in this process."""
+        config = self.sm.get("sharded_pricing", {})
+        workers = min(int(config.get("workers", 0)), os.cpu_count() or 1)
+        if workers < 2 or n < int(config.get("min_rows", 200000)):
+            return None
+        with self._shards_lock:
+            if self._shards is None or self._shards.workers != workers:
+                if self._shards is not None:
+                    self._shards.shutdown()
+                self._shards = ShardedPricer(workers)
+            return self._shards
+
+    @staticmethod
+    def _frame_length(data):
+        if not isinstance(data, dict):
+            return len(data)
+        for values in data.values():
+            return len(values)
+        return 0
+
+    @staticmethod
+    def _frame_column(data, name, default, n):
+        """Returns the raw values of a column as a list, mimicking row_data.get(name, default)."""
+        if isinstance(data, list):
+            return [row.get(name, default) for row in data]
+        if hasattr(data, "column") and not isinstance(data, pd.DataFrame):
+            return data.column(name, default)
+        if name in data:
+            values = data[name]
+            return values.tolist() if hasattr(values, "tolist") else list(values)
+        return [default] * n
+
+    @staticmethod
+    def _to_float_array(values):
+        """float() over raw cell values; anything float() rejects becomes NaN."""
+        arr = np.asarray(values) if values else np.zeros(0)
+        if arr.dtype.kind in "biuf":
+            return arr.astype(np.float64)
+
+        codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+        converted = np.empty(len(uniques) + 1)
+        for i, v in enumerate(uniques):
+            try:
+                converted[i] = float(v)
+            except (ValueError, TypeError, OverflowError):
+                converted[i] = np.nan
+        converted[-1] = np.nan  # code -1 (None / NaN)
+        return converted[codes]
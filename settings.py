@@ -62,7 +62,27 @@ DEFAULT_SETTINGS = {
     "output": {
         "max_rows_per_file": 5000,
         "output_dir": "",
-        "filename_template": "output_part_{n}.xlsx"
+        "filename_template": "output_part_{n}.xlsx",
+        "streaming_write": True, # write-only workbooks, flat memory per part
+        "writer_engine": "openpyxl", # "openpyxl", "native" (xlsx_writer.XlsxStreamWriter)
+        "pipeline_depth": 4, # row blocks buffered between export stages (okuma -> fiyatlama -> yazma)
+        "parallel_parts": 0 # worker processes writing split parts concurrently (0 = parts written one by one)
+    },
+    "dataset_cache": {
+        "enabled": True,
+        "directory": "cache", # parsed workbooks (columnar_cache), reused across runs; relative to the settings file
+        "max_size_mb": 2048, # least recently used files are dropped above this
+        "block_rows": 5000, # data rows per block of the in-memory column store (dataset_cache.ColumnStore)
+        "memory_budget_mb": 256 # parsed rows kept in memory across open files; older blocks are read back from disk (0 = no cap)
+    },
+    "export_log": {
+        "gui_level": "INFO", # lowest level shown in the log tab during exports ("DEBUG", "INFO", "WARNING", "ERROR"); the file gets all
+        "flush_seconds": 1.0, # longest time a record waits in memory before it is written to logs/*.jsonl
+        "gui_seconds": 0.5 # shortest time between two log chunks sent to the log tab
+    },
+    "sharded_pricing": {
+        "workers": 0, # processes pricing very large sets in parallel (sharded_pricing; 0/1 = off, capped at the CPU count)
+        "min_rows": 200000 # rows a single pricing call needs before it is sharded
     },
     "category_extraction": {
         "mode": "first_delimiter", # "first_delimiter", "regex"
@@ -75,6 +95,8 @@ class SettingsManager:
     def __init__(self, filepath="settings.json"):
         self.filepath = filepath
         self.settings = self.load_settings()
+        # Bumped on every change so consumers (e.g. the compiled pricing plan) know when to rebuild
+        self.revision = 0
 
     def load_settings(self):
         if not os.path.exists(self.filepath):
@@ -97,6 +119,8 @@ class SettingsManager:
             return DEFAULT_SETTINGS.copy()
 
     def save_settings(self):
+        # Callers edit nested dicts in place before saving, so count a save as a change
+        self.revision += 1
         try:
             with open(self.filepath, "w", encoding="utf-8") as f:
                 json.dump(self.settings, f, indent=4, ensure_ascii=False)
@@ -108,7 +132,9 @@ class SettingsManager:
 
     def set(self, key, value):
         self.settings[key] = value
+        self.revision += 1
 
     def update_nested(self, parent, key, value):
         if parent in self.settings:
             self.settings[parent][key] = value
+            self.revision += 1
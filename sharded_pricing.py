@@ -0,0 +1,152 @@
+"""
+Sharded Pricing Module
+Prices very large column sets on several cores.
+A row-independent, vectorized pricing function (PricingEngine.price_arrays) is
+run over row ranges in a process pool. Input and output columns live in shared
+memory blocks that the workers map directly, so no row data is pickled: only the
+block names, the shard bounds and the small pricing plan travel to the workers.
+"""
+
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+# Smallest row range worth sending to a worker (a round trip costs a few milliseconds)
+MIN_SHARD_ROWS = 20000
+
+
+def _layout(dtypes, n):
+    """Returns ([(dtype str, byte offset), ...], block size) for n rows of each dtype."""
+    layout = []
+    size = 0
+    for dtype in dtypes:
+        dtype = np.dtype(dtype)
+        size = -(-size // 8) * 8 # 8-byte aligned columns
+        layout.append((dtype.str, size))
+        size += dtype.itemsize * n
+    return layout, max(size, 1)
+
+
+def _views(buf, layout, n):
+    return [np.ndarray(n, dtype=dtype, buffer=buf, offset=offset) for dtype, offset in layout]
+
+
+def _fill(buf, layout, n, arrays):
+    for view, values in zip(_views(buf, layout, n), arrays):
+        view[:] = values
+
+
+def _copy_out(buf, layout, n):
+    return [view.copy() for view in _views(buf, layout, n)]
+
+
+def _close(shm):
+    try:
+        shm.close()
+    except BufferError:
+        # A view is still referenced (by a traceback); the mapping goes with it
+        pass
+
+
+def _run_shard(func, in_buf, in_layout, out_buf, out_layout, names, n, start, stop, args):
+    columns = [view[start:stop] for view in _views(in_buf, in_layout, n)]
+    result = func(*columns, *args)
+    for view, name in zip(_views(out_buf, out_layout, n), names):
+        view[start:stop] = result[name]
+
+
+def _price_shard(func, inputs, outputs, n, start, stop, args):
+    """Worker side: prices rows [start, stop) from the shared input block into the output block."""
+    in_shm = shared_memory.SharedMemory(name=inputs[0])
+    out_shm = shared_memory.SharedMemory(name=outputs[0])
+    try:
+        _run_shard(func, in_shm.buf, inputs[1], out_shm.buf, outputs[1], outputs[2], n, start, stop, args)
+    finally:
+        _close(in_shm)
+        _close(out_shm)
+
+
+class ShardedPricer:
+    """
+    Process pool pricing the row ranges of one column set in parallel.
+
+    map() copies the input arrays once into a shared memory block, cuts the rows
+    into one range per worker and has each worker write its results straight into
+    a shared output block; the arrays come back merged in row order, equal to one
+    func call over all rows. func must price every row independently of the others
+    and be picklable by reference (a module-level function or a staticmethod).
+
+    The pool is started on first use and kept for later calls. Workers use the
+    "spawn" start method: the app runs Qt and loader threads, which fork does not
+    tolerate, and spawn is what Windows uses anyway.
+    """
+
+    def __init__(self, workers):
+        """
+        Args:
+            workers: Worker processes (and the most shards one call is cut into)
+        """
+        self.workers = workers
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def map(self, func, inputs, outputs, args=()):
+        """
+        Runs func over row ranges of inputs in the pool.
+
+        Args:
+            func: func(*input slices, *args) -> {name: array} for one row range
+            inputs: Sequence of equal-length 1-D numpy arrays
+            outputs: {name: dtype} of the arrays func returns
+            args: Extra picklable arguments passed to every call
+
+        Returns:
+            dict: {name: array} over all rows, in row order
+        """
+        n = len(inputs[0])
+        shards = min(self.workers, n // MIN_SHARD_ROWS)
+        if shards < 2:
+            return func(*inputs, *args)
+
+        in_layout, in_size = _layout([values.dtype for values in inputs], n)
+        out_layout, out_size = _layout(outputs.values(), n)
+        in_shm = shared_memory.SharedMemory(create=True, size=in_size)
+        out_shm = shared_memory.SharedMemory(create=True, size=out_size)
+        try:
+            _fill(in_shm.buf, in_layout, n, inputs)
+            bounds = np.linspace(0, n, shards + 1).astype(np.int64).tolist()
+            pool = self._get_pool()
+            futures = [pool.submit(_price_shard, func, (in_shm.name, in_layout),
+                                   (out_shm.name, out_layout, list(outputs)), n, start, stop, args)
+                       for start, stop in zip(bounds, bounds[1:])]
+            # Every shard has to be done with the blocks before they are released
+            wait(futures)
+            try:
+                for future in futures:
+                    future.result()
+            except BrokenProcessPool:
+                self.shutdown() # a worker died; the next call starts a fresh pool
+                raise
+            return dict(zip(outputs, _copy_out(out_shm.buf, out_layout, n)))
+        finally:
+            for shm in (in_shm, out_shm):
+                _close(shm)
+                shm.unlink()
+
+    def shutdown(self):
+        """Stops the worker processes (a later map() starts them again)."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
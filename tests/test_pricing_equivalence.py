@@ -0,0 +1,130 @@
+"""
+PricingEngine.calculate_frame must give, row for row, what calculate_row gives:
+same keys, same values (NaN where calculate_row has NaN), same error messages.
+"""
+
+import copy
+import itertools
+import math
+import random
+
+import pytest
+
+from dataset_cache import ColumnarRecords, DatasetCache
+from pricing_engine import PricingEngine
+from settings import DEFAULT_SETTINGS, SettingsManager
+
+
+EDGE_PRICES = [None, 0, 0.0, -0.0, -5, 1, 0.004, 0.005, 2.675, 149.995, 499, 499.5, 500, 999.99, 1000,
+               10 ** 7, float("nan"), float("inf"), float("-inf"), "nan", "inf", "12.5", " 7 ", "1_000",
+               "abc", "", True, False]
+
+CATEGORIES = [None, "", "A", "A > x", "B;C", " B | q", 1, 1.0, "Fantezi;Fantezi>Jartiyer", "Uncategorized"]
+
+# Segment sets: contiguous, with gaps between them, overlapping edges, none at all
+SEGMENT_SETS = {
+    "contiguous": [{"min": 0, "max": 499, "type": "TL", "value": 200},
+                   {"min": 500, "max": 999, "type": "PERCENT", "value": 33.3, "extra_added": 5.5},
+                   {"min": 1000, "max": 10 ** 9, "type": "YÜZDE (%)", "value": 10}],
+    "gaps": [{"min": 0, "max": 99.5, "type": "TL", "value": 10},
+             {"min": 150, "max": 300, "type": "PERCENT", "value": 20},
+             {"min": 1000, "max": 1000, "type": "TL", "value": 1}],
+    "invalid": [{"min": 0, "max": 500, "type": "TL", "value": "bad"}, {"min": "x", "max": 5}],
+    "none": [],
+}
+
+ROUNDINGS = [
+    {"mode": "ceiling", "step": 10, "ends_with_99": True},
+    {"mode": "floor", "step": 0.5, "ends_with_99": False},
+    {"mode": "round", "step": 5.0, "ends_with_99": True},
+    {"mode": "round", "step": 1, "ends_with_99": False},
+    {"mode": "ceiling", "step": 0, "ends_with_99": False},
+    {"mode": "floor", "step": -5, "ends_with_99": True},
+]
+
+
+def make_engine(segments, rounding, base_source="buy_price_col", enable_global_min=True, no_category_mode=False):
+    sm = SettingsManager("__no_such_settings__.json") # defaults, never saved
+    sm.settings = copy.deepcopy(DEFAULT_SETTINGS)
+    sm.set("mappings", {"category_col": "CAT", "buy_price_col": "BUY", "sell_price_col": "SELL",
+                        "product_name_col": "NAME", "stock_code_col": "CODE", "no_category_mode": no_category_mode})
+    sm.set("base_price_source", base_source)
+    sm.set("profit_segments", copy.deepcopy(segments))
+    sm.set("global_min_profit", 12.34)
+    sm.set("enable_global_min", enable_global_min)
+    sm.set("rounding", dict(rounding))
+    sm.set("limits", {"min_discounted_price": 75.0, "max_discounted_price": 1234.5})
+    sm.set("categories", {"default_discount": 33.3, "mapping": {"A": 20, "B": 100, "None": 10, "Uncategorized": 5}})
+    return PricingEngine(sm)
+
+
+def edge_rows():
+    rows = []
+    for i, (buy, cat) in enumerate(itertools.product(EDGE_PRICES, CATEGORIES)):
+        row = {"CAT": cat, "BUY": buy, "SELL": EDGE_PRICES[(i * 7) % len(EDGE_PRICES)], "NAME": f"n{i}", "CODE": i}
+        if i % 31 == 0:
+            del row["CAT"]
+        if i % 37 == 0:
+            del row["BUY"]
+        rows.append(row)
+    return rows
+
+
+def same_value(x, y):
+    if isinstance(x, float) and isinstance(y, float):
+        if math.isnan(x) or math.isnan(y):
+            return math.isnan(x) and math.isnan(y)
+        return x == y and math.copysign(1, x) == math.copysign(1, y)
+    return type(x) is type(y) and x == y
+
+
+def assert_same_results(expected, got):
+    assert len(expected) == len(got)
+    for i, (e, g) in enumerate(zip(expected, got)):
+        assert e.keys() == g.keys(), (i, e, g)
+        for key in e:
+            assert same_value(e[key], g[key]), (i, key, e[key], g[key])
+
+
+@pytest.mark.parametrize("segments", sorted(SEGMENT_SETS))
+@pytest.mark.parametrize("rounding", ROUNDINGS, ids=lambda r: f"{r['mode']}-{r['step']}-{r['ends_with_99']}")
+def test_frame_matches_row_on_edge_rows(segments, rounding):
+    engine = make_engine(SEGMENT_SETS[segments], rounding)
+    rows = edge_rows()
+    expected = [engine.calculate_row(r) for r in rows]
+    assert_same_results(expected, engine.frame_to_results(engine.calculate_frame(rows)))
+
+
+@pytest.mark.parametrize("base_source", ["buy_price_col", "sell_price_col", "market_price_col"])
+@pytest.mark.parametrize("no_category_mode", [False, True])
+def test_frame_matches_row_across_modes(base_source, no_category_mode):
+    engine = make_engine(SEGMENT_SETS["gaps"], ROUNDINGS[0], base_source, enable_global_min=False,
+                         no_category_mode=no_category_mode)
+    rows = edge_rows()
+    expected = [engine.calculate_row(r) for r in rows]
+    assert_same_results(expected, engine.frame_to_results(engine.calculate_frame(rows)))
+
+
+def test_frame_matches_row_on_random_rows():
+    rnd = random.Random(1234)
+    for _ in range(20):
+        engine = make_engine(SEGMENT_SETS[rnd.choice(sorted(SEGMENT_SETS))], rnd.choice(ROUNDINGS),
+                             rnd.choice(["buy_price_col", "sell_price_col"]), rnd.random() < 0.5)
+        rows = [{"CAT": rnd.choice(CATEGORIES), "BUY": rnd.choice([rnd.uniform(0, 3000), rnd.randint(0, 3000)] + EDGE_PRICES),
+                 "SELL": rnd.uniform(-10, 3000), "NAME": "n", "CODE": j} for j in range(300)]
+        expected = [engine.calculate_row(r) for r in rows]
+        assert_same_results(expected, engine.frame_to_results(engine.calculate_frame(rows)))
+
+
+def test_frame_over_column_store_matches_row(tmp_path):
+    # The preview prices ColumnarRecords straight from the column store
+    path = tmp_path / "source.xlsx"
+    path.write_bytes(b"") # only its fingerprint is used
+    rows = edge_rows()
+    header = ("CAT", "BUY", "SELL", "NAME", "CODE")
+    tuples = [header] + [tuple(r.get(h) for h in header) for r in rows]
+    dataset = DatasetCache(block_rows=64).get(str(path), lambda columns: tuples)
+    records = ColumnarRecords(dataset)
+    engine = make_engine(SEGMENT_SETS["contiguous"], ROUNDINGS[2])
+    expected = [engine.calculate_row(dict(r)) for r in records]
+    assert_same_results(expected, engine.frame_to_results(engine.calculate_frame(records)))
@@ -0,0 +1,110 @@
+"""
+The native reader (xlsx_reader.XlsxRowReader) must give the rows openpyxl's
+read-only worksheets give: same values, same types, same row shapes.
+"""
+
+import datetime
+import math
+
+import openpyxl
+import pytest
+
+import excel_io
+from excel_io import ExcelHandler
+
+
+def _same(a, b):
+    # Rows equal value by value and type by type (NaN equals NaN)
+    if type(a) is not type(b) or len(a) != len(b):
+        return False
+    for x, y in zip(a, b):
+        if type(x) is not type(y):
+            return False
+        if isinstance(x, float) and math.isnan(x) and math.isnan(y):
+            continue
+        if x != y:
+            return False
+    return True
+
+
+def _rows(path, backend, columns=None):
+    return list(ExcelHandler(backend).iter_source_rows(str(path), columns))
+
+
+@pytest.fixture
+def edge_workbook(tmp_path):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(["KOD", "URUN ADI", "ALIS", "ADET", "TARIH", None, "KOD", "NOT"])
+    ws.append(["A-1", "Gömlek", 10, 5, datetime.datetime(2024, 1, 2, 3, 4, 5), None, "dup", "  boşluk  "])
+    ws.append(["A-2", "Çanta", 12.5, 0, datetime.date(2024, 2, 29), True, "x", ""])
+    ws.append([None, None, -0.0, 10 ** 15, datetime.time(13, 45), False, None, "=1+1"])
+    ws.append(["A-3", "ş" * 300, 1e-12, -7, datetime.datetime(1900, 3, 1), 2 ** 40, "y"])
+    ws.append([])
+    ws.append(["A-4"])
+    ws.append(["A-5", "Etek", 99.99, 3, None, None, None, None, None, "fazla"])
+    ws.cell(row=12, column=3, value=0.1)
+    ws.cell(row=14, column=1, value="son")
+    ws.cell(row=14, column=2).number_format = "0.00"
+    date_cell = ws.cell(row=15, column=5, value=45000)
+    date_cell.number_format = "dd.mm.yyyy"
+    path = tmp_path / "edge.xlsx"
+    wb.save(path)
+    return path
+
+
+@pytest.fixture
+def large_workbook(tmp_path):
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(["KOD", "ADI", "KATEGORI", "FIYAT", "ADET"])
+    for i in range(3000):
+        ws.append([f"S{i:05d}", f"Ürün {i % 97}", ["Alt Giyim", "Fantezi", None][i % 3],
+                   round(i * 1.37, 2) if i % 11 else None, i % 7 - 2])
+    path = tmp_path / "large.xlsx"
+    wb.save(path)
+    return path
+
+
+@pytest.mark.parametrize("workbook", ["edge_workbook", "large_workbook"])
+def test_native_rows_match_openpyxl(workbook, request):
+    path = request.getfixturevalue(workbook)
+    native = _rows(path, "native")
+    reference = _rows(path, "openpyxl")
+    assert len(native) == len(reference)
+    for i, (a, b) in enumerate(zip(native, reference)):
+        assert _same(a, b), (i, a, b)
+
+
+@pytest.mark.parametrize("columns", [(0,), (0, 2, 4), (1, 6, 9), (3, 12)])
+def test_native_projection_matches_openpyxl(edge_workbook, columns):
+    native = _rows(edge_workbook, "native", columns)
+    reference = _rows(edge_workbook, "openpyxl", columns)
+    assert len(native) == len(reference)
+    for i, (a, b) in enumerate(zip(native, reference)):
+        assert _same(a, b), (i, a, b)
+
+
+def test_native_reader_failure_falls_back_and_logs(edge_workbook, monkeypatch):
+    def broken(path):
+        raise OSError("bozuk arşiv")
+
+    monkeypatch.setitem(excel_io.READER_BACKENDS, "native", broken)
+    notices = []
+    rows = list(ExcelHandler("native", log=lambda msg, level: notices.append((level, msg)))
+                .iter_source_rows(str(edge_workbook)))
+    assert [level for level, _msg in notices] == ["WARNING"]
+    assert "openpyxl" in notices[0][1]
+    reference = _rows(edge_workbook, "openpyxl")
+    assert all(_same(a, b) for a, b in zip(rows, reference)) and len(rows) == len(reference)
+
+
+def test_registered_backend_is_used(edge_workbook, monkeypatch):
+    class Upper(excel_io.OpenpyxlRowReader):
+        def iter_rows(self, columns=None):
+            for row in super().iter_rows(columns):
+                yield tuple(v.upper() if isinstance(v, str) else v for v in row)
+
+    monkeypatch.setitem(excel_io.READER_BACKENDS, "upper", Upper)
+    rows = _rows(edge_workbook, "upper", (0, 1))
+    assert rows[:2] == [("KOD", "URUN ADI"), ("A-1", "GÖMLEK")]
@@ -0,0 +1,405 @@
+"""
+XLSX Reader Module
+Fast row reader for the active sheet of an .xlsx file.
+sharedStrings.xml is parsed once, then the sheet XML is streamed with an
+incremental parser and each <row> becomes a tuple of values. Values and row
+shapes follow openpyxl's read-only worksheets (load_workbook(read_only=True,
+data_only=True) + iter_rows(values_only=True)), without building cell objects.
+"""
+
+import posixpath
+import re
+import warnings
+import zipfile
+from bisect import bisect_left
+from xml.etree.ElementTree import fromstring, iterparse
+
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format, is_timedelta_format
+from openpyxl.utils.cell import get_column_letter, range_boundaries
+from openpyxl.utils.datetime import CALENDAR_MAC_1904, WINDOWS_EPOCH, from_excel, from_ISO8601
+
+
+# Decompressed sheet XML read per step
+READ_CHUNK_SIZE = 1 << 20
+
+_ROOT_TAG_RE = re.compile(rb"<(?![?!])([\w.:-]+)[^>]*>")
+_SHEET_DATA_RE = re.compile(rb"<(([\w.-]+:)?sheetData)(?:\s[^>]*?)?(/?)>")
+_ENCODING_RE = re.compile(rb"""^<\?xml[^>]*encoding=["']([\w.-]+)["']""")
+
+
+def _local(tag):
+    """Tag name without its namespace."""
+    return tag.rsplit("}", 1)[-1]
+
+
+def _attr(element, name):
+    """Attribute by local name (r:id and friends are namespaced)."""
+    for key, value in element.attrib.items():
+        if _local(key) == name:
+            return value
+    return None
+
+
+def _cast_number(value):
+    # Same rule as openpyxl: a dot or exponent makes it a float
+    if "." in value or "E" in value or "e" in value:
+        return float(value)
+    return int(value)
+
+
+def _text_content(element):
+    """Plain text of a <si>/<is> element: its own <t> plus rich text runs, no phonetics."""
+    snippets = []
+    for child in element:
+        tag = _local(child.tag)
+        if tag == "t":
+            if child.text is not None:
+                snippets.append(child.text)
+        elif tag == "r":
+            for t in child:
+                if _local(t.tag) == "t" and t.text is not None:
+                    snippets.append(t.text)
+    return "".join(snippets)
+
+
+class XlsxRowReader:
+    """
+    Streams the rows of the active worksheet.
+
+    Workbook metadata (sheet list, active tab, date system, date styles) and the
+    shared strings are read when the reader is created; a file that cannot be
+    read this way raises here, so callers can fall back to openpyxl.
+    """
+
+    def __init__(self, path, contents=True):
+        """
+        Args:
+            path: .xlsx / .xlsm file path
+            contents: False skips the shared strings and styles; the reader then only
+                      knows the sheet's location and dimension (max_row, max_column)
+        """
+        self.path = path
+        self._zip = zipfile.ZipFile(path)
+        try:
+            self._read_workbook(contents)
+            self._read_dimensions()
+        except Exception:
+            self._zip.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._zip.close()
+
+    def _rels(self, part):
+        """Relationship targets of a package part: {rId: (type, path)}."""
+        folder, name = posixpath.split(part)
+        rels_path = posixpath.join(folder, "_rels", name + ".rels")
+        rels = {}
+        if rels_path not in self._zip.namelist():
+            return rels
+        with self._zip.open(rels_path) as src:
+            for _event, el in iterparse(src):
+                if _local(el.tag) == "Relationship":
+                    target = el.get("Target", "")
+                    if target.startswith("/"):
+                        target = target[1:]
+                    else:
+                        target = posixpath.normpath(posixpath.join(folder, target))
+                    rels[el.get("Id")] = (el.get("Type", ""), target)
+        return rels
+
+    def _read_workbook(self, contents=True):
+        workbook_part = "xl/workbook.xml"
+        for rel_type, target in self._rels("").values():
+            if rel_type.endswith("/officeDocument"):
+                workbook_part = target
+                break
+        rels = self._rels(workbook_part)
+
+        sheets = []
+        active = None
+        self.epoch = WINDOWS_EPOCH
+        with self._zip.open(workbook_part) as src:
+            for _event, el in iterparse(src):
+                tag = _local(el.tag)
+                if tag == "sheet":
+                    sheets.append(rels[_attr(el, "id")][1])
+                elif tag == "workbookView" and active is None and el.get("activeTab") is not None:
+                    active = int(el.get("activeTab"))
+                elif tag == "workbookPr" and el.get("date1904") in ("1", "true"):
+                    self.epoch = CALENDAR_MAC_1904
+        if not sheets:
+            raise ValueError("Workbook has no sheets")
+        active = active or 0
+        self.sheet_path = sheets[active] if active < len(sheets) else sheets[0]
+
+        # Shared strings and date styles
+        self.shared_strings = []
+        self.date_styles = set()
+        self.timedelta_styles = set()
+        for rel_type, target in rels.values():
+            if not contents:
+                break
+            if rel_type.endswith("/sharedStrings"):
+                self.shared_strings = self._read_shared_strings(target)
+            elif rel_type.endswith("/styles"):
+                self._read_styles(target)
+
+    def _read_shared_strings(self, part):
+        strings = []
+        with self._zip.open(part) as src:
+            for _event, el in iterparse(src):
+                if _local(el.tag) == "si":
+                    strings.append(_text_content(el).replace("x005F_", ""))
+                    el.clear()
+        return strings
+
+    def _read_styles(self, part):
+        custom = {}
+        xf_formats = []
+        in_cell_xfs = False
+        with self._zip.open(part) as src:
+            for _event, el in iterparse(src, events=("start", "end")):
+                tag = _local(el.tag)
+                if _event == "start":
+                    if tag == "cellXfs":
+                        in_cell_xfs = True
+                    elif tag in ("cellStyleXfs", "dxfs"):
+                        in_cell_xfs = False
+                    continue
+                if tag == "numFmt":
+                    custom[int(el.get("numFmtId"))] = el.get("formatCode")
+                elif tag == "xf" and in_cell_xfs:
+                    xf_formats.append(int(el.get("numFmtId", 0)))
+                elif tag == "cellXfs":
+                    in_cell_xfs = False
+
+        for idx, fmt_id in enumerate(xf_formats):
+            fmt = custom[fmt_id] if fmt_id in custom else BUILTIN_FORMATS.get(fmt_id)
+            if is_date_format(fmt):
+                self.date_styles.add(idx)
+            if is_timedelta_format(fmt):
+                self.timedelta_styles.add(idx)
+
+    def _read_dimensions(self):
+        # <dimension ref="A1:H100"> (if present) sets the row width and last row
+        self.max_column = self.max_row = None
+        self._col_cache = {}
+        with self._zip.open(self.sheet_path) as src:
+            # Row blocks are parsed without the XML declaration, so they must be UTF-8
+            m = _ENCODING_RE.match(src.read(200))
+            if m and m.group(1).lower() not in (b"utf-8", b"utf8"):
+                raise ValueError(f"Unsupported sheet encoding: {m.group(1).decode()}")
+        with self._zip.open(self.sheet_path) as src:
+            for _event, el in iterparse(src, events=("start",)):
+                tag = _local(el.tag)
+                if tag == "dimension":
+                    _min_col, _min_row, self.max_column, self.max_row = range_boundaries(el.get("ref"))
+                    break
+                if tag == "sheetData":
+                    break
+
+    def iter_rows(self, columns=None):
+        """
+        Yields the sheet rows from the first row on.
+
+        Rows are tuples as wide as the sheet dimension (or up to the row's last
+        cell when the sheet has none); missing rows come out empty.
+
+        Args:
+            columns: Optional sorted 0-based column indices to keep. Other cells
+                     are skipped while parsing and each row holds only the kept
+                     columns that fall within its full width.
+        """
+        max_col = self.max_column
+        max_row = self.max_row
+        keep = None
+        if columns is not None:
+            keep = {c + 1: pos for pos, c in enumerate(columns)} # 1-based column -> position
+        if max_col is None:
+            empty_row = []
+        else:
+            empty_row = (None,) * (max_col if keep is None else bisect_left(columns, max_col))
+
+        counter = 1
+        idx = 1
+        for idx, cells, last_col in self._parse_rows(keep):
+            if max_row is not None and idx > max_row:
+                break
+
+            # some rows are missing
+            for _ in range(counter, idx):
+                counter += 1
+                yield empty_row
+
+            if counter <= idx:
+                counter += 1
+                if not last_col and not max_col:
+                    yield ()
+                    continue
+                width = max_col or last_col
+                if keep is None:
+                    row = [None] * width
+                    for col, value in cells:
+                        if 1 <= col <= width:
+                            row[col - 1] = value
+                else:
+                    n = bisect_left(columns, width)
+                    row = [None] * n
+                    for col, value in cells:
+                        pos = keep[col]
+                        if pos < n:
+                            row[pos] = value
+                yield tuple(row)
+
+        if max_row is not None and max_row < idx:
+            for _ in range(counter, max_row + 1):
+                yield empty_row
+
+    def _parse_rows(self, keep=None):
+        """
+        Yields (row number, [(column, value), ...], last cell's column) per <row> element.
+
+        With keep (1-based columns to keep), cells of other columns are left out
+        without decoding their values; the last column still counts every cell.
+        
+        The decompressed sheet is cut after the last complete </row> of each chunk
+        and that block of rows is parsed in one go (inside a copy of the worksheet
+        and sheetData start tags, so namespaces resolve as in the file).
+        """
+        with self._zip.open(self.sheet_path) as src:
+            buf = b""
+            while True:
+                data = src.read(READ_CHUNK_SIZE)
+                buf += data
+                m = _SHEET_DATA_RE.search(buf)
+                if m or not data:
+                    break
+            if m is None or m.group(3):
+                return # no rows / <sheetData/>
+
+            root = _ROOT_TAG_RE.search(buf, 0, m.start())
+            prefix = m.group(2) or b""
+            wrapper_open = root.group(0) + m.group(0)
+            wrapper_close = b"</" + prefix + b"sheetData></" + root.group(1) + b">"
+            row_end = b"</" + prefix + b"row>"
+            data_end = b"</" + prefix + b"sheetData>"
+            buf = buf[m.end():]
+            drop = self._cell_filter(prefix, keep)
+
+            state = [0] # row counter carried across blocks
+            while True:
+                data = src.read(READ_CHUNK_SIZE)
+                if not data:
+                    break
+                buf += data
+                cut = buf.rfind(row_end)
+                if cut != -1:
+                    cut += len(row_end)
+                    yield from self._parse_block(wrapper_open + drop(buf[:cut]) + wrapper_close, state, keep)
+                    buf = buf[cut:]
+
+            end = buf.find(data_end)
+            if end != -1:
+                buf = buf[:end]
+            if buf.strip():
+                yield from self._parse_block(wrapper_open + drop(buf) + wrapper_close, state, keep)
+
+    def _cell_filter(self, prefix, keep):
+        """
+        Returns a function that strips the cells of unwanted columns from a block of rows.
+
+        Removing them from the XML text (one regex pass in C) spares both the tree
+        building and the per-cell work in _parse_block. Cells are removed only in
+        blocks where every cell starts with its r="A1" reference: cells without
+        one are placed by counting their predecessors. Without a sheet dimension
+        each row's width depends on its last cell, so nothing is removed then.
+        """
+        if keep is None or self.max_column is None:
+            return lambda block: block
+        letters = b"|".join(get_column_letter(c).encode() for c in sorted(keep))
+        cell = b"<" + re.escape(prefix) + b"c"
+        cell_end = b"/" + re.escape(prefix) + b"c>"
+        drop_re = re.compile(
+            cell + rb' r="(?!(?:' + letters + rb')\d)[A-Z]+\d+"[^>]*'
+            rb"(?:(?<=/)>|>[^<]*(?:<(?!" + cell_end + rb")[^<]*)*<" + cell_end + b")")
+        unreferenced_re = re.compile(cell + rb'(?:[\t\n\r/>]| (?!r="))')
+
+        def drop(block):
+            if unreferenced_re.search(block):
+                return block
+            return drop_re.sub(b"", block)
+        return drop
+
+    def _parse_block(self, xml, state, keep=None):
+        shared_strings = self.shared_strings
+        date_styles = self.date_styles
+        timedelta_styles = self.timedelta_styles
+        epoch = self.epoch
+        col_cache = self._col_cache
+
+        sheet_data = fromstring(xml)[0]
+        tag = sheet_data.tag
+        ns = tag[:tag.index("}") + 1] if tag.startswith("{") else ""
+        value_tag = ns + "v"
+        inline_tag = ns + "is"
+
+        row_counter = state[0]
+        for el in sheet_data:
+            r = el.get("r")
+            if r is not None:
+                try:
+                    row_counter = int(r)
+                except ValueError:
+                    val = float(r)
+                    if not val.is_integer():
+                        raise ValueError(f"{r} is not a valid row number")
+                    row_counter = int(val)
+            else:
+                row_counter += 1
+
+            cells = []
+            col_counter = 0
+            for c in el:
+                ref = c.get("r")
+                if ref:
+                    col_counter = col_cache.get(ref.rstrip("0123456789"))
+                    if col_counter is None:
+                        col_counter = col_cache[ref.rstrip("0123456789")] = range_boundaries(ref)[0]
+                else:
+                    col_counter += 1
+                if keep is not None and col_counter not in keep:
+                    continue
+
+                data_type = c.get("t")
+                if data_type == "inlineStr":
+                    child = c.find(inline_tag)
+                    value = _text_content(child) if child is not None else None
+                else:
+                    value = c.findtext(value_tag) or None
+                    if value is not None:
+                        if data_type is None or data_type == "n":
+                            value = _cast_number(value)
+                            style = c.get("s")
+                            if style and int(style) in date_styles:
+                                try:
+                                    value = from_excel(value, epoch, timedelta=int(style) in timedelta_styles)
+                                except (OverflowError, ValueError):
+                                    warnings.warn(f"Cell {ref} is marked as a date but the serial value {value} is outside the limits for dates. The cell will be treated as an error.")
+                                    value = "#VALUE!"
+                        elif data_type == "s":
+                            value = shared_strings[int(value)]
+                        elif data_type == "b":
+                            value = bool(int(value))
+                        elif data_type == "d":
+                            value = from_ISO8601(value)
+                cells.append((col_counter, value))
+
+            yield row_counter, cells, col_counter
+        state[0] = row_counter
@@ -0,0 +1,258 @@
+"""
+XLSX Writer Module
+Minimal streaming .xlsx writer for export parts.
+Rows are turned into sheet XML directly and streamed into the zip container;
+strings go through a shared-strings table, numbers are written as-is. There is
+no per-cell object model, which makes it several times faster than openpyxl
+(even in write-only mode) for large exports.
+"""
+
+import datetime
+import math
+import numbers
+import os
+import re
+import zipfile
+from decimal import Decimal
+
+from openpyxl.utils import get_column_letter
+from openpyxl.utils.datetime import to_excel
+
+
+# Characters Excel does not accept in cell text (same set openpyxl rejects)
+ILLEGAL_CHARACTERS_RE = re.compile(r"[\000-\010]|[\013-\014]|[\016-\037]")
+
+# Cell kinds, resolved once per Python type
+_SKIP, _STRING, _NUMBER, _BOOL, _DATETIME, _DATE, _TIME, _TIMEDELTA = range(8)
+
+# Style index (cellXfs) per date/time kind, number formats match openpyxl's defaults
+_DATE_STYLES = {_DATETIME: 1, _DATE: 2, _TIME: 3, _TIMEDELTA: 4}
+
+_CONTENT_TYPES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '<Override PartName="/xl/sharedStrings.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>'
+    '</Types>'
+)
+
+_ROOT_RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+_WORKBOOK_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{title}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+_WORKBOOK_RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+    '<Relationship Id="rId3" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings" Target="sharedStrings.xml"/>'
+    '</Relationships>'
+)
+
+_STYLES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<numFmts count="4">'
+    '<numFmt numFmtId="164" formatCode="yyyy-mm-dd h:mm:ss"/>'
+    '<numFmt numFmtId="165" formatCode="yyyy-mm-dd"/>'
+    '<numFmt numFmtId="166" formatCode="h:mm:ss"/>'
+    '<numFmt numFmtId="167" formatCode="[hh]:mm:ss"/>'
+    '</numFmts>'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/><family val="2"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="5">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="165" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="166" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="167" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '</cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+_SHEET_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_SHEET_TAIL = '</sheetData></worksheet>'
+
+
+def _escape(text):
+    """XML-escapes cell text and drops characters Excel cannot store."""
+    if ILLEGAL_CHARACTERS_RE.search(text):
+        text = ILLEGAL_CHARACTERS_RE.sub("", text)
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _kind_of(value_type):
+    # bool before int (bool is an int subclass), datetime before date
+    if issubclass(value_type, bool):
+        return _BOOL
+    if issubclass(value_type, str):
+        return _STRING
+    if issubclass(value_type, (int, float, Decimal)):
+        return _NUMBER
+    if issubclass(value_type, datetime.datetime):
+        return _DATETIME
+    if issubclass(value_type, datetime.date):
+        return _DATE
+    if issubclass(value_type, datetime.time):
+        return _TIME
+    if issubclass(value_type, datetime.timedelta):
+        return _TIMEDELTA
+    if value_type is type(None):
+        return _SKIP
+    # numpy scalars and similar: numbers if they convert, text otherwise
+    if hasattr(value_type, "__float__") and not hasattr(value_type, "encode"):
+        return _NUMBER
+    return _STRING
+
+
+class XlsxStreamWriter:
+    """
+    Write-only single-sheet .xlsx file.
+
+    Rows are buffered and flushed to the open zip entry in blocks, so memory stays
+    flat regardless of row count. The file is created on the first flush; a writer
+    that is never flushed or saved leaves nothing on disk.
+    Mirrors the parts of the openpyxl API the exporter uses: append() and save().
+    """
+
+    def __init__(self, path, title="Sheet", flush_rows=1000):
+        """
+        Args:
+            path: Output .xlsx path
+            title: Sheet name
+            flush_rows: Rows buffered before they are written to the zip
+        """
+        self.path = path
+        self.title = title
+        self.flush_rows = flush_rows
+
+        self._zip = None
+        self._sheet = None
+        self._buffer = []
+        self._row_num = 0
+        self._strings = {}           # text -> shared string index
+        self._string_refs = 0        # total string cells (sst count)
+        self._kinds = {}             # type -> cell kind
+        self._columns = []           # column letters by index
+        self._saved = False
+
+    def append(self, row):
+        """
+        Adds one row below the previous ones.
+
+        Args:
+            row: List of cell values (None = empty cell)
+        """
+        self._row_num += 1
+        r = str(self._row_num)
+        columns = self._columns
+        if len(row) > len(columns):
+            columns.extend(get_column_letter(i + 1) for i in range(len(columns), len(row)))
+        kinds = self._kinds
+        strings = self._strings
+
+        cells = []
+        for i, value in enumerate(row):
+            kind = kinds.get(type(value))
+            if kind is None:
+                kind = kinds[type(value)] = _kind_of(type(value))
+
+            if kind == _STRING:
+                text = value if type(value) is str else str(value)
+                idx = strings.get(text)
+                if idx is None:
+                    idx = strings[text] = len(strings)
+                self._string_refs += 1
+                cells.append(f'<c r="{columns[i]}{r}" t="s"><v>{idx}</v></c>')
+            elif kind == _NUMBER:
+                if type(value) is not int:
+                    if isinstance(value, numbers.Integral):
+                        value = int(value)
+                    else:
+                        value = float(value)
+                        if not math.isfinite(value):
+                            continue # NaN/inf cannot be stored in a cell
+                cells.append(f'<c r="{columns[i]}{r}"><v>{value!r}</v></c>')
+            elif kind == _BOOL:
+                cells.append(f'<c r="{columns[i]}{r}" t="b"><v>{int(value)}</v></c>')
+            elif kind != _SKIP:
+                cells.append(f'<c r="{columns[i]}{r}" s="{_DATE_STYLES[kind]}"><v>{to_excel(value)!r}</v></c>')
+
+        self._buffer.append(f'<row r="{r}">{"".join(cells)}</row>')
+        if len(self._buffer) >= self.flush_rows:
+            self._flush()
+
+    def _flush(self):
+        if self._zip is None:
+            self._zip = zipfile.ZipFile(self.path, "w", zipfile.ZIP_DEFLATED)
+            self._sheet = self._zip.open("xl/worksheets/sheet1.xml", "w", force_zip64=True)
+            self._sheet.write(_SHEET_HEAD.encode("utf-8"))
+        if self._buffer:
+            self._sheet.write("".join(self._buffer).encode("utf-8"))
+            self._buffer = []
+
+    def save(self, filename=None):
+        """
+        Finishes the sheet and writes the remaining workbook parts.
+
+        Args:
+            filename: Accepted for openpyxl compatibility; must be the path given at creation
+        """
+        if filename is not None and os.path.abspath(filename) != os.path.abspath(self.path):
+            raise ValueError(f"XlsxStreamWriter is bound to {self.path}, cannot save to {filename}")
+        if self._saved:
+            return
+        self._flush()
+        self._sheet.write(_SHEET_TAIL.encode("utf-8"))
+        self._sheet.close()
+
+        z = self._zip
+        z.writestr("[Content_Types].xml", _CONTENT_TYPES_XML)
+        z.writestr("_rels/.rels", _ROOT_RELS_XML)
+        z.writestr("xl/workbook.xml", _WORKBOOK_XML.format(title=_escape(self.title).replace('"', "&quot;")))
+        z.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS_XML)
+        z.writestr("xl/styles.xml", _STYLES_XML)
+
+        with z.open("xl/sharedStrings.xml", "w") as sst:
+            sst.write(
+                ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                 '<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+                 f'count="{self._string_refs}" uniqueCount="{len(self._strings)}">').encode("utf-8"))
+            chunk = []
+            for text in self._strings: # dict keeps insertion order = index order
+                text = _escape(text)
+                if text[:1].isspace() or text[-1:].isspace():
+                    chunk.append(f'<si><t xml:space="preserve">{text}</t></si>')
+                else:
+                    chunk.append(f'<si><t>{text}</t></si>')
+                if len(chunk) >= self.flush_rows:
+                    sst.write("".join(chunk).encode("utf-8"))
+                    chunk = []
+            chunk.append("</sst>")
+            sst.write("".join(chunk).encode("utf-8"))
+
+        z.close()
+        self._saved = True
+
+    close = save